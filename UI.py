@@ -1,9 +1,49 @@
 import sys
 import os
 import json
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel, QCheckBox, QSpinBox, QTableWidget, QTableWidgetItem, QDialog, QFileDialog, QMessageBox, QSlider, QFormLayout, QStatusBar
-from PyQt5.QtCore import Qt, QRect
-from PyQt5.QtGui import QIcon
+import time
+import threading
+from collections import deque
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel, QCheckBox, QSpinBox, QDoubleSpinBox, QTableView, QAbstractItemView, QHeaderView, QDialog, QFileDialog, QMessageBox, QSlider, QFormLayout, QStatusBar, QComboBox, QListWidget, QListWidgetItem
+from PyQt5.QtCore import Qt, QRect, QSize, QObject, QTimer, pyqtSignal, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QIcon, QImage, QPixmap
+from target_manager import atomic_write_json
+
+# 布局模式及其显示名称
+FIT_MODE_LABELS = [
+    ("stretch", "拉伸"),
+    ("tile", "平铺"),
+    ("center", "居中"),
+    ("cover", "等比覆盖"),
+]
+
+# 透明遮罩及其显示名称
+MASK_MODE_LABELS = [
+    ("none", "无"),
+    ("edge_fade", "边缘渐隐"),
+    ("vignette", "暗角渐隐"),
+]
+
+# 预览区域尺寸、代理图长边上限、参数变化后等待多久再渲染（毫秒）
+PREVIEW_SIZE = (320, 180)
+PREVIEW_PROXY_SIZE = 640
+PREVIEW_DEBOUNCE_MS = 120
+
+# 目标列表中缩略图的显示尺寸，以及缩略图浏览器中的尺寸
+TABLE_THUMBNAIL_SIZE = QSize(48, 27)
+BROWSER_THUMBNAIL_SIZE = QSize(128, 96)
+
+# 目标列表的列：标题和列宽
+TARGET_COLUMNS = [
+    ("应用名称", 70),
+    ("关键词", 90),
+    ("背景图片", 110),
+    ("透明度", 55),
+    ("亮度", 55),
+    ("对比度", 55),
+    ("饱和度", 55),
+]
+IMAGE_COLUMN = 2
 
 
 class ConfigEditor(QMainWindow):
@@ -15,7 +55,7 @@ class ConfigEditor(QMainWindow):
         self.setWindowTitle("配置编辑器")
 
         # 设置窗口大小
-        self.setFixedSize(560, 360)  # 固定窗口大小为560x360
+        self.setFixedSize(560, 400)  # 固定窗口大小为560x400
         
         # 将窗口移动到屏幕中央
         qr = self.frameGeometry()
@@ -26,6 +66,10 @@ class ConfigEditor(QMainWindow):
         # 设置图标
         self.setWindowIcon(QIcon("logo.ico"))
 
+        # 缩略图在后台线程中读取/生成，结果按image_path文本缓存在内存中
+        self.base_dir = os.path.dirname(os.path.abspath(self.config_path))
+        self.thumbnail_loader = ThumbnailLoader()
+
         self.load_config()
         self.create_ui()
 
@@ -53,8 +97,8 @@ class ConfigEditor(QMainWindow):
     def save_config(self):
         """保存配置文件"""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config_data, f, ensure_ascii=False, indent=4)
+            # 原子写入，运行中的检测器不会读到写了一半的配置
+            atomic_write_json(self.config_path, self.config_data)
             self.modified = False
             self.statusBar.showMessage("配置已保存")
         except Exception as e:
@@ -76,28 +120,61 @@ class ConfigEditor(QMainWindow):
         self.enabled_check.setChecked(self.config_data.get('enabled', True))
         self.enabled_check.toggled.connect(self.on_modified)
 
-        self.scan_interval_spin = QSpinBox(self)
-        self.scan_interval_spin.setValue(self.config_data.get('scan_interval', 3))
+        self.scan_interval_spin = QDoubleSpinBox(self)
+        self.scan_interval_spin.setRange(0.1, 300.0)
+        self.scan_interval_spin.setSingleStep(0.5)
+        self.scan_interval_spin.setDecimals(1)
+        self.scan_interval_spin.setSuffix(" 秒")
+        self.scan_interval_spin.setValue(float(self.config_data.get('scan_interval', 3)))
         self.scan_interval_spin.valueChanged.connect(self.on_modified)
 
+        # 自适应扫描开启时，上面的固定间隔不再使用
+        self.adaptive_scan_check = QCheckBox("自适应扫描（窗口变化后快速检测，稳定时放慢）", self)
+        self.adaptive_scan_check.setChecked(self.config_data.get('adaptive_scan', True))
+        self.adaptive_scan_check.toggled.connect(self.on_modified)
+        self.adaptive_scan_check.toggled.connect(lambda checked: self.scan_interval_spin.setEnabled(not checked))
+        self.scan_interval_spin.setEnabled(not self.adaptive_scan_check.isChecked())
+
+        # 使用电池时放慢扫描和渲染，锁屏或显示器关闭时挂起背景
+        self.power_saving_check = QCheckBox("省电模式（使用电池时降低开销，锁屏或关闭显示器时暂停）", self)
+        self.power_saving_check.setChecked(self.config_data.get('power_saving', True))
+        self.power_saving_check.toggled.connect(self.on_modified)
+
+        # 按名称或关键词筛选目标
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText("按应用名称或关键词筛选")
+        self.search_edit.setClearButtonEnabled(True)
+
         global_form.addRow("扫描间隔:", self.scan_interval_spin)
+        global_form.addRow(self.adaptive_scan_check)
+        global_form.addRow(self.power_saving_check)
         global_form.addRow(self.enabled_check)  # 复选框单独一行
+        global_form.addRow("搜索:", self.search_edit)
         layout.addLayout(global_form)
 
-        # 目标应用列表
-        self.target_table = QTableWidget(self)
-        self.target_table.setColumnCount(7)
-        self.target_table.setHorizontalHeaderLabels(["应用名称", "关键词", "背景图片", "透明度", "亮度", "对比度", "饱和度"])
-        self.target_table.setStyleSheet("QTableWidget { font-size: 12px; background-color: #f7f7f7; border: 1px solid #ddd; gridline-color: #e0e0e0; } QTableWidget::item { padding: 3px; }")
+        # 目标应用列表：模型直接引用config_data中的目标列表，增删改只通知受影响的行
+        self.target_model = TargetTableModel(self.config_data.setdefault('targets', []),
+                                             self.thumbnail_loader, self.base_dir, self)
+        self.target_proxy = TargetFilterProxy(self)
+        self.target_proxy.setSourceModel(self.target_model)
+        self.search_edit.textChanged.connect(self.target_proxy.set_filter_text)
+
+        self.target_table = QTableView(self)
+        self.target_table.setModel(self.target_proxy)
+        self.target_table.setStyleSheet("QTableView { font-size: 12px; background-color: #f7f7f7; border: 1px solid #ddd; gridline-color: #e0e0e0; } QTableView::item { padding: 3px; }")
         self.target_table.horizontalHeader().setStretchLastSection(True)
         self.target_table.verticalHeader().setVisible(False)  # 隐藏垂直头
-        self.target_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.target_table.setSelectionMode(QTableWidget.SingleSelection)
-        # 设置各列的固定宽度，适应560x360窗口，总宽度调整为约500以适应边距
-        column_widths = [70, 90, 110, 55, 55, 55, 55]  # 总和约490
-        for col, width in enumerate(column_widths):
+        # 固定行高，几百行时也不需要逐行计算尺寸
+        self.target_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.target_table.verticalHeader().setDefaultSectionSize(TABLE_THUMBNAIL_SIZE.height() + 6)
+        self.target_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.target_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.target_table.setIconSize(TABLE_THUMBNAIL_SIZE)
+        self.target_table.setWordWrap(False)
+        # 设置各列的固定宽度，适应560宽的窗口，总宽度约490以适应边距
+        for col, (_, width) in enumerate(TARGET_COLUMNS):
             self.target_table.setColumnWidth(col, width)
-        self.refresh_targets()
+        self.target_table.doubleClicked.connect(self.edit_target)
         layout.addWidget(self.target_table)
 
         # 操作按钮
@@ -136,17 +213,12 @@ class ConfigEditor(QMainWindow):
         self.modified = True
         self.statusBar.showMessage("配置已修改")
 
-    def refresh_targets(self):
-        """刷新目标列表显示"""
-        self.target_table.setRowCount(len(self.config_data.get('targets', [])))
-        for row, target in enumerate(self.config_data.get('targets', [])):
-            self.target_table.setItem(row, 0, QTableWidgetItem(target.get('name', '')))
-            self.target_table.setItem(row, 1, QTableWidgetItem(", ".join(target.get('keywords', []))))
-            self.target_table.setItem(row, 2, QTableWidgetItem(target.get('image_path', '')))
-            self.target_table.setItem(row, 3, QTableWidgetItem(str(target.get('alpha', 40)) + "%"))
-            self.target_table.setItem(row, 4, QTableWidgetItem(str(target.get('brightness', 1.0))))
-            self.target_table.setItem(row, 5, QTableWidgetItem(str(target.get('contrast', 1.0))))
-            self.target_table.setItem(row, 6, QTableWidgetItem(str(target.get('saturation', 1.0))))
+    def selected_target_row(self):
+        """当前选中目标在配置列表中的行号，未选中返回None"""
+        rows = self.target_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.target_proxy.mapToSource(rows[0]).row()
 
     def save_and_close(self):
         """保存并关闭"""
@@ -158,42 +230,39 @@ class ConfigEditor(QMainWindow):
         """应用配置（保存但不关闭）"""
         self.config_data['enabled'] = self.enabled_check.isChecked()
         self.config_data['scan_interval'] = self.scan_interval_spin.value()
+        self.config_data['adaptive_scan'] = self.adaptive_scan_check.isChecked()
+        self.config_data['power_saving'] = self.power_saving_check.isChecked()
         self.save_config()
 
     def add_target(self):
         """弹出对话框添加新目标应用"""
         dialog = TargetDialog(self)
         if dialog.exec_() and dialog.target_data:
-            self.config_data['targets'].append(dialog.target_data)
-            self.refresh_targets()
+            self.target_model.append_target(dialog.target_data)
             self.on_modified()
 
     def edit_target(self):
         """编辑选中的目标应用"""
-        selected = self.target_table.selectedItems()
-        if not selected:
+        row = self.selected_target_row()
+        if row is None:
             QMessageBox.warning(self, "警告", "请选择一个应用进行编辑")
             return
-        row = selected[0].row()
         target = self.config_data['targets'][row]
         dialog = TargetDialog(self, target)
         if dialog.exec_() and dialog.target_data:
-            self.config_data['targets'][row] = dialog.target_data
-            self.refresh_targets()
+            self.target_model.update_target(row, dialog.target_data)
             self.on_modified()
 
     def remove_target(self):
         """删除选中的目标应用"""
-        selected = self.target_table.selectedItems()
-        if not selected:
+        row = self.selected_target_row()
+        if row is None:
             QMessageBox.warning(self, "警告", "请选择一个应用进行删除")
             return
-        row = selected[0].row()
         reply = QMessageBox.question(self, "确认删除", "确定要删除此应用吗？",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            del self.config_data['targets'][row]
-            self.refresh_targets()
+            self.target_model.remove_target(row)
             self.on_modified()
 
     def closeEvent(self, event):
@@ -209,6 +278,8 @@ class ConfigEditor(QMainWindow):
                 event.accept()
         else:
             event.accept()
+        if event.isAccepted():
+            self.thumbnail_loader.close()
 
     def ask_save_changes(self):
         """询问是否保存修改"""
@@ -217,18 +288,139 @@ class ConfigEditor(QMainWindow):
                                     QMessageBox.Save)
 
 
+class TargetTableModel(QAbstractTableModel):
+    """
+    目标列表模型
+
+    直接引用配置中的targets列表；视图只为可见行调用data()，缩略图也只为可见行请求。
+    增删改通过beginInsertRows/dataChanged等只通知受影响的行，不重建整个表格。
+    """
+
+    def __init__(self, targets, thumbnail_loader, base_dir, parent=None):
+        super().__init__(parent)
+        self.targets = targets
+        self.thumbnail_loader = thumbnail_loader
+        self.base_dir = base_dir
+        self.icons = {}  # image_path文本 -> QIcon，加载失败时为None（不再重复请求）
+        self.thumbnail_loader.ready.connect(self.on_thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.targets)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(TARGET_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TARGET_COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        target = self.targets[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return target.get('name', '')
+            if column == 1:
+                return ", ".join(target.get('keywords', []))
+            if column == IMAGE_COLUMN:
+                return format_image_path(target.get('image_path', ''))
+            if column == 3:
+                return str(target.get('alpha', 40)) + "%"
+            key = ('brightness', 'contrast', 'saturation')[column - 4]
+            return str(target.get(key, 1.0))
+        if column == IMAGE_COLUMN:
+            if role == Qt.ToolTipRole:
+                return format_image_path(target.get('image_path', ''))
+            if role == Qt.DecorationRole:
+                token = format_image_path(target.get('image_path', ''))
+                if token and token not in self.icons:
+                    self.thumbnail_loader.request(token, target.get('image_path', ''), self.base_dir)
+                return self.icons.get(token)
+        return None
+
+    def append_target(self, target):
+        """在末尾添加一个目标"""
+        row = len(self.targets)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.targets.append(target)
+        self.endInsertRows()
+
+    def update_target(self, row, target):
+        """替换一个目标，只刷新这一行；图片路径改变时重新尝试加载之前失败的缩略图"""
+        old_token = format_image_path(self.targets[row].get('image_path', ''))
+        token = format_image_path(target.get('image_path', ''))
+        if token != old_token and token in self.icons and self.icons[token] is None:
+            del self.icons[token]
+        self.targets[row] = target
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(TARGET_COLUMNS) - 1))
+
+    def remove_target(self, row):
+        """删除一个目标"""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.targets[row]
+        self.endRemoveRows()
+
+    def on_thumbnail_ready(self, token, image):
+        """缩略图加载完成（UI线程），只刷新使用该图片的行的图片列；失败时记为None，不再反复解码"""
+        if image is None:
+            self.icons[token] = None
+            return
+        self.icons[token] = QIcon(QPixmap.fromImage(image))
+        for row, target in enumerate(self.targets):
+            if format_image_path(target.get('image_path', '')) == token:
+                index = self.index(row, IMAGE_COLUMN)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class TargetFilterProxy(QSortFilterProxyModel):
+    """按应用名称和关键词筛选目标（不区分大小写）"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filter_text = ""
+
+    def set_filter_text(self, text):
+        self.filter_text = text.strip().lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.filter_text:
+            return True
+        target = self.sourceModel().targets[source_row]
+        if self.filter_text in str(target.get('name', '')).lower():
+            return True
+        return any(self.filter_text in str(keyword).lower() for keyword in target.get('keywords', []))
+
+
 class TargetDialog(QDialog):
     """目标编辑对话框"""
     def __init__(self, parent, target_data=None):
         super().__init__(parent)
         self.setWindowTitle("编辑目标应用")
-        self.setFixedSize(350, 250)  # 增加高度以防止溢出
+        self.setFixedSize(700, 340)  # 右侧为预览区域
 
         # 设置图标
         self.setWindowIcon(QIcon("logo.ico"))
 
         self.target_data = target_data if target_data else {}
+        # 相对路径的图片按配置文件所在目录查找
+        config_path = getattr(parent, 'config_path', None)
+        self.base_dir = os.path.dirname(os.path.abspath(config_path)) if config_path else os.getcwd()
+
+        # 预览在后台线程渲染，参数变化时防抖，只渲染最新的一次
+        self.preview_seq = 0
+        self.preview_worker = PreviewWorker()
+        self.preview_worker.finished.connect(self.on_preview_ready)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.request_preview)
+
         self.create_ui()
+        self.request_preview()
 
     def create_ui(self):
         """创建UI"""
@@ -251,11 +443,15 @@ class TargetDialog(QDialog):
         image_hbox = QHBoxLayout()
         image_hbox.setSpacing(5)  # 设置水平布局间距
         self.image_edit = QLineEdit(self)
-        self.image_edit.setText(self.target_data.get('image_path', ''))
+        self.image_edit.setText(format_image_path(self.target_data.get('image_path', '')))
+        self.image_edit.setToolTip("可填写图片文件、图片目录，或用分号分隔的多个路径（幻灯片）")
         self.image_button = QPushButton("选择文件", self)
         self.image_button.clicked.connect(self.select_image_file)
+        self.folder_button = QPushButton("选择目录", self)
+        self.folder_button.clicked.connect(self.select_image_folder)
         image_hbox.addWidget(self.image_edit)
         image_hbox.addWidget(self.image_button)
+        image_hbox.addWidget(self.folder_button)
         form_layout.addRow("背景图片:", image_hbox)
 
         self.alpha_spin = QSpinBox(self)
@@ -263,6 +459,22 @@ class TargetDialog(QDialog):
         self.alpha_spin.setValue(self.target_data.get('alpha', 40))
         form_layout.addRow("透明度 (%):", self.alpha_spin)
 
+        # 布局模式
+        self.fit_combo = QComboBox(self)
+        for mode, label in FIT_MODE_LABELS:
+            self.fit_combo.addItem(label, mode)
+        fit_index = self.fit_combo.findData(self.target_data.get('fit', 'stretch'))
+        self.fit_combo.setCurrentIndex(max(0, fit_index))
+        form_layout.addRow("布局模式:", self.fit_combo)
+
+        # 透明遮罩
+        self.mask_combo = QComboBox(self)
+        for mode, label in MASK_MODE_LABELS:
+            self.mask_combo.addItem(label, mode)
+        mask_index = self.mask_combo.findData(self.target_data.get('mask', 'none'))
+        self.mask_combo.setCurrentIndex(max(0, mask_index))
+        form_layout.addRow("透明遮罩:", self.mask_combo)
+
         # 亮度滑块和数值显示
         brightness_hbox = QHBoxLayout()
         brightness_hbox.setSpacing(8)  # 设置水平布局间距
@@ -305,7 +517,40 @@ class TargetDialog(QDialog):
         saturation_hbox.addWidget(self.saturation_label)
         form_layout.addRow("饱和度:", saturation_hbox)
 
-        layout.addLayout(form_layout)
+        # 毛玻璃模糊半径，0为关闭
+        self.blur_spin = QSpinBox(self)
+        self.blur_spin.setRange(0, 200)
+        self.blur_spin.setValue(int(self.target_data.get('blur', 0)))
+        form_layout.addRow("模糊半径:", self.blur_spin)
+
+        # 左侧表单，右侧预览
+        content_layout = QHBoxLayout()
+        content_layout.setSpacing(12)
+        content_layout.addLayout(form_layout)
+
+        preview_layout = QVBoxLayout()
+        preview_layout.setSpacing(4)
+        self.preview_label = QLabel(self)
+        self.preview_label.setFixedSize(*PREVIEW_SIZE)
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setStyleSheet("QLabel { border: 1px solid #ccc; background-color: #fafafa; }")
+        self.preview_status = QLabel("正在生成预览...", self)
+        self.preview_status.setStyleSheet("QLabel { color: #888; }")
+        preview_layout.addWidget(self.preview_label)
+        preview_layout.addWidget(self.preview_status)
+        preview_layout.addStretch()
+        content_layout.addLayout(preview_layout)
+        layout.addLayout(content_layout)
+
+        # 任一参数变化都重新预览
+        self.image_edit.textChanged.connect(self.schedule_preview)
+        self.alpha_spin.valueChanged.connect(self.schedule_preview)
+        self.fit_combo.currentIndexChanged.connect(self.schedule_preview)
+        self.mask_combo.currentIndexChanged.connect(self.schedule_preview)
+        self.brightness_slider.valueChanged.connect(self.schedule_preview)
+        self.contrast_slider.valueChanged.connect(self.schedule_preview)
+        self.saturation_slider.valueChanged.connect(self.schedule_preview)
+        self.blur_spin.valueChanged.connect(self.schedule_preview)
 
         # 操作按钮
         button_layout = QHBoxLayout()
@@ -335,44 +580,390 @@ class TargetDialog(QDialog):
         """更新饱和度标签显示"""
         self.saturation_label.setText(f"{value / 100:.2f}")
 
+    def schedule_preview(self, *args):
+        """参数变化后重新计时，停止拖动滑块片刻后才渲染"""
+        self.preview_timer.start()
+
+    def request_preview(self):
+        """把当前参数提交给预览线程（旧的未开始的请求会被替换）"""
+        self.preview_seq += 1
+        screen = QApplication.primaryScreen().availableGeometry()
+        params = dict(self.target_data)
+        params.update({
+            "image_path": parse_image_path(self.image_edit.text()),
+            "alpha": self.alpha_spin.value(),
+            "brightness": self.brightness_slider.value() / 100.0,
+            "contrast": self.contrast_slider.value() / 100.0,
+            "saturation": self.saturation_slider.value() / 100.0,
+            "fit": self.fit_combo.currentData(),
+            "mask": self.mask_combo.currentData(),
+            "blur": self.blur_spin.value()
+        })
+        self.preview_worker.submit(self.preview_seq, params, self.base_dir, (screen.width(), screen.height()))
+
+    def on_preview_ready(self, seq, image, status):
+        """预览线程完成渲染（在UI线程中调用），过期的结果直接丢弃"""
+        if seq != self.preview_seq:
+            return
+        if image is not None:
+            self.preview_label.setPixmap(QPixmap.fromImage(image))
+        else:
+            self.preview_label.clear()
+        self.preview_status.setText(status)
+
+    def done(self, result):
+        """关闭对话框时停止预览线程"""
+        self.preview_timer.stop()
+        self.preview_worker.close()
+        super().done(result)
+
     def select_image_file(self):
-        """选择背景图片文件"""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, 
-            "选择背景图片", 
-            "", 
-            "图片文件 (*.png *.jpg *.jpeg *.bmp *.gif *.tiff)"
-        )
-        if file_path:
-            self.image_edit.setText(file_path)
+        """在缩略图浏览器中选择背景图片文件"""
+        current = resolve_preview_image(parse_image_path(self.image_edit.text()), self.base_dir)
+        start_dir = os.path.dirname(current) if current else self.base_dir
+        loader = getattr(self.parent(), 'thumbnail_loader', None)
+        browser = ThumbnailBrowser(self, start_dir, loader, current)
+        if browser.exec_() and browser.selected_path:
+            self.image_edit.setText(browser.selected_path)
+
+    def select_image_folder(self):
+        """选择图片目录（幻灯片）"""
+        folder = QFileDialog.getExistingDirectory(self, "选择图片目录")
+        if folder:
+            self.image_edit.setText(folder)
 
     def save_data(self):
         """保存目标数据"""
         name = self.name_edit.text().strip()
         keywords_str = self.keywords_edit.text().strip()
         keywords = [keyword.strip() for keyword in keywords_str.split(",") if keyword.strip()]
-        image_path = self.image_edit.text().strip()
+        image_path = parse_image_path(self.image_edit.text())
         alpha = self.alpha_spin.value()
         brightness = self.brightness_slider.value() / 100.0
         contrast = self.contrast_slider.value() / 100.0
         saturation = self.saturation_slider.value() / 100.0
+        fit = self.fit_combo.currentData()
+        mask = self.mask_combo.currentData()
+        blur = self.blur_spin.value()
 
         if not name or not keywords or not image_path:
             QMessageBox.warning(self, "输入错误", "请填写完整的目标应用信息（应用名称、关键词和背景图片不能为空）。")
             return
 
-        self.target_data = {
+        # 在原有数据上更新，保留对话框未涉及的高级配置项
+        self.target_data = dict(self.target_data)
+        self.target_data.update({
             "name": name,
             "keywords": keywords,
             "image_path": image_path,
             "alpha": alpha,
             "brightness": brightness,
             "contrast": contrast,
-            "saturation": saturation
-        }
+            "saturation": saturation,
+            "fit": fit,
+            "mask": mask,
+            "blur": blur
+        })
         self.accept()
 
 
+class PreviewWorker(QObject):
+    """
+    预览渲染线程
+
+    只保留一个待处理请求，新请求直接覆盖尚未开始的旧请求；代理图按路径和修改时间缓存，
+    拖动滑块时只需在小图上重新调色。渲染结果通过信号回到UI线程。
+    """
+
+    finished = pyqtSignal(int, object, str)  # 请求序号, QImage或None, 状态文字
+
+    def __init__(self):
+        super().__init__()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self._proxy_key = None
+        self._proxy = None
+        self._thread = threading.Thread(target=self._run, name="preview-render", daemon=True)
+        self._thread.start()
+
+    def submit(self, seq, params, base_dir, window_size):
+        """提交渲染请求（UI线程调用，立即返回）"""
+        with self._cond:
+            self._pending = (seq, params, base_dir, window_size)
+            self._cond.notify()
+
+    def close(self):
+        """停止线程（正在进行的渲染完成后退出，结果不再使用）"""
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                seq, params, base_dir, window_size = self._pending
+                self._pending = None
+            try:
+                image, status = self._render(params, base_dir, window_size)
+            except Exception as e:
+                image, status = None, f"预览失败: {e}"
+            if not self._closed:
+                self.finished.emit(seq, image, status)
+
+    def _render(self, params, base_dir, window_size):
+        """在代理图上按背景创建器的管线渲染，返回 (QImage, 状态文字)"""
+        from image_pipeline import load_proxy, render_preview
+
+        path = resolve_preview_image(params.get("image_path"), base_dir)
+        if not path:
+            return None, "找不到背景图片"
+
+        start = time.perf_counter()
+        key = (path, os.path.getmtime(path))
+        if key != self._proxy_key:
+            self._proxy = load_proxy(path, PREVIEW_PROXY_SIZE)
+            self._proxy_key = key
+        proxy, ratio = self._proxy
+
+        result = render_preview(proxy, ratio, params, PREVIEW_SIZE, window_size)
+        data = result.tobytes("raw", "RGBA")
+        # QImage可以在非UI线程创建；copy()让它持有自己的数据
+        image = QImage(data, result.width, result.height, QImage.Format_RGBA8888).copy()
+        elapsed = (time.perf_counter() - start) * 1000
+        return image, f"预览: {os.path.basename(path)}（{elapsed:.0f} ms）"
+
+
+class ThumbnailLoader(QObject):
+    """
+    缩略图加载线程
+
+    请求按顺序处理，同一请求在完成前只排队一次；读取磁盘缓存或用draft/reduce生成缩略图
+    都在后台线程中进行，UI线程只接收结果。
+    """
+
+    ready = pyqtSignal(str, object)  # 请求标识, QImage或None
+
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._queued = set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="thumbnail-loader", daemon=True)
+        self._thread.start()
+
+    def request(self, token, image_path, base_dir):
+        """请求一张缩略图；image_path可以是配置值（目录/列表取第一张）"""
+        with self._cond:
+            if token in self._queued or self._closed:
+                return
+            self._queued.add(token)
+            self._queue.append((token, image_path, base_dir))
+            self._cond.notify()
+
+    def cancel_pending(self, tokens):
+        """丢弃这些尚未开始的请求（例如浏览器切换了目录）"""
+        tokens = set(tokens)
+        with self._cond:
+            self._queue = deque(entry for entry in self._queue if entry[0] not in tokens)
+            self._queued -= tokens
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify()
+
+    def _run(self):
+        if self.cache is None:
+            from thumbnail_cache import ThumbnailCache
+            self.cache = ThumbnailCache(size=max(BROWSER_THUMBNAIL_SIZE.width(), BROWSER_THUMBNAIL_SIZE.height()))
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                token, image_path, base_dir = self._queue.popleft()
+            image = None
+            try:
+                path = resolve_preview_image(image_path, base_dir)
+                thumbnail = self.cache.get(path) if path else None
+                if thumbnail is not None:
+                    data = thumbnail.tobytes("raw", "RGBA")
+                    image = QImage(data, thumbnail.width, thumbnail.height, QImage.Format_RGBA8888).copy()
+            except Exception:
+                pass  # 以image为None通知模型，记为加载失败
+            with self._cond:
+                self._queued.discard(token)
+                if self._closed:
+                    break
+            self.ready.emit(token, image)
+        # 退出前清理超出上限的旧缓存
+        self.cache.prune()
+
+
+class ThumbnailBrowser(QDialog):
+    """缩略图浏览器：以缩略图列出目录中的图片供选择"""
+
+    def __init__(self, parent, start_dir, loader=None, current_path=None):
+        super().__init__(parent)
+        self.setWindowTitle("选择背景图片")
+        self.resize(620, 460)
+        self.setWindowIcon(QIcon("logo.ico"))
+
+        self.selected_path = None
+        self.current_path = os.path.abspath(current_path) if current_path else None
+        # 对话框自己创建的加载线程在关闭时停止；共用编辑器的线程时只取消排队的请求
+        self.own_loader = loader is None
+        self.loader = loader or ThumbnailLoader()
+        self.loader.ready.connect(self.on_thumbnail_ready)
+        self.items = {}  # 图片路径 -> 列表项
+
+        layout = QVBoxLayout(self)
+        dir_layout = QHBoxLayout()
+        self.dir_label = QLabel(self)
+        self.dir_button = QPushButton("切换目录", self)
+        self.dir_button.clicked.connect(self.choose_directory)
+        self.file_button = QPushButton("浏览文件...", self)
+        self.file_button.clicked.connect(self.choose_file)
+        dir_layout.addWidget(self.dir_label, 1)
+        dir_layout.addWidget(self.dir_button)
+        dir_layout.addWidget(self.file_button)
+        layout.addLayout(dir_layout)
+
+        self.list_widget = QListWidget(self)
+        self.list_widget.setViewMode(QListWidget.IconMode)
+        self.list_widget.setIconSize(BROWSER_THUMBNAIL_SIZE)
+        self.list_widget.setGridSize(QSize(BROWSER_THUMBNAIL_SIZE.width() + 16, BROWSER_THUMBNAIL_SIZE.height() + 36))
+        self.list_widget.setResizeMode(QListWidget.Adjust)
+        self.list_widget.setMovement(QListWidget.Static)
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.itemDoubleClicked.connect(self.accept_item)
+        layout.addWidget(self.list_widget)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        ok_button = QPushButton("确定", self)
+        ok_button.clicked.connect(lambda: self.accept_item(self.list_widget.currentItem()))
+        cancel_button = QPushButton("取消", self)
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+        self.load_directory(start_dir)
+
+    def load_directory(self, directory):
+        """列出目录中的图片，缩略图由加载线程陆续填充"""
+        from image_pipeline import IMAGE_EXTENSIONS
+
+        self.loader.cancel_pending(self.items)
+        self.list_widget.clear()
+        self.items.clear()
+        self.directory = directory
+        self.dir_label.setText(directory)
+        try:
+            names = sorted((name for name in os.listdir(directory)
+                            if name.lower().endswith(IMAGE_EXTENSIONS)), key=str.lower)
+        except OSError as e:
+            self.dir_label.setText(f"{directory}（无法读取: {e}）")
+            return
+
+        for name in names:
+            path = os.path.join(directory, name)
+            item = QListWidgetItem(name)
+            item.setData(Qt.UserRole, path)
+            item.setToolTip(path)
+            item.setSizeHint(self.list_widget.gridSize())
+            self.list_widget.addItem(item)
+            self.items[path] = item
+            if os.path.abspath(path) == self.current_path:
+                self.list_widget.setCurrentItem(item)
+            self.loader.request(path, path, directory)
+
+    def on_thumbnail_ready(self, token, image):
+        item = self.items.get(token)
+        if item is not None and image is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择图片目录", self.directory)
+        if directory:
+            self.load_directory(directory)
+
+    def choose_file(self):
+        """使用系统文件对话框选择"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "选择背景图片",
+            self.directory,
+            "图片文件 (*.png *.jpg *.jpeg *.bmp *.gif *.tiff *.webp)"
+        )
+        if file_path:
+            self.selected_path = file_path
+            self.accept()
+
+    def accept_item(self, item):
+        if item is None:
+            return
+        self.selected_path = item.data(Qt.UserRole)
+        self.accept()
+
+    def done(self, result):
+        """关闭时不再处理本对话框的缩略图请求"""
+        try:
+            self.loader.ready.disconnect(self.on_thumbnail_ready)
+        except TypeError:
+            pass
+        if self.own_loader:
+            self.loader.close()
+        else:
+            self.loader.cancel_pending(self.items)
+        super().done(result)
+
+
+def resolve_preview_image(image_path, base_dir):
+    """找到用于预览的图片文件：多个路径或目录（幻灯片）时取第一张"""
+    from image_pipeline import IMAGE_EXTENSIONS
+
+    if isinstance(image_path, list):
+        image_path = image_path[0] if image_path else ""
+    if not image_path:
+        return None
+    for candidate in (image_path, os.path.join(base_dir, image_path), os.path.join(os.getcwd(), image_path)):
+        if os.path.isfile(candidate):
+            return candidate
+        if os.path.isdir(candidate):
+            for name in sorted(os.listdir(candidate), key=str.lower):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    return os.path.join(candidate, name)
+            return None
+    return None
+
+
+def format_image_path(image_path):
+    """把image_path配置（字符串或列表）转换为编辑框中的文本"""
+    if isinstance(image_path, list):
+        return "; ".join(image_path)
+    return image_path
+
+
+def parse_image_path(text):
+    """解析编辑框文本：分号分隔的多个路径保存为列表，单个路径保存为字符串"""
+    paths = [path.strip() for path in text.split(";") if path.strip()]
+    if len(paths) > 1:
+        return paths
+    return paths[0] if paths else ""
+
+
 def main(config_path="config.json"):
     app = QApplication(sys.argv)
     editor = ConfigEditor(config_path)
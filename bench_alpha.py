@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+透明通道基准测试 (sxxzh定制版)
+比较旧的固定透明度转换与新的逐像素透明（预乘+遮罩）转换的耗时
+只依赖Pillow，可在任意平台运行：python bench_alpha.py [--sizes 1280x720,1920x1080] [--repeat 20]
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import argparse
+import time
+
+from PIL import Image
+
+from image_pipeline import MaskCache, build_mask, plan_mask, to_layered_bgra
+
+
+def legacy_constant_alpha(img, alpha=102):
+    """旧实现：丢弃图片透明通道，换成固定透明度平面（AlphaFormat=0）"""
+    r, g, b, _ = img.split()
+    a = Image.new("L", img.size, alpha)
+    return Image.merge("RGBA", (b, g, r, a)).tobytes()
+
+
+def make_image(size, transparent):
+    """生成测试图：渐变色，可选带半透明区域"""
+    w, h = size
+    img = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.radial_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+    )).convert("RGBA")
+    if transparent:
+        img.putalpha(Image.linear_gradient("L").rotate(90).resize(size))
+    return img
+
+
+def measure(func, repeat):
+    """运行repeat次，返回中位数耗时（毫秒）"""
+    func()  # 预热
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def run_benchmarks(size, repeat):
+    """对一个窗口尺寸运行全部用例，返回 [(名称, 毫秒)]"""
+    opaque = make_image(size, transparent=False)
+    transparent = make_image(size, transparent=True)
+    edge_cache = MaskCache('edge_fade', 0.1)
+    vignette_cache = MaskCache('vignette', 0.2)
+
+    cases = [
+        ("旧: 固定透明度", lambda: legacy_constant_alpha(opaque)),
+        ("新: 不透明快速路径", lambda: to_layered_bgra(opaque)),
+        ("新: 透明PNG预乘", lambda: to_layered_bgra(transparent)),
+        ("新: 边缘渐隐(遮罩已缓存)", lambda: to_layered_bgra(opaque, edge_cache.get(size))),
+        ("新: 暗角渐隐(遮罩已缓存)", lambda: to_layered_bgra(opaque, vignette_cache.get(size))),
+        ("生成并分块边缘渐隐遮罩(未缓存)", lambda: plan_mask(build_mask('edge_fade', size, 0.1))),
+        ("生成并分块暗角渐隐遮罩(未缓存)", lambda: plan_mask(build_mask('vignette', size, 0.2))),
+    ]
+    return [(name, measure(func, repeat)) for name, func in cases]
+
+
+def parse_size(text):
+    """解析 宽x高"""
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐像素透明与固定透明度转换的基准测试")
+    parser.add_argument("--sizes", default="800x600,1920x1080,2560x1440",
+                        help="逗号分隔的窗口尺寸，如 1920x1080")
+    parser.add_argument("--repeat", type=int, default=20, help="每个用例的重复次数")
+    args = parser.parse_args()
+
+    for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+        results = run_benchmarks(size, max(1, args.repeat))
+        baseline = results[0][1]
+        print(f"\n窗口尺寸 {size[0]}x{size[1]} (中位数, {args.repeat} 次)")
+        for name, ms in results:
+            print(f"  {name:<24} {ms:8.2f} ms  ({ms / baseline:5.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
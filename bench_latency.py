@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+首个背景显示延迟基准 (sxxzh定制版)
+测量从"窗口出现"到"背景可见"的端到端延迟，并按阶段拆分：
+  scan_wait   等待下一次扫描（按scan_interval和随机的出现时刻模拟）
+  find        find_target_windows（模拟窗口后端，含若干不匹配的窗口）
+  config      写入临时配置文件
+  popen       创建子进程
+  interpreter 子进程解释器启动
+  imports     导入bg_creator（PIL、image_pipeline、pywin32等）
+  read_config 子进程读取并删除配置文件
+  window      创建分层窗口（仅Windows）
+  decode      解码合成图片并调色
+  render      第一次按窗口大小适配并转换为BGRA
+  blit        提交到分层窗口（非Windows只复制到DIB大小的缓冲区）
+  report      子进程发出就绪上报到检测器读到
+每个阶段输出多次运行的p50/p95，便于分别跟踪
+用法：python bench_latency.py [--runs 20] [--size 1920x1080] [--window 1280x800] [--json 结果.json]
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import time
+
+# 子进程模式下尽早记录时间，作为解释器启动完成的时刻
+STARTED = time.perf_counter()
+
+import os
+import sys
+import json
+
+STAGES = ["scan_wait", "find", "config", "popen", "interpreter", "imports", "read_config",
+          "window", "decode", "render", "blit", "report"]
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[bench-latency] {timestamp} - {msg}")
+
+
+def _create_layer_window(w, h):
+    """创建一个不显示的分层窗口，用于测量真实的UpdateLayeredWindow（仅Windows）"""
+    import win32gui
+    import win32con
+    ws_ex_toolwindow = 0x80
+    return win32gui.CreateWindowEx(
+        0x80000 | 0x20 | ws_ex_toolwindow,  # WS_EX_LAYERED | WS_EX_TRANSPARENT
+        "Static", "", win32con.WS_POPUP,
+        -w - 100, -h - 100, w, h, None, 0, 0, None
+    )
+
+
+def child_main(target_hwnd, config_file):
+    """子进程：按背景创建器的启动顺序执行一遍，并上报各阶段的时间点"""
+    marks = {'started': STARTED}
+
+    import bg_creator
+    from window_backend import SimulatedWindowBackend
+    marks['imported'] = time.perf_counter()
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    try:
+        os.remove(config_file)
+    except OSError:
+        pass
+    marks['config_read'] = time.perf_counter()
+
+    w, h = config['window_size']
+    backend = SimulatedWindowBackend()
+    backend.set_window(target_hwnd, rect=(0, 0, w, h))
+    creator = bg_creator.BackgroundCreator(target_hwnd, config, backend)
+    creator.current_size = (w, h)
+    real_blit = sys.platform == 'win32'
+    if real_blit:
+        creator.bg_hwnd = _create_layer_window(w, h)
+    marks['window'] = time.perf_counter()
+
+    if not creator.set_image():
+        sys.exit(2)
+    marks['decoded'] = time.perf_counter()
+
+    raw_data = creator._render_frame(creator.renderer.render(creator.img, w, h))
+    marks['rendered'] = time.perf_counter()
+
+    if real_blit:
+        creator._blit(raw_data, w, h)
+        import win32gui
+        win32gui.DestroyWindow(creator.bg_hwnd)
+    else:
+        import ctypes
+        buffer = ctypes.create_string_buffer(len(raw_data))
+        ctypes.memmove(buffer, raw_data, len(raw_data))
+    marks['blitted'] = time.perf_counter()
+
+    bg_creator.report("latency", marks=marks, real_blit=real_blit)
+
+
+def make_synthetic_image(path, size):
+    """生成一张渐变加噪点的JPEG，解码开销接近真实照片"""
+    from PIL import Image
+    base = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.radial_gradient("L").resize(size),
+        Image.effect_noise(size, 64),
+    ))
+    base.save(path, "JPEG", quality=90)
+    return path
+
+
+def make_backend(target_hwnd, window_size, noise_windows):
+    """模拟窗口后端：一个目标窗口和若干不匹配的普通窗口"""
+    from window_backend import SimulatedWindowBackend
+    backend = SimulatedWindowBackend()
+    for index in range(noise_windows):
+        backend.set_window(0x20000 + index * 4, exe="other.exe", title=f"其他窗口 {index}",
+                           cls="OtherWnd", rect=(0, 0, 800, 600))
+    w, h = window_size
+    backend.set_window(target_hwnd, exe="latency.exe", title="延迟测试", cls="LatencyWnd",
+                       rect=(100, 100, 100 + w, 100 + h))
+    return backend
+
+
+def run_once(rng, args, image_path, target_hwnd):
+    """完整测量一次，返回 {阶段: 毫秒}"""
+    import subprocess
+    import tempfile
+    import uuid
+    from window_detector import WindowDetector
+
+    stages = {}
+    # 窗口在两次扫描之间的任意时刻出现，平均要等半个扫描间隔
+    stages['scan_wait'] = rng.uniform(0, args.scan_interval) * 1000
+
+    target = {"name": "Latency", "keywords": ["latency.exe"], "image_path": image_path, "alpha": 40}
+    backend = make_backend(target_hwnd, args.window, args.noise_windows)
+    detector = WindowDetector(None, backend=backend, process_manager=None)
+    start = time.perf_counter()
+    matched = detector.find_target_windows([target])
+    stages['find'] = (time.perf_counter() - start) * 1000
+    if not matched:
+        raise RuntimeError("模拟窗口没有被匹配到")
+
+    # 与ProcessManager.start_bg_creator相同的临时配置文件写法
+    config = dict(matched[0][1], window_size=list(args.window))
+    start = time.perf_counter()
+    config_file = os.path.join(tempfile.gettempdir(), f"window_bg_config_{uuid.uuid4().hex}.json")
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    stages['config'] = (time.perf_counter() - start) * 1000
+
+    cmd = [args.python, os.path.abspath(__file__), "--child", str(target_hwnd), config_file]
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    spawned = time.perf_counter()
+    stages['popen'] = (spawned - start) * 1000
+
+    marks = None
+    for raw_line in process.stdout:
+        if raw_line.startswith(b"@@"):
+            received = time.perf_counter()
+            message = json.loads(raw_line[2:].decode('utf-8'))
+            if message.get('type') == 'latency':
+                marks = message['marks']
+                break
+    process.stdout.close()
+    process.wait()
+    if marks is None:
+        raise RuntimeError(f"子进程没有上报（返回码 {process.returncode}）")
+
+    # perf_counter在Windows（QPC）和Linux（CLOCK_MONOTONIC）上是系统范围的，可跨进程相减
+    stages['interpreter'] = (marks['started'] - spawned) * 1000
+    stages['imports'] = (marks['imported'] - marks['started']) * 1000
+    stages['read_config'] = (marks['config_read'] - marks['imported']) * 1000
+    stages['window'] = (marks['window'] - marks['config_read']) * 1000
+    stages['decode'] = (marks['decoded'] - marks['window']) * 1000
+    stages['render'] = (marks['rendered'] - marks['decoded']) * 1000
+    stages['blit'] = (marks['blitted'] - marks['rendered']) * 1000
+    stages['report'] = (received - marks['blitted']) * 1000
+    return stages
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main():
+    import random
+    import argparse
+    import tempfile
+    from trace_replay import percentile
+
+    parser = argparse.ArgumentParser(description="测量窗口出现到背景可见的各阶段延迟")
+    parser.add_argument("--runs", type=int, default=20, help="运行次数")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080), help="合成图片尺寸，如1920x1080")
+    parser.add_argument("--window", type=parse_size, default=(1280, 800), help="目标窗口客户区尺寸")
+    parser.add_argument("--image", help="使用指定图片代替合成图片")
+    parser.add_argument("--scan-interval", type=float, default=3, help="扫描间隔（秒），用于模拟扫描等待")
+    parser.add_argument("--noise-windows", type=int, default=40, help="模拟的不匹配窗口数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--json", help="把各阶段的统计写入JSON文件，便于比较不同版本")
+    parser.add_argument("--python", default=sys.executable, help="运行子进程的Python解释器")
+    args = parser.parse_args()
+
+    image_path = args.image
+    if not image_path:
+        image_path = os.path.join(tempfile.gettempdir(), f"bench_latency_{args.size[0]}x{args.size[1]}.jpg")
+        if not os.path.exists(image_path):
+            make_synthetic_image(image_path, args.size)
+    image_path = os.path.abspath(image_path)
+
+    rng = random.Random(args.seed)
+    results = {stage: [] for stage in STAGES + ["total", "total_without_scan"]}
+    log(f"图片 {image_path}，窗口 {args.window[0]}x{args.window[1]}，运行 {args.runs} 次")
+    for index in range(max(1, args.runs)):
+        try:
+            stages = run_once(rng, args, image_path, 0x10000 + index * 4)
+        except Exception as e:
+            log(f"第 {index + 1} 次运行失败: {e}")
+            sys.exit(1)
+        for stage, elapsed in stages.items():
+            results[stage].append(elapsed)
+        results['total'].append(sum(stages.values()))
+        results['total_without_scan'].append(sum(stages.values()) - stages['scan_wait'])
+
+    summary = {}
+    print(f"\n{'阶段':<20}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, values in results.items():
+        summary[stage] = {'p50': round(percentile(values, 50), 2), 'p95': round(percentile(values, 95), 2)}
+        print(f"{stage:<20}{summary[stage]['p50']:>10.2f}{summary[stage]['p95']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'runs': args.runs, 'image_size': list(args.size), 'window': list(args.window),
+                       'scan_interval': args.scan_interval, 'stages': summary},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "--child":
+        child_main(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
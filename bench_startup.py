@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动导入耗时基准 (sxxzh定制版)
+用 python -X importtime 测量每种运行模式启动时导入模块的耗时，超出预算或加载了不该加载的模块时以非零状态退出
+用法：python bench_startup.py [--repeat 5] [--budget-scale 1.5] [--top 8]
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+# 每种运行模式启动时会导入的模块、导入耗时预算（毫秒），以及该模式下不应被导入的模块
+MODES = {
+    'main': {
+        'imports': ["main"],
+        'budget_ms': 60,
+        'forbidden': ["PIL", "pystray", "PyQt5", "asyncio", "target_manager", "window_detector", "bg_creator"],
+    },
+    'bg-creator': {
+        'imports': ["main", "bg_creator"],
+        'budget_ms': 250,
+        'forbidden': ["pystray", "PyQt5", "asyncio", "target_manager", "window_detector", "sampling_profiler"],
+    },
+    'config-editor': {
+        'imports': ["main", "UI"],
+        'budget_ms': 600,
+        'forbidden': ["pystray", "asyncio", "window_detector", "bg_creator"],
+    },
+    'tray': {
+        'imports': ["main", "asyncio", "pystray", "PIL.ImageDraw", "target_manager", "window_detector"],
+        'budget_ms': 400,
+        'forbidden': ["PyQt5", "bg_creator"],
+    },
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 (顶层导入总耗时ms, {模块: 累计耗时ms})"""
+    total_us = 0
+    cumulative = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        cumulative[name] = int(cumulative_us) / 1000
+        # 缩进只有一个空格的是顶层导入，其累计时间已包含全部子模块
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return total_us / 1000, cumulative
+
+
+def run_mode(mode, python, cwd):
+    """在新的解释器中导入一次某模式的模块，返回 (导入耗时ms, 进程总耗时ms, 各模块耗时, 违规模块, 错误)"""
+    spec = MODES[mode]
+    forbidden = spec['forbidden']
+    code = "; ".join(f"import {name}" for name in spec['imports'])
+    code += (f"; import sys; print(','.join(m for m in {forbidden!r} "
+             f"if any(k == m or k.startswith(m + '.') for k in sys.modules)))")
+
+    start = time.perf_counter()
+    result = subprocess.run([python, "-X", "importtime", "-c", code], cwd=cwd,
+                            capture_output=True, text=True, encoding="utf-8", errors="replace")
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        return None, wall_ms, {}, [], lines[-1] if lines else f"退出码 {result.returncode}"
+
+    import_ms, cumulative = parse_importtime(result.stderr)
+    leaked = [name for name in result.stdout.strip().split(",") if name]
+    return import_ms, wall_ms, cumulative, leaked, None
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量各运行模式的启动导入耗时并检查预算")
+    parser.add_argument("--modes", default=",".join(MODES), help="逗号分隔的模式：" + ", ".join(MODES))
+    parser.add_argument("--repeat", type=int, default=5, help="每个模式的重复次数（取中位数）")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="预算倍数，慢速机器或CI上可适当放宽")
+    parser.add_argument("--top", type=int, default=8, help="每个模式显示最慢的前N个模块")
+    parser.add_argument("--python", default=sys.executable, help="用于测量的Python解释器")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if mode not in MODES:
+            print(f"未知模式: {mode}")
+            failed = True
+            continue
+
+        budget = MODES[mode]['budget_ms'] * args.budget_scale
+        runs = []
+        error = None
+        for _ in range(max(1, args.repeat)):
+            import_ms, wall_ms, cumulative, leaked, error = run_mode(mode, args.python, cwd)
+            if error:
+                break
+            runs.append((import_ms, wall_ms, cumulative, leaked))
+
+        if error:
+            # 缺少可选依赖（如非Windows环境没有pywin32）时跳过，不算失败
+            print(f"\n[{mode}] 跳过：{error}")
+            continue
+
+        import_ms = median([run[0] for run in runs])
+        wall_ms = median([run[1] for run in runs])
+        leaked = sorted(set(name for run in runs for name in run[3]))
+        over_budget = import_ms > budget
+        status = "超出预算" if over_budget or leaked else "通过"
+        failed = failed or over_budget or bool(leaked)
+
+        print(f"\n[{mode}] {status}：导入 {import_ms:.1f} ms / 预算 {budget:.0f} ms，"
+              f"进程总耗时 {wall_ms:.1f} ms（中位数，{len(runs)} 次）")
+        if leaked:
+            print(f"  不应导入的模块: {', '.join(leaked)}")
+        slowest = sorted(runs[-1][2].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, ms in slowest:
+            print(f"  {ms:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
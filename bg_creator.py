@@ -11,15 +11,22 @@
 import os
 import sys
 import ctypes
-import win32gui
-import win32con
-import win32api
-import win32process
-from PIL import Image, ImageEnhance
+try:
+    import win32gui
+    import win32con
+    import win32api
+    import win32process
+    import pythoncom
+except ImportError:
+    # 非Windows环境（trace_replay.py离线回放）只使用模拟窗口后端
+    win32gui = win32con = win32api = win32process = pythoncom = None
+from PIL import Image
+from image_pipeline import IMAGE_EXTENSIONS, FitRenderer, FrameCache, MaskCache, adjust_image, to_layered_bgra
+from window_backend import Win32WindowBackend
+from image_store import load_decoded, resolve_image_path
 import time
 import json
 import threading
-import pythoncom
 
 def log(msg):
     """简单的日志输出"""
@@ -31,6 +38,67 @@ def log(msg):
         safe_msg = msg.encode('ascii', 'ignore').decode('ascii')
         print(f"[bg-creator] {timestamp} - {safe_msg}")
 
+# 结构化消息前缀：窗口检测器据此区分状态上报与普通日志
+REPORT_PREFIX = "@@"
+
+def _subtract_rect(rect, cut):
+    """从矩形中减去另一个矩形，返回剩余部分（最多4个矩形）"""
+    left, top, right, bottom = rect
+    c_left, c_top, c_right, c_bottom = cut
+    if c_left >= right or c_right <= left or c_top >= bottom or c_bottom <= top:
+        return [rect]
+    pieces = []
+    if c_top > top:
+        pieces.append((left, top, right, c_top))
+    if c_bottom < bottom:
+        pieces.append((left, c_bottom, right, bottom))
+    middle_top, middle_bottom = max(top, c_top), min(bottom, c_bottom)
+    if c_left > left:
+        pieces.append((left, middle_top, c_left, middle_bottom))
+    if c_right < right:
+        pieces.append((c_right, middle_top, right, middle_bottom))
+    return pieces
+
+def is_rect_covered(rect, covers):
+    """判断矩形是否被一组矩形完全覆盖"""
+    remaining = [rect]
+    for cut in covers:
+        next_remaining = []
+        for piece in remaining:
+            next_remaining.extend(_subtract_rect(piece, cut))
+        remaining = next_remaining
+        if not remaining:
+            return True
+    return False
+
+def report(kind, **data):
+    """向窗口检测器上报状态（通过标准输出的单行JSON）"""
+    data['type'] = kind
+    try:
+        print(REPORT_PREFIX + json.dumps(data), flush=True)
+    except Exception:
+        # 父进程已退出或输出不可用时忽略
+        pass
+
+# DIB位图结构（每次提交分层窗口内容时使用，只定义一次）
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ("biSize", ctypes.c_uint32),
+        ("biWidth", ctypes.c_long),
+        ("biHeight", ctypes.c_long),
+        ("biPlanes", ctypes.c_ushort),
+        ("biBitCount", ctypes.c_ushort),
+        ("biCompression", ctypes.c_uint32),
+        ("biSizeImage", ctypes.c_uint32),
+        ("biXPelsPerMeter", ctypes.c_long),
+        ("biYPelsPerMeter", ctypes.c_long),
+        ("biClrUsed", ctypes.c_uint32),
+        ("biClrImportant", ctypes.c_uint32)
+    ]
+
+class BITMAPINFO(ctypes.Structure):
+    _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", ctypes.c_uint32 * 3)]
+
 class BackgroundCreator:
     """背景创建器类 - 基于v3版本实现"""
     
@@ -41,6 +109,28 @@ class BackgroundCreator:
     AC_SRC_OVER = 0x0
     AC_SRC_ALPHA = 0x1
     
+    # 遮挡检测需要遍历Z序，开销比其他检查大，降低检查频率
+    OCCLUSION_CHECK_INTERVAL = 0.5
+    
+    # 动画播放时上报CPU/内存开销的间隔（秒）
+    ANIMATION_REPORT_INTERVAL = 10
+    
+    # 轨迹事件中目标不可见的原因
+    TRACE_HIDDEN_STATES = {"不可见": "hidden", "最小化": "iconic", "被遮挡": "occluded"}
+    
+    # 幻灯片：提前准备下一张的时间（秒）
+    SLIDE_PREFETCH_LEAD = 10
+    
+    # 目标窗口几何停止变化超过该时间（秒）视为一次拖动结束
+    DRAG_SETTLE = 0.3
+    
+    # 轮询间隔（秒）；检测器因CPU超限下发throttle命令或使用电池时改用较长间隔和较低帧率
+    POLL_INTERVAL = 0.05
+    THROTTLED_POLL_INTERVAL = 0.2
+    THROTTLED_MAX_FPS = 5
+    # 锁屏或显示器关闭（电源模式suspended）时只检查窗口是否还存在
+    SUSPENDED_POLL_INTERVAL = 1.0
+    
     # ctypes结构体定义
     class POINT(ctypes.Structure):
         _fields_ = [("x", ctypes.c_long), ("y", ctypes.c_long)]
@@ -56,20 +146,39 @@ class BackgroundCreator:
             ("AlphaFormat", ctypes.c_byte)
         ]
     
-    def __init__(self, target_hwnd, config):
+    def __init__(self, target_hwnd, config, backend=None):
         """
         初始化背景创建器
         
         Args:
             target_hwnd: 目标窗口句柄
             config: 配置参数
+            backend: 窗口后端，默认为真实的Win32后端
         """
         self.target_hwnd = target_hwnd
         self.config = config
+        self.backend = backend or Win32WindowBackend()
         self.bg_hwnd = None
         self.should_exit = False
         self.use_window_rect = False
         self.current_size = (0, 0)
+        # 弹出窗口模式（use_window_rect）下背景的屏幕位置；子窗口模式跟随父窗口移动，为None
+        self.current_pos = None
+        self.img = None
+        self.render_lock = threading.RLock()
+        
+        # 目标不可见（隐藏/最小化/被完全遮挡）时的挂起状态
+        self.park_delay = config.get('park_delay', 10)
+        self.parked = False
+        self.hidden_since = None
+        self.hidden_reason = ""
+        self.occluded = False
+        self.last_occlusion_check = 0
+        
+        # 内存预算：检测器要求降级后源图可能被缩小或释放，需要时再重新加载
+        self.source_limited = False
+        self.trim_level = 0
+        self._last_memory_report = None
         
         # 从配置中获取参数
         self.image_path = config.get('image_path', 'background.png')
@@ -77,9 +186,56 @@ class BackgroundCreator:
         self.brightness = config.get('brightness', 1.0)
         self.contrast = config.get('contrast', 1.0)
         self.saturation = config.get('saturation', 1.0)
+        self.fit = config.get('fit', 'stretch')
+        # 毛玻璃模糊：模糊底图按源图缓存，尺寸变化时只做一次放大
+        self.blur = config.get('blur', 0)
+        self.blur_quality = config.get('blur_quality', 0.25)
+        self.throttle_level = 0
+        self.power_mode = "normal"  # 检测器下发的电源模式：normal / saver / suspended
+        self.poll_interval = self.POLL_INTERVAL
+        self.poll_wakeup = threading.Event()
+        self.renderer = self._create_renderer()
+        
+        # 逐像素透明：图片自身的透明通道乘以按窗口尺寸缓存的渐隐遮罩
+        self.mask_cache = MaskCache(config.get('mask', 'none'), config.get('mask_size', 0.1))
+        
+        # 动画背景：帧只解码和调色一次，按窗口尺寸渲染后放入有上限的帧缓存
+        self.animate = config.get('animate', True)
+        self.min_frame_interval = 1.0 / max(1.0, float(config.get('max_fps', 15)))
+        self.pause_when_inactive = config.get('pause_when_inactive', True)
+        self.frames = None  # [(调色后的帧或None, 持续毫秒数)]，None表示该帧不常驻，播放时按需解码
+        # 常驻的解码帧总量上限；超出的帧从仍打开的动画图片按需解码（渲染结果仍进入帧缓存）
+        self.animation_source_bytes = int(config.get('animation_source_mb', 128)) * 1048576
+        self.animation_image = None
+        self.frame_index = 0
+        self.frame_cache = FrameCache(int(config.get('frame_cache_mb', 64)) * 1048576)
+        self.animation_playing = False
+        self.animation_wakeup = threading.Event()
+        
+        # 幻灯片：image_path为目录或列表时按间隔轮换，下一张在工作线程中提前准备
+        self.slide_interval = max(1.0, float(config.get('slide_interval', 300)))
+        self.slide_shuffle = config.get('shuffle', False)
+        self.slides = []
+        self.slide_index = 0  # 当前显示的幻灯片，只在切换成功时改变
+        self.next_slide = None  # 下一次预加载的候选；None表示当前之后的一张，加载失败时向后跳过
+        self.prefetched = None  # 已准备好的下一张 {'index', 'image', 'renderer', 'size', 'raw'}
+        self.slide_wakeup = threading.Event()
+        self.target_presented = True
+        
+        # 采样性能分析（由检测器下发profile命令开启）
+        self.profiler = None
+        
+        # 窗口事件轨迹：检测器下发trace命令后上报目标窗口的几何与可见性变化
+        self.trace_enabled = False
+        self._last_trace_state = None
+        
+        # 拖动统计：纯移动只移动分层窗口，尺寸变化才重新渲染
+        self.move_count = 0
+        self.resize_render_count = 0
+        self._drag = None  # 当前拖动 {'start', 'last', 'moves', 'renders'}
         
         # 获取目标窗口名称
-        self.target_name = win32gui.GetWindowText(target_hwnd) or f"窗口_{target_hwnd}"
+        self.target_name = self.backend.get_title(target_hwnd) or f"窗口_{target_hwnd}"
         
         log(f"背景创建器初始化 - 目标窗口: {target_hwnd} ({self.target_name}), 透明度: {self.alpha}")
     
@@ -182,6 +338,8 @@ class BackgroundCreator:
             
             win32gui.ShowWindow(self.bg_hwnd, win32con.SW_SHOW)
             self.current_size = (w, h)
+            self.current_pos = (x, y) if self.use_window_rect else None
+            self.renderer.expected_size = self._monitor_size()
             log(f"  ✓ 背景窗口已创建 (hwnd: {self.bg_hwnd})")
             return True
             
@@ -221,50 +379,146 @@ class BackgroundCreator:
         
         return None
     
+    def _create_renderer(self, expected_size=None):
+        """按当前的布局和模糊设置创建渲染器"""
+        # 限流时使用较便宜的双线性滤镜
+        resample = Image.BILINEAR if self._throttled() else Image.LANCZOS
+        return FitRenderer(self.fit, expected_size, resample=resample,
+                           blur=self.blur, blur_quality=self.blur_quality)
+    
+    def _resolve_image_path(self, path):
+        """把配置中的图片路径转换为绝对路径（相对路径基于程序所在目录）"""
+        return resolve_image_path(path)
+    
+    def _collect_slides(self):
+        """把目录或列表形式的图片路径展开为幻灯片列表，只有一张图片时返回空列表"""
+        entries = self.image_path if isinstance(self.image_path, list) else [self.image_path]
+        slides = []
+        for entry in entries:
+            path = self._resolve_image_path(entry)
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path), key=str.lower):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        slides.append(os.path.join(path, name))
+            else:
+                slides.append(path)
+        
+        if len(slides) == 1:
+            self.image_path = slides[0]
+            return []
+        if self.slide_shuffle:
+            import random
+            random.shuffle(slides)
+        return slides
+    
     def set_image(self):
         """设置背景图片及参数"""
-        # 固定图片路径为相对于可执行文件的相对路径
-        image_path = None
-        
-        # 首先检查是否是绝对路径
-        if os.path.isabs(self.image_path):
-            image_path = self.image_path
+        if self.slides:
+            image_path = self.slides[self.slide_index]
+            if not os.path.exists(image_path):
+                log(f"  ⚠️  幻灯片图片不存在: {image_path}")
+                return False
+        elif isinstance(self.image_path, list) or os.path.isdir(self._resolve_image_path(self.image_path)):
+            log(f"  ⚠️  没有找到可用的图片: {self.image_path}")
+            return False
         else:
-            # 相对路径，优先使用可执行文件所在目录
-            if getattr(sys, 'frozen', False):
-                # 打包后环境：相对于可执行文件目录
-                base_path = os.path.dirname(sys.executable)
-                image_path = os.path.join(base_path, self.image_path)
-            else:
-                # 开发环境：相对于脚本文件目录
-                base_path = os.path.dirname(os.path.abspath(__file__))
-                image_path = os.path.join(base_path, self.image_path)
+            # 固定图片路径为相对于可执行文件的相对路径
+            image_path = self._resolve_image_path(self.image_path)
+            if not os.path.isabs(self.image_path):
+                log(f"  图片路径: {image_path}")
             
-            log(f"  图片路径: {image_path}")
+            if not os.path.exists(image_path):
+                log(f"  ⚠️  图片不存在，尝试的路径:")
+                if os.path.isabs(self.image_path):
+                    log(f"    绝对路径: {self.image_path}")
+                else:
+                    possible_paths = [
+                        os.path.join(os.getcwd(), self.image_path),
+                        os.path.join(os.path.dirname(sys.executable), self.image_path) if getattr(sys, 'frozen', False) else None,
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), self.image_path)
+                    ]
+                    for path in possible_paths:
+                        if path:
+                            log(f"    尝试路径: {path}")
+                return False
         
-        if not image_path or not os.path.exists(image_path):
-            log(f"  ⚠️  图片不存在，尝试的路径:")
-            if os.path.isabs(self.image_path):
-                log(f"    绝对路径: {self.image_path}")
-            else:
-                possible_paths = [
-                    os.path.join(os.getcwd(), self.image_path),
-                    os.path.join(os.path.dirname(sys.executable), self.image_path) if getattr(sys, 'frozen', False) else None,
-                    os.path.join(os.path.dirname(os.path.abspath(__file__)), self.image_path)
-                ]
-                for path in possible_paths:
-                    if path:
-                        log(f"    尝试路径: {path}")
-            return False
+        # 检测器已解码好的共享数据（内存映射，与使用同一图片的其他进程共享）
+        decoded = self.config.get('decoded')
+        if decoded and not self.slides and decoded.get('source') == image_path:
+            shared = load_decoded(decoded)
+            if shared is not None:
+                self.frames = None
+                self.animation_image = None
+                # 已是RGBA，不再convert以免复制共享数据；检测器已按本目标的参数调色时直接引用映射，
+                # 参数不一致时才在本进程中调色（得到私有副本）
+                adjust = (self.brightness, self.contrast, self.saturation)
+                if tuple(decoded.get('adjust', (1.0, 1.0, 1.0))) != adjust:
+                    shared = adjust_image(shared, *adjust)
+                self.img = shared
+                self.source_limited = False
+                log(f"  ✓ 图片加载成功（共享解码）: {image_path} (alpha: {self.alpha})")
+                return True
         
         try:
-            self.img = Image.open(image_path).convert("RGBA")
+            # 颜色调整只在加载时做一次，之后的尺寸变化只需布局适配
+            img = Image.open(image_path)
+            # 幻灯片中的动画图片只显示第一帧
+            if self.animate and not self.slides and getattr(img, 'is_animated', False):
+                self.frames = self._load_animation(img)
+                self.frame_index %= len(self.frames)
+                # 第一帧始终常驻，作为源图尺寸的基准
+                self.img = self.frames[0][0]
+                self.frame_cache.clear()
+                resident = sum(1 for frame, _ in self.frames if frame is not None)
+                log(f"  ✓ 动画加载成功: {image_path} ({len(self.frames)} 帧, 常驻 {resident} 帧)")
+                # 唤醒播放线程
+                self.animation_wakeup.set()
+            else:
+                self.frames = None
+                self.animation_image = None
+                self.img = adjust_image(img.convert("RGBA"), self.brightness, self.contrast, self.saturation)
+            self.source_limited = False
             log(f"  ✓ 图片加载成功: {image_path} (alpha: {self.alpha})")
             return True
         except Exception as e:
             log(f"  ❌ 加载图片失败: {e}")
             return False
     
+    def _load_animation(self, img):
+        """
+        解码动画并调色，返回 [(帧或None, 持续毫秒数)]
+        
+        解码帧总量不超过animation_source_mb（第一帧除外），其余帧只记录时长，
+        图片保持打开，播放到时再由_animation_source按需解码
+        """
+        frames = []
+        resident_bytes = 0
+        frame_bytes = img.width * img.height * 4
+        for index in range(img.n_frames):
+            img.seek(index)
+            duration = img.info.get('duration') or 100
+            if index == 0 or resident_bytes + frame_bytes <= self.animation_source_bytes:
+                frame = adjust_image(img.convert("RGBA"), self.brightness, self.contrast, self.saturation)
+                resident_bytes += frame_bytes
+            else:
+                frame = None
+            frames.append((frame, duration))
+        self.animation_image = img if any(frame is None for frame, _ in frames) else None
+        return frames
+    
+    def _animation_source(self, index):
+        """动画第index帧的源图：常驻帧直接返回，否则从打开的图片解码（与常驻帧同样调色和缩小）"""
+        frame = self.frames[index][0]
+        if frame is not None:
+            return frame
+        with self.render_lock:
+            self.animation_image.seek(index)
+            frame = adjust_image(self.animation_image.convert("RGBA"),
+                                 self.brightness, self.contrast, self.saturation)
+        if frame.size != self.img.size:
+            frame = frame.resize(self.img.size, Image.LANCZOS)
+        return frame
+    
     def update(self):
         """更新背景窗口 - 简化版本，只负责初始更新"""
         if not self.bg_hwnd or not self.img:
@@ -292,6 +546,7 @@ class BackgroundCreator:
                 # 更新窗口位置和大小
                 win32gui.MoveWindow(self.bg_hwnd, x, y, w, h, True)
                 self.current_size = (w, h)
+                self.current_pos = (x, y) if self.use_window_rect else None
                 
                 # 更新分层窗口
                 self._update_layered_window(w, h)
@@ -315,43 +570,39 @@ class BackgroundCreator:
             log(f"更新背景窗口时出错: {e}")
             return False
     
+    def _ensure_source(self, w, h):
+        """确保源图可用：被释放后重新加载，被缩小且不够大时重新加载原图"""
+        if self.img is None:
+            return self.set_image()
+        if self.source_limited and (w > self.img.width or h > self.img.height):
+            log("窗口大于已缩小的源图，重新加载原图")
+            return self.set_image()
+        return True
+    
     def _update_layered_window(self, w, h):
         """使用分层窗口API更新背景"""
-        img = self.img.resize((w, h), Image.LANCZOS)
-        
-        if self.brightness != 1.0:
-            img = ImageEnhance.Brightness(img).enhance(self.brightness)
-        if self.contrast != 1.0:
-            img = ImageEnhance.Contrast(img).enhance(self.contrast)
-        if self.saturation != 1.0:
-            img = ImageEnhance.Color(img).enhance(self.saturation)
-        
-        r, g, b, _ = img.split()
-        a = Image.new("L", img.size, self.alpha)
-        img_pre = Image.merge("RGBA", (b, g, r, a))
-        raw_data = img_pre.tobytes()
-        
-        hdc = win32gui.GetDC(0)
-        hdc_mem = win32gui.CreateCompatibleDC(hdc)
-
-        class BITMAPINFOHEADER(ctypes.Structure):
-            _fields_ = [
-                ("biSize", ctypes.c_uint32),
-                ("biWidth", ctypes.c_long),
-                ("biHeight", ctypes.c_long),
-                ("biPlanes", ctypes.c_ushort),
-                ("biBitCount", ctypes.c_ushort),
-                ("biCompression", ctypes.c_uint32),
-                ("biSizeImage", ctypes.c_uint32),
-                ("biXPelsPerMeter", ctypes.c_long),
-                ("biYPelsPerMeter", ctypes.c_long),
-                ("biClrUsed", ctypes.c_uint32),
-                ("biClrImportant", ctypes.c_uint32)
-            ]
-
-        class BITMAPINFO(ctypes.Structure):
-            _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", ctypes.c_uint32 * 3)]
-
+        if not self._ensure_source(w, h):
+            return
+        if self.frames:
+            raw_data = self._get_animation_frame(self.frame_index, w, h)
+        else:
+            raw_data = self._render_frame(self.renderer.render(self.img, w, h))
+        self._blit(raw_data, w, h)
+    
+    def _render_frame(self, img):
+        """把适配好尺寸的RGBA图像转换为分层窗口需要的预乘BGRA数据"""
+        return to_layered_bgra(img, self.mask_cache.get(img.size))
+    
+    def _get_animation_frame(self, index, w, h):
+        """获取指定尺寸下的动画帧数据，优先使用帧缓存"""
+        raw_data = self.frame_cache.get((w, h), index)
+        if raw_data is None:
+            raw_data = self._render_frame(self.renderer.render(self._animation_source(index), w, h))
+            self.frame_cache.put((w, h), index, raw_data)
+        return raw_data
+    
+    def _blit(self, raw_data, w, h):
+        """把BGRA数据提交到分层窗口"""
         bmi = BITMAPINFO()
         bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
         bmi.bmiHeader.biWidth = w
@@ -359,30 +610,51 @@ class BackgroundCreator:
         bmi.bmiHeader.biPlanes = 1
         bmi.bmiHeader.biBitCount = 32
         bmi.bmiHeader.biCompression = win32con.BI_RGB
-        ptr = ctypes.c_void_p()
-        gdi32 = ctypes.windll.gdi32
-        hbitmap = gdi32.CreateDIBSection(hdc_mem, ctypes.byref(bmi),
-                                        win32con.DIB_RGB_COLORS, ctypes.byref(ptr), None, 0)
-        ctypes.memmove(ptr, raw_data, len(raw_data))
-        win32gui.SelectObject(hdc_mem, hbitmap)
         
         blend = self.BLENDFUNCTION()
         blend.BlendOp = self.AC_SRC_OVER
         blend.BlendFlags = 0
         blend.SourceConstantAlpha = self.alpha
-        blend.AlphaFormat = 0
-        
-        ctypes.windll.user32.UpdateLayeredWindow(
-            self.bg_hwnd, hdc, None,
-            ctypes.byref(self.SIZE(w, h)),
-            hdc_mem,
-            ctypes.byref(self.POINT(0, 0)),
-            0, ctypes.byref(blend), self.ULW_ALPHA
-        )
+        # 逐像素透明（预乘），整体透明度仍由SourceConstantAlpha控制
+        blend.AlphaFormat = self.AC_SRC_ALPHA
+        
+        # 弹出窗口模式下同时提交位置，调整左/上边框时位置与内容一起更新
+        position = self.POINT(*self.current_pos) if self.current_pos is not None else None
         
-        gdi32.DeleteObject(hbitmap)
-        win32gui.DeleteDC(hdc_mem)
-        win32gui.ReleaseDC(0, hdc)
+        gdi32 = ctypes.windll.gdi32
+        gdi32.CreateDIBSection.restype = ctypes.c_void_p
+        gdi32.SelectObject.restype = ctypes.c_void_p
+        gdi32.SelectObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        gdi32.DeleteObject.argtypes = [ctypes.c_void_p]
+        
+        # 每次提交都要成对释放DC和DIB；DIB仍被选入内存DC时DeleteObject会失败，必须先换回原位图
+        hdc = win32gui.GetDC(0)
+        hdc_mem = win32gui.CreateCompatibleDC(hdc)
+        hbitmap = None
+        old_bitmap = None
+        try:
+            ptr = ctypes.c_void_p()
+            hbitmap = gdi32.CreateDIBSection(hdc_mem, ctypes.byref(bmi),
+                                            win32con.DIB_RGB_COLORS, ctypes.byref(ptr), None, 0)
+            if not hbitmap:
+                raise OSError("CreateDIBSection失败")
+            ctypes.memmove(ptr, raw_data, len(raw_data))
+            old_bitmap = gdi32.SelectObject(int(hdc_mem), hbitmap)
+            
+            ctypes.windll.user32.UpdateLayeredWindow(
+                self.bg_hwnd, hdc, ctypes.byref(position) if position is not None else None,
+                ctypes.byref(self.SIZE(w, h)),
+                hdc_mem,
+                ctypes.byref(self.POINT(0, 0)),
+                0, ctypes.byref(blend), self.ULW_ALPHA
+            )
+        finally:
+            if old_bitmap:
+                gdi32.SelectObject(int(hdc_mem), old_bitmap)
+            if hbitmap:
+                gdi32.DeleteObject(hbitmap)
+            win32gui.DeleteDC(hdc_mem)
+            win32gui.ReleaseDC(0, hdc)
     
 
     
@@ -395,7 +667,10 @@ class BackgroundCreator:
             log("背景窗口创建失败")
             return False
         
-        # 设置背景图片
+        # 设置背景图片（目录或列表形式时展开为幻灯片）
+        self.slides = self._collect_slides()
+        if self.slides:
+            log(f"幻灯片模式: {len(self.slides)} 张图片，间隔 {self.slide_interval:.0f} 秒")
         if not self.set_image():
             log("背景图片设置失败")
             return False
@@ -403,8 +678,22 @@ class BackgroundCreator:
         # 初始更新一次
         self.update()
         
-        # 初始化变量
-        self.should_exit = False
+        # 通知检测器首个背景已显示，可以继续启动排队中的进程
+        self._report("ready", size=list(self.current_size))
+        self._report_memory()
+        
+        # 接收检测器下发的控制命令（如内存预算降级）
+        command_thread = threading.Thread(target=self.command_thread, daemon=True)
+        command_thread.start()
+        
+        # 动画播放线程：没有动画或暂停时阻塞等待，不占用CPU
+        animation_thread = threading.Thread(target=self.animation_thread, daemon=True)
+        animation_thread.start()
+        
+        # 幻灯片切换线程：提前在后台解码并渲染下一张
+        if self.slides:
+            slideshow_thread = threading.Thread(target=self.slideshow_thread, daemon=True)
+            slideshow_thread.start()
         
         try:
             # 启动轮询线程（类似于v2版本的实现）
@@ -418,7 +707,7 @@ class BackgroundCreator:
             while not self.should_exit:
                 try:
                     # 处理Windows消息队列（关键改进）
-                    pythoncom.PumpWaitingMessages()
+                    self._pump_messages()
                     
                     # 短暂等待，避免CPU占用过高
                     time.sleep(0.01)
@@ -444,78 +733,700 @@ class BackgroundCreator:
         
         return True
 
+    def _pump_messages(self):
+        """处理本线程的Windows消息队列"""
+        pythoncom.PumpWaitingMessages()
+    
+    def _report(self, kind, **data):
+        """向检测器发送结构化上报"""
+        report(kind, **data)
+    
     def poll_thread(self):
         """轮询线程 - 监控窗口状态并更新背景"""
         while not self.should_exit:
             # 检查目标窗口是否还存在
-            if not win32gui.IsWindow(self.target_hwnd):
+            if not self.backend.is_window(self.target_hwnd):
                 log("目标窗口已关闭，退出")
                 self.should_exit = True
                 break
             
             # 检查背景窗口是否还存在
-            if not win32gui.IsWindow(self.bg_hwnd):
+            if not self.backend.is_window(self.bg_hwnd):
                 log("背景窗口已关闭，退出")
                 self.should_exit = True
                 break
             
+            if self.power_mode == "suspended":
+                # 锁屏或显示器关闭：背景已挂起，不检查可见性也不渲染
+                self.poll_wakeup.wait(self.SUSPENDED_POLL_INTERVAL)
+                self.poll_wakeup.clear()
+                continue
+            
             # 基于v3版本的更新逻辑：只在需要时更新
             try:
-                # 检查目标窗口是否可见
-                if not win32gui.IsWindowVisible(self.target_hwnd):
-                    # 目标窗口不可见，隐藏背景窗口
-                    if win32gui.IsWindowVisible(self.bg_hwnd):
-                        win32gui.ShowWindow(self.bg_hwnd, win32con.SW_HIDE)
+                presented = self._is_target_presented()
+                if self.trace_enabled:
+                    self._trace_target(presented)
+                self._update_playback_state(presented)
+                if not presented:
+                    # 目标窗口不可见，隐藏背景窗口，超过宽限期后释放位图
+                    self._on_target_hidden()
                 else:
-                    # 目标窗口可见，确保背景窗口可见
-                    if not win32gui.IsWindowVisible(self.bg_hwnd):
-                        win32gui.ShowWindow(self.bg_hwnd, win32con.SW_SHOW)
+                    # 目标窗口可见，必要时恢复挂起的背景
+                    self._on_target_shown()
                     
-                    # 检查窗口大小是否变化
+                    # 检查窗口位置和大小是否变化
                     try:
-                        if self.use_window_rect:
-                            rect = win32gui.GetWindowRect(self.target_hwnd)
-                            w, h = rect[2] - rect[0], rect[3] - rect[1]
-                        else:
-                            left, top, right, bottom = win32gui.GetClientRect(self.target_hwnd)
-                            w, h = right - left, bottom - top
-                        
-                        # 只有当大小发生变化时才更新
-                        if (w, h) != self.current_size and w > 0 and h > 0:
-                            self.current_size = (w, h)
-                            self._update_layered_window(w, h)
+                        self._sync_geometry()
                     except:
                         pass
+                self._check_drag_finished()
             except:
                 pass
             
-            # 使用v2版本的等待时间：0.05秒
-            time.sleep(0.05)
+            # 使用v2版本的等待时间：0.05秒（限流时加长；电源模式变化时提前唤醒）
+            self.poll_wakeup.wait(self.poll_interval)
+            self.poll_wakeup.clear()
 
+    def _monitor_size(self):
+        """目标窗口所在显示器的大小，作为cover模式的预期最大尺寸"""
+        try:
+            left, top, right, bottom = self.backend.get_monitor_rect(self.target_hwnd)
+            return (right - left, bottom - top)
+        except Exception:
+            return self.current_size
+    
+    def _get_target_size(self):
+        """获取背景应覆盖的目标区域大小"""
+        if self.use_window_rect:
+            rect = self.backend.get_window_rect(self.target_hwnd)
+            return rect[2] - rect[0], rect[3] - rect[1]
+        left, top, right, bottom = self.backend.get_client_rect(self.target_hwnd)
+        return right - left, bottom - top
+    
+    def _get_target_geometry(self):
+        """获取背景应有的 (屏幕位置, 大小)；子窗口模式下位置为None"""
+        if self.use_window_rect:
+            rect = self.backend.get_window_rect(self.target_hwnd)
+            return (rect[0], rect[1]), (rect[2] - rect[0], rect[3] - rect[1])
+        return None, self._get_target_size()
+    
+    def _sync_geometry(self):
+        """让背景跟上目标窗口：只有位置变化时移动分层窗口，大小变化时才重新渲染"""
+        pos, (w, h) = self._get_target_geometry()
+        if w <= 0 or h <= 0 or self.parked:
+            return
+        
+        if (w, h) != self.current_size:
+            with self.render_lock:
+                self.current_size = (w, h)
+                self.current_pos = pos
+                self._update_layered_window(w, h)
+            self.resize_render_count += 1
+            self._note_geometry_change(rendered=True)
+            self._report_memory()
+        elif pos != self.current_pos:
+            # 纯移动：位图内容不变，不需要重新渲染和提交
+            with self.render_lock:
+                self.current_pos = pos
+                self._move_layer(*pos)
+            self.move_count += 1
+            self._note_geometry_change(rendered=False)
+    
+    def _move_layer(self, x, y):
+        """只移动背景窗口"""
+        self.backend.move_window(self.bg_hwnd, x, y)
+    
+    def _note_geometry_change(self, rendered):
+        """记录一次几何变化，连续的变化合并为一次拖动"""
+        now = time.perf_counter()
+        if self._drag is None:
+            self._drag = {'start': now, 'last': now, 'moves': 0, 'renders': 0}
+        self._drag['last'] = now
+        self._drag['renders' if rendered else 'moves'] += 1
+    
+    def _check_drag_finished(self):
+        """几何停止变化超过DRAG_SETTLE后，记录并上报这次拖动的移动与重新渲染次数"""
+        drag = self._drag
+        if drag is None or time.perf_counter() - drag['last'] < self.DRAG_SETTLE:
+            return
+        self._drag = None
+        duration_ms = (drag['last'] - drag['start']) * 1000
+        log(f"窗口移动/调整结束: 移动 {drag['moves']} 次, 重新渲染 {drag['renders']} 次, "
+            f"持续 {duration_ms:.0f} ms")
+        self._report("geometry", moves=drag['moves'], renders=drag['renders'],
+                     duration_ms=round(duration_ms, 1), total_moves=self.move_count,
+                     total_renders=self.resize_render_count)
+    
+    def _get_target_screen_rect(self):
+        """获取目标区域的屏幕坐标"""
+        if self.use_window_rect:
+            return tuple(self.backend.get_window_rect(self.target_hwnd))
+        w, h = self._get_target_size()
+        x, y = self.backend.client_to_screen(self.target_hwnd, (0, 0))
+        return (x, y, x + w, y + h)
+    
+    def _is_occluded(self):
+        """目标区域是否被Z序在其之上的不透明窗口完全覆盖"""
+        try:
+            target_rect = self._get_target_screen_rect()
+            covers = []
+            for rect in self.backend.occluding_rects(self.target_hwnd, exclude=(self.bg_hwnd,)):
+                covers.append(rect)
+                if is_rect_covered(target_rect, covers):
+                    return True
+        except Exception:
+            pass
+        return False
+    
+    def _is_target_presented(self):
+        """目标窗口当前是否对用户可见（未隐藏、未最小化、未被完全遮挡）"""
+        if not self.backend.is_visible(self.target_hwnd):
+            self.hidden_reason = "不可见"
+            return False
+        
+        if self.backend.is_iconic(self.backend.get_root(self.target_hwnd)):
+            self.hidden_reason = "最小化"
+            return False
+        
+        now = time.time()
+        if now - self.last_occlusion_check >= self.OCCLUSION_CHECK_INTERVAL:
+            self.last_occlusion_check = now
+            self.occluded = self._is_occluded()
+        if self.occluded:
+            self.hidden_reason = "被遮挡"
+            return False
+        
+        return True
+    
+    def _on_target_hidden(self):
+        """目标不可见：隐藏背景，超过宽限期后挂起并释放位图"""
+        if self.backend.is_visible(self.bg_hwnd):
+            self.backend.show_window(self.bg_hwnd, False)
+        
+        now = time.time()
+        if self.hidden_since is None:
+            self.hidden_since = now
+        elif not self.parked and now - self.hidden_since >= self.park_delay:
+            self._park()
+    
+    def _on_target_shown(self):
+        """目标重新可见：恢复挂起的背景并显示"""
+        self.hidden_since = None
+        if self.parked and not self._unpark():
+            return
+        if not self.backend.is_visible(self.bg_hwnd):
+            self.backend.show_window(self.bg_hwnd, True)
+    
+    def _source_bytes(self):
+        """源图（含动画全部帧）占用的字节数"""
+        if self.frames:
+            return sum(frame.width * frame.height * 4 for frame, _ in self.frames if frame is not None)
+        if self.img is None:
+            return 0
+        return self.img.width * self.img.height * len(self.img.getbands())
+    
+    def _cache_bytes(self):
+        """由源图派生、可随时丢弃的缓存占用的字节数"""
+        total = self.renderer.cache_bytes() + self.frame_cache.nbytes + self.mask_cache.nbytes
+        prefetched = self.prefetched
+        if prefetched:
+            image = prefetched['image']
+            total += image.width * image.height * 4 + prefetched['renderer'].cache_bytes()
+            total += len(prefetched['raw'] or b'')
+        return total
+    
+    def _bitmap_bytes(self):
+        """当前持有的位图数据大小（字节）"""
+        return self._source_bytes() + self._cache_bytes()
+    
+    def _report_memory(self, force=False):
+        """位图占用变化时上报给检测器，用于全局内存预算"""
+        usage = (self._source_bytes(), self._cache_bytes())
+        if not force and usage == self._last_memory_report:
+            return
+        self._last_memory_report = usage
+        self._report("memory", source_bytes=usage[0], cache_bytes=usage[1],
+               bitmap_bytes=sum(usage), resident_bytes=self._resident_bytes(),
+               size=list(self.current_size), trim_level=self.trim_level)
+    
+    def _resident_bytes(self):
+        """本进程的驻留内存（工作集，字节）"""
+        try:
+            info = win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())
+            return info['WorkingSetSize']
+        except Exception:
+            return 0
+    
+    def _release_caches(self):
+        """释放由源图派生的缓存（可重新生成）"""
+        self.renderer.release_caches()
+        self.frame_cache.clear()
+        self.mask_cache.clear()
+        self.prefetched = None
+        # 让Pillow归还内部缓存的内存块
+        try:
+            Image.core.clear_cache()
+        except Exception:
+            pass
+    
+    def _release_buffers(self):
+        """释放源图及所有由它派生的缓存"""
+        self.img = None
+        self.frames = None
+        self.animation_image = None
+        self._release_caches()
+    
+    def _downscale_source(self):
+        """把源图缩小到刚好覆盖当前窗口的大小，窗口变大时再重新加载"""
+        w, h = self.current_size
+        if self.img is None or w <= 0 or h <= 0:
+            return
+        scale = max(w / self.img.width, h / self.img.height)
+        if scale >= 1:
+            return
+        new_size = (max(1, int(self.img.width * scale + 0.999)),
+                    max(1, int(self.img.height * scale + 0.999)))
+        if self.frames:
+            self.frames = [(frame.resize(new_size, Image.LANCZOS) if frame is not None else None, duration)
+                           for frame, duration in self.frames]
+            self.img = self.frames[0][0]
+        else:
+            self.img = self.img.resize(new_size, Image.LANCZOS)
+        self.source_limited = True
+    
+    def trim_memory(self, level):
+        """
+        按检测器的要求降低内存占用
+        
+        Args:
+            level: 1 - 丢弃缓存; 2 - 并把源图缩小到窗口大小; 3 - 并释放源图，需要时再加载
+        """
+        with self.render_lock:
+            before = self._bitmap_bytes()
+            self._release_caches()
+            if level >= 3:
+                self.img = None
+                self.frames = None
+                self.animation_image = None
+                self.source_limited = False
+            elif level >= 2:
+                self._downscale_source()
+            self.trim_level = level
+            after = self._bitmap_bytes()
+        
+        log(f"按内存预算降级 (级别 {level}): {before / 1048576:.1f} MB -> {after / 1048576:.1f} MB")
+        self._report_memory(force=True)
+    
+    def throttle(self, level):
+        """
+        按检测器的要求降低CPU占用
+        
+        Args:
+            level: 0 - 恢复正常; 1 - 加长轮询间隔、限制动画帧率、改用双线性缩放
+        """
+        with self.render_lock:
+            self.throttle_level = level
+            self._apply_throttle()
+    
+    def _throttled(self):
+        """CPU超限被限流或不在正常电源模式时降低开销"""
+        return bool(self.throttle_level) or self.power_mode != "normal"
+    
+    def _apply_throttle(self):
+        """按限流级别和电源模式设置轮询间隔、帧率上限和缩放算法"""
+        throttled = self._throttled()
+        max_fps = float(self.config.get('max_fps', 15))
+        if throttled:
+            max_fps = min(max_fps, self.THROTTLED_MAX_FPS)
+            self.poll_interval = self.THROTTLED_POLL_INTERVAL
+        else:
+            self.poll_interval = self.POLL_INTERVAL
+        self.min_frame_interval = 1.0 / max(1.0, max_fps)
+        self.renderer.resample = Image.BILINEAR if throttled else Image.LANCZOS
+        log(f"限流级别 {self.throttle_level}, 电源模式 {self.power_mode}: "
+            f"轮询间隔 {self.poll_interval * 1000:.0f} ms, 帧率上限 {max_fps:.0f} fps")
+    
+    def set_power_mode(self, mode):
+        """
+        按检测器的电源模式调整
+        
+        Args:
+            mode: normal - 正常; saver - 与限流级别1相同的轮询间隔、帧率和缩放算法;
+                  suspended - 隐藏背景并立即挂起（释放位图），恢复后由轮询线程重新渲染
+        """
+        if mode not in ("normal", "saver", "suspended"):
+            log(f"未知电源模式: {mode}")
+            return
+        previous = self.power_mode
+        if mode == previous:
+            return
+        with self.render_lock:
+            self.power_mode = mode
+            self._apply_throttle()
+        
+        if mode == "suspended":
+            self.animation_playing = False
+            try:
+                if self.backend.is_visible(self.bg_hwnd):
+                    self.backend.show_window(self.bg_hwnd, False)
+            except Exception as e:
+                log(f"隐藏背景窗口失败: {e}")
+            if not self.parked:
+                self._park(reason="锁屏或显示器关闭")
+        elif previous == "suspended":
+            # 轮询线程被唤醒后立即检查可见性，目标可见时重新加载并显示
+            self.hidden_since = None
+            self.slide_wakeup.set()
+        self.poll_wakeup.set()
+    
+    def reload_image(self, decoded=None):
+        """图片文件内容已变化：重新加载并按当前大小重新渲染"""
+        start = time.perf_counter()
+        with self.render_lock:
+            if decoded:
+                self.config['decoded'] = decoded
+            else:
+                self.config.pop('decoded', None)
+            previous = (self.img, self.frames, self.animation_image)
+            if not self.set_image():
+                # 新文件可能尚未写完，保留旧图，等下一次变化
+                self.img, self.frames, self.animation_image = previous
+                log("重新加载图片失败，继续显示原图片")
+                return False
+            self.renderer.release_caches()
+            self.frame_cache.clear()
+            if not self.parked and self.current_size[0] > 0 and self.current_size[1] > 0:
+                self._update_layered_window(*self.current_size)
+        self._report_memory(force=True)
+        log(f"图片已重新加载，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+        return True
+    
+    def handle_command(self, message):
+        """处理检测器下发的控制命令"""
+        cmd = message.get('cmd')
+        if cmd == 'trim':
+            self.trim_memory(int(message.get('level', 1)))
+        elif cmd == 'reload':
+            self.reload_image(message.get('decoded'))
+        elif cmd == 'throttle':
+            self.throttle(int(message.get('level', 1)))
+        elif cmd == 'power':
+            self.set_power_mode(message.get('mode', 'normal'))
+        elif cmd == 'untrim':
+            # 窗口重新获得焦点，允许后续按需恢复为完整源图
+            self.trim_level = 0
+        elif cmd == 'trace':
+            self.trace_enabled = bool(message.get('enabled', True))
+            self._last_trace_state = None
+        elif cmd == 'profile':
+            self.start_profiling(float(message.get('duration', 30)),
+                                 int(message.get('interval_ms', 10)))
+        else:
+            log(f"未知控制命令: {cmd}")
+    
+    def _trace_target(self, presented):
+        """目标窗口的位置、大小或可见状态变化时上报轨迹事件"""
+        try:
+            rect = list(self._get_target_screen_rect())
+        except Exception:
+            return
+        if presented:
+            state = "shown"
+        else:
+            state = self.TRACE_HIDDEN_STATES.get(self.hidden_reason, "hidden")
+        if (rect, state) != self._last_trace_state:
+            self._last_trace_state = (rect, state)
+            self._report("trace", ev="win", rect=rect, state=state)
+    
+    def start_profiling(self, duration, interval_ms):
+        """开启本进程的采样性能分析，结果按PID、窗口句柄和目标名称写入logs/"""
+        if self.profiler and self.profiler.is_running():
+            return
+        from sampling_profiler import SamplingProfiler
+        self.profiler = SamplingProfiler(
+            "bg_creator",
+            tags={'hwnd': self.target_hwnd, 'target': self.config.get('name') or self.target_name},
+            interval=interval_ms / 1000
+        )
+        self.profiler.start(duration)
+    
+    def command_thread(self):
+        """读取标准输入上的控制命令（每行一个JSON）"""
+        try:
+            for line in sys.stdin:
+                if self.should_exit:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self.handle_command(json.loads(line))
+                except Exception as e:
+                    log(f"处理控制命令失败: {e}")
+        except Exception:
+            # 没有可用的标准输入（例如手动运行时被关闭）
+            pass
+    
+    def _release_layer_surface(self):
+        """用1x1的透明位图替换分层窗口内容，释放其表面内存"""
+        try:
+            # 预乘BGRA全0即完全透明
+            self._blit(bytes(4), 1, 1)
+        except Exception as e:
+            log(f"释放分层窗口表面失败: {e}")
+    
+    def _is_target_foreground(self):
+        """目标窗口是否为前台窗口"""
+        try:
+            root = self.backend.get_root(self.target_hwnd)
+            return self.backend.get_foreground_window() == root
+        except Exception:
+            return True
+    
+    def _update_playback_state(self, presented):
+        """根据可见性和前台状态决定动画是否播放、幻灯片是否切换"""
+        if presented != self.target_presented:
+            self.target_presented = presented
+            if presented:
+                self.slide_wakeup.set()
+        
+        if not self.frames:
+            playing = False
+        else:
+            playing = presented and (not self.pause_when_inactive or self._is_target_foreground())
+        if playing != self.animation_playing:
+            self.animation_playing = playing
+            if playing:
+                self.animation_wakeup.set()
+    
+    def animation_thread(self):
+        """动画播放线程：按帧时长（受帧率上限约束）切换帧"""
+        report_start = time.time()
+        cpu_start = time.process_time()
+        frames_shown = 0
+        
+        while not self.should_exit:
+            if not (self.animation_playing and self.frames and not self.parked):
+                # 暂停期间不唤醒，直到可见性变化或重新加载动画
+                self.animation_wakeup.wait()
+                self.animation_wakeup.clear()
+                report_start = time.time()
+                cpu_start = time.process_time()
+                frames_shown = 0
+                continue
+            
+            frame_start = time.perf_counter()
+            duration = 100
+            with self.render_lock:
+                frames = self.frames
+                w, h = self.current_size
+                if frames and not self.parked and w > 0 and h > 0:
+                    self.frame_index = (self.frame_index + 1) % len(frames)
+                    duration = frames[self.frame_index][1]
+                    try:
+                        self._blit(self._get_animation_frame(self.frame_index, w, h), w, h)
+                        frames_shown += 1
+                    except Exception as e:
+                        log(f"播放动画帧失败: {e}")
+            
+            now = time.time()
+            if now - report_start >= self.ANIMATION_REPORT_INTERVAL:
+                elapsed = now - report_start
+                cpu_percent = (time.process_time() - cpu_start) / elapsed * 100
+                fps = frames_shown / elapsed
+                log(f"动画播放中: {fps:.1f} fps, CPU {cpu_percent:.1f}%, "
+                    f"帧缓存 {self.frame_cache.nbytes / 1048576:.1f} MB, "
+                    f"位图 {self._bitmap_bytes() / 1048576:.1f} MB")
+                self._report("animation", fps=round(fps, 1), cpu_percent=round(cpu_percent, 1),
+                       frame_cache_bytes=self.frame_cache.nbytes, bitmap_bytes=self._bitmap_bytes())
+                self._report_memory()
+                report_start = now
+                cpu_start = time.process_time()
+                frames_shown = 0
+            
+            delay = max(duration / 1000.0, self.min_frame_interval) - (time.perf_counter() - frame_start)
+            if delay > 0:
+                time.sleep(delay)
+    
+    def _decode_slide(self, path):
+        """解码并调色一张幻灯片图片（只取第一帧）"""
+        img = Image.open(path)
+        img.load()
+        return adjust_image(img.convert("RGBA"), self.brightness, self.contrast, self.saturation)
+    
+    def _prefetch_next_slide(self):
+        """在工作线程中准备下一张幻灯片：解码、调色并按当前尺寸渲染，失败返回False"""
+        if self.next_slide is None:
+            self.next_slide = (self.slide_index + 1) % len(self.slides)
+        index = self.next_slide
+        path = self.slides[index]
+        start = time.perf_counter()
+        try:
+            image = self._decode_slide(path)
+        except Exception as e:
+            log(f"预加载幻灯片失败，跳过: {path} ({e})")
+            # 跳过无法加载的图片，下一轮尝试它之后的一张；当前显示的slide_index不变，
+            # 挂起后恢复时仍重新加载正在显示的图片
+            self.next_slide = (index + 1) % len(self.slides)
+            return False
+        
+        renderer = self._create_renderer(self.renderer.expected_size)
+        w, h = self.current_size
+        raw = None
+        if w > 0 and h > 0:
+            raw = self._render_frame(renderer.render(image, w, h))
+        
+        with self.render_lock:
+            self.prefetched = {'index': index, 'image': image, 'renderer': renderer,
+                               'size': (w, h), 'raw': raw}
+        log(f"已预加载下一张幻灯片: {os.path.basename(path)}, "
+            f"耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+        self._report_memory()
+        return True
+    
+    def _swap_slide(self):
+        """切换到已准备好的下一张，尺寸未变时只需一次提交"""
+        with self.render_lock:
+            prefetched = self.prefetched
+            if prefetched is None:
+                return False
+            self.prefetched = None
+            
+            # 替换后旧图片不再被引用，内存中始终最多两张图片
+            self.slide_index = prefetched['index']
+            self.next_slide = None
+            self.img = prefetched['image']
+            self.renderer = prefetched['renderer']
+            self.frames = None
+            self.source_limited = False
+            self.frame_cache.clear()
+            if self.trim_level >= 2:
+                self._downscale_source()
+            
+            w, h = self.current_size
+            if w > 0 and h > 0:
+                if prefetched['raw'] is not None and prefetched['size'] == (w, h):
+                    self._blit(prefetched['raw'], w, h)
+                else:
+                    self._update_layered_window(w, h)
+        
+        self._report_memory()
+        return True
+    
+    def slideshow_thread(self):
+        """幻灯片线程：到期前提前准备下一张，到期时切换"""
+        next_swap = time.time() + self.slide_interval
+        
+        while not self.should_exit:
+            now = time.time()
+            visible = self.target_presented and not self.parked
+            # 内存预算紧张时不提前准备，到期时才加载下一张
+            lead = 0 if self.trim_level else min(self.SLIDE_PREFETCH_LEAD, self.slide_interval / 2)
+            
+            if visible and self.prefetched is None and now >= next_swap - lead:
+                if not self._prefetch_next_slide():
+                    self.slide_wakeup.wait(1)
+                    self.slide_wakeup.clear()
+                continue
+            
+            if now < next_swap:
+                wait = next_swap - now
+                if self.prefetched is None:
+                    wait = max(0.0, wait - lead)
+                self.slide_wakeup.wait(wait)
+                self.slide_wakeup.clear()
+                continue
+            
+            if not visible:
+                # 目标不可见时不切换，等重新可见后立即切换
+                self.slide_wakeup.wait()
+                self.slide_wakeup.clear()
+                continue
+            
+            if self._swap_slide():
+                next_swap = time.time() + self.slide_interval
+    
+    def _park(self, reason=None):
+        """挂起背景：释放帧缓冲和缓存，直到目标重新可见（reason为立即挂起的原因）"""
+        with self.render_lock:
+            freed = self._bitmap_bytes()
+            self._release_buffers()
+            self._release_layer_surface()
+            self.current_size = (0, 0)
+            self.parked = True
+        self._report_memory()
+        
+        resident = self._resident_bytes()
+        if reason is None:
+            reason = self.hidden_reason
+            log(f"目标{reason}超过 {self.park_delay} 秒，已挂起背景: "
+                f"释放位图 {freed / 1048576:.1f} MB, 驻留内存 {resident / 1048576:.1f} MB")
+        else:
+            log(f"{reason}，已挂起背景: "
+                f"释放位图 {freed / 1048576:.1f} MB, 驻留内存 {resident / 1048576:.1f} MB")
+        self._report("parked", reason=reason, freed_bytes=freed, resident_bytes=resident)
+    
+    def _unpark(self):
+        """恢复挂起的背景：重新加载图片并按当前大小渲染"""
+        start = time.perf_counter()
+        with self.render_lock:
+            if not self.set_image():
+                return False
+            try:
+                pos, (w, h) = self._get_target_geometry()
+                if w > 0 and h > 0:
+                    self.current_size = (w, h)
+                    self.current_pos = pos
+                    self._update_layered_window(w, h)
+            except Exception as e:
+                log(f"恢复背景时渲染失败: {e}")
+            self.parked = False
+        # 可见性变化时幻灯片线程可能先被唤醒、看到仍处于挂起状态而继续等待，恢复后再唤醒一次
+        self.slide_wakeup.set()
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._report_memory()
+        log(f"目标重新可见，背景已恢复，耗时 {elapsed_ms:.0f} ms")
+        self._report("resumed", elapsed_ms=round(elapsed_ms, 1), bitmap_bytes=self._bitmap_bytes(),
+                     resident_bytes=self._resident_bytes())
+        return True
+    
     def cleanup(self):
         """清理资源"""
         log("开始清理资源...")
         
         # 确保轮询线程已经停止
         self.should_exit = True
+        self.animation_wakeup.set()
+        self.slide_wakeup.set()
+        self.poll_wakeup.set()
         time.sleep(0.1)  # 给轮询线程一点时间退出
         
+        # 提前退出时也写出已有的采样结果
+        if self.profiler:
+            self.profiler.stop()
+        
         # 清理背景窗口
         if self.bg_hwnd:
             try:
-                if win32gui.IsWindow(self.bg_hwnd):
-                    log("正在销毁背景窗口...")
-                    # 先隐藏窗口
-                    win32gui.ShowWindow(self.bg_hwnd, win32con.SW_HIDE)
-                    # 然后销毁窗口
-                    win32gui.DestroyWindow(self.bg_hwnd)
-                    log("背景窗口已销毁")
+                self._destroy_background_window()
             except Exception as e:
                 log(f"销毁窗口时出错: {e}")
             finally:
                 self.bg_hwnd = None
         
         log("资源清理完成")
+    
+    def _destroy_background_window(self):
+        """销毁背景窗口"""
+        if win32gui.IsWindow(self.bg_hwnd):
+            log("正在销毁背景窗口...")
+            # 先隐藏窗口
+            win32gui.ShowWindow(self.bg_hwnd, win32con.SW_HIDE)
+            # 然后销毁窗口
+            win32gui.DestroyWindow(self.bg_hwnd)
+            log("背景窗口已销毁")
 
 def main():
     """背景创建器主函数"""
@@ -561,7 +1472,9 @@ def main():
         log("=" * 60)
         
         creator = BackgroundCreator(target_hwnd, config)
-        creator.run()
+        if not creator.run():
+            # 以非零返回码退出，检测器据此退避重试而不是立即重新启动
+            sys.exit(2)
         
     except Exception as e:
         log(f"启动失败: {e}")
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像处理管线 (sxxzh定制版)
+背景创建器使用的纯Pillow处理步骤：颜色调整、模糊、布局适配、透明遮罩与预乘、动画帧缓存
+不依赖Windows API，便于在其他进程中复用
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import re
+from collections import OrderedDict
+
+from PIL import Image
+
+# 布局模式：stretch拉伸铺满；tile平铺；center居中；cover等比缩放覆盖后裁剪
+FIT_MODES = ('stretch', 'tile', 'center', 'cover')
+
+# 透明遮罩：none无；edge_fade四边渐隐；vignette椭圆暗角渐隐
+MASK_MODES = ('none', 'edge_fade', 'vignette')
+
+# 遮罩分块时每个行带的高度（像素）
+MASK_PLAN_BAND = 32
+
+# 可作为背景（幻灯片目录中）的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+
+def _supports_rawmode(mode, rawmode):
+    """当前Pillow版本是否支持把mode图像直接打包为rawmode"""
+    try:
+        Image.new(mode, (1, 1)).tobytes("raw", rawmode)
+        return True
+    except Exception:
+        return False
+
+
+# 较新的Pillow可以在打包时直接交换通道，省去split/merge
+_PACK_BGRA = _supports_rawmode("RGBA", "BGRA")
+_PACK_BGRa = _supports_rawmode("RGBa", "BGRa")
+
+
+def adjust_image(img, brightness=1.0, contrast=1.0, saturation=1.0):
+    """调整亮度、对比度和饱和度（保留透明通道）"""
+    if brightness == contrast == saturation == 1.0:
+        return img
+    from PIL import ImageEnhance
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    if contrast != 1.0:
+        img = ImageEnhance.Contrast(img).enhance(contrast)
+    if saturation != 1.0:
+        img = ImageEnhance.Color(img).enhance(saturation)
+    return img
+
+
+def blur_downscaled(img, radius, quality=0.25, passes=3):
+    """
+    近似高斯模糊（毛玻璃效果），返回缩小后的模糊图，由调用方按输出尺寸放大
+
+    在缩小的副本上做多次盒式模糊（三次盒式模糊近似高斯），耗时随quality的平方下降；
+    模糊后的图像没有高频细节，用双线性放大即可。带透明通道的图片在预乘后模糊，
+    避免透明像素的颜色渗入。
+
+    Args:
+        img: RGBA图像
+        radius: 原尺寸下的模糊半径（像素）
+        quality: 工作副本相对原图的缩放比例，0.05~1.0，越小越快越糊
+        passes: 盒式模糊次数
+    """
+    quality = max(0.05, min(1.0, quality))
+    small_size = (max(1, int(img.width * quality)), max(1, int(img.height * quality)))
+
+    opaque = img.getchannel("A").getextrema()[0] == 255
+    work = img if opaque else img.convert("RGBa")
+    # 缩小本身就是低通滤波：先用reduce按整数倍快速缩小，余下部分再用BOX滤镜
+    factor = int(1 / quality)
+    if factor > 1:
+        work = work.reduce(factor)
+    if work.size != small_size:
+        work = work.resize(small_size, Image.BOX)
+
+    # 多次盒式模糊的方差相加，单次半径取 r / sqrt(passes)
+    box_radius = radius * quality / passes ** 0.5
+    from PIL import ImageFilter
+    for _ in range(passes):
+        work = work.filter(ImageFilter.BoxBlur(box_radius))
+    return work if opaque else work.convert("RGBA")
+
+
+def _center_box(src_size, size):
+    """在src_size中居中取出size大小区域的裁剪框"""
+    sw, sh = src_size
+    w, h = size
+    left = (sw - w) // 2
+    top = (sh - h) // 2
+    return (left, top, left + w, top + h)
+
+
+class FitRenderer:
+    """
+    按布局模式把预先调整好的源图适配到窗口大小
+
+    只有stretch模式在每次尺寸变化时重采样；tile/center只做内存复制，
+    cover模式只在首次（或窗口超出缓存范围时）缩放一次，之后只做裁剪。
+    开启模糊时，模糊后的小尺寸底图按源图缓存，每次尺寸变化只做一次双线性放大。
+    """
+
+    def __init__(self, mode='stretch', expected_size=None, resample=Image.LANCZOS,
+                 blur=0, blur_quality=0.25):
+        """
+        Args:
+            mode: 布局模式，见FIT_MODES
+            expected_size: 预期的最大窗口尺寸（通常是所在显示器大小），cover模式按它缩放
+            resample: stretch/cover缩放时使用的重采样滤镜
+            blur: 模糊半径（源图像素），0表示不模糊
+            blur_quality: 模糊工作副本的缩放比例，见blur_downscaled
+        """
+        self.mode = mode if mode in FIT_MODES else 'stretch'
+        self.expected_size = expected_size or (0, 0)
+        self.resample = resample
+        self.blur = blur
+        self.blur_quality = blur_quality
+
+        # cover模式缓存：按源图对象区分，源图被替换/缩小后自动失效
+        self._cover_source = None
+        self._cover_base = None
+
+        # 模糊缓存：缩小的模糊底图，以及tile/center模式需要的原尺寸放大版
+        self._blur_source = None
+        self._blur_base = None
+        self._blur_full = None
+
+    def render(self, source, w, h):
+        """返回w x h的RGBA图像"""
+        if self.blur > 0:
+            return self._render_blurred(source, w, h)
+        if self.mode == 'tile':
+            return self._render_tile(source, w, h)
+        if self.mode == 'center':
+            return self._render_center(source, w, h)
+        if self.mode == 'cover':
+            return self._render_cover(source, w, h)
+        return source.resize((w, h), self.resample)
+
+    def _render_tile(self, source, w, h):
+        """平铺：按源图原始大小重复复制"""
+        if source.size == (w, h):
+            return source.copy()
+        canvas = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        sw, sh = source.size
+        for y in range(0, h, sh):
+            for x in range(0, w, sw):
+                canvas.paste(source, (x, y))
+        return canvas
+
+    def _render_center(self, source, w, h):
+        """居中：源图比窗口大时直接裁剪，否则放在透明画布中央"""
+        sw, sh = source.size
+        if sw >= w and sh >= h:
+            return source.crop(_center_box(source.size, (w, h)))
+        canvas = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        # paste会自动裁掉超出画布的部分
+        canvas.paste(source, ((w - sw) // 2, (h - sh) // 2))
+        return canvas
+
+    def _render_cover(self, source, w, h):
+        """等比覆盖：缩放一次到预期最大尺寸，较小的窗口只做居中裁剪"""
+        base = self._cover_base
+        if (self._cover_source is not source or base is None
+                or base.width < w or base.height < h):
+            need_w = max(w, self.expected_size[0])
+            need_h = max(h, self.expected_size[1])
+            scale = max(need_w / source.width, need_h / source.height)
+            size = (max(need_w, int(source.width * scale + 0.999)),
+                    max(need_h, int(source.height * scale + 0.999)))
+            base = source if size == source.size else source.resize(size, self.resample)
+            self._cover_source = source
+            self._cover_base = base
+        return base.crop(_center_box(base.size, (w, h)))
+
+    def _blurred_base(self, source):
+        """获取源图对应的模糊底图，源图变化时重新生成"""
+        if self._blur_source is not source or self._blur_base is None:
+            self._blur_base = blur_downscaled(source, self.blur, self.blur_quality)
+            self._blur_source = source
+            self._blur_full = None
+        return self._blur_base
+
+    def _render_blurred(self, source, w, h):
+        """模糊模式：从缩小的模糊底图直接放大到输出尺寸"""
+        base = self._blurred_base(source)
+        sw, sh = source.size
+        if self.mode == 'stretch':
+            return base.resize((w, h), Image.BILINEAR)
+        if self.mode == 'cover':
+            # 在源图坐标中计算裁剪框，再换算到底图坐标，缩放和裁剪一步完成
+            scale = max(w / sw, h / sh)
+            crop_w, crop_h = w / scale, h / scale
+            left, top = (sw - crop_w) / 2, (sh - crop_h) / 2
+            fx, fy = base.width / sw, base.height / sh
+            box = (left * fx, top * fy, (left + crop_w) * fx, (top + crop_h) * fy)
+            return base.resize((w, h), Image.BILINEAR, box=box)
+
+        # tile/center按源图像素排布，放大回源图尺寸一次后复用
+        if self._blur_full is None:
+            self._blur_full = base.resize((sw, sh), Image.BILINEAR)
+        if self.mode == 'tile':
+            return self._render_tile(self._blur_full, w, h)
+        return self._render_center(self._blur_full, w, h)
+
+    def cache_bytes(self):
+        """缓存占用的字节数"""
+        total = 0
+        base = self._cover_base
+        if base is not None and base is not self._cover_source:
+            total += base.width * base.height * 4
+        for image in (self._blur_base, self._blur_full):
+            if image is not None:
+                total += image.width * image.height * 4
+        return total
+
+    def release_caches(self):
+        """释放缓存，下次渲染时按需重建"""
+        self._cover_source = None
+        self._cover_base = None
+        self._blur_source = None
+        self._blur_base = None
+        self._blur_full = None
+
+
+def to_layered_bgra(img, mask=None):
+    """
+    把RGBA图像转换为分层窗口(AC_SRC_ALPHA)需要的预乘BGRA数据
+
+    完全不透明且没有遮罩时无需预乘，只交换通道。有遮罩时每个通道都变为 值*遮罩/255：
+    以遮罩为权重把图像粘贴到全透明的底图上，不透明图片一次粘贴同时完成遮罩相乘和预乘，
+    带透明通道的图片先预乘再粘贴。遮罩为plan_mask()的分块时，遮罩为255的区域保持原像素，
+    为0的区域直接清零，只有渐变区域做混合。
+
+    Args:
+        img: 适配好窗口尺寸的RGBA图像
+        mask: 与img同尺寸的L模式遮罩或其分块（MaskCache.get()的返回值），None表示不使用遮罩
+    """
+    alpha = img.getchannel("A")
+    opaque = alpha.getextrema()[0] == 255
+    if mask is None and opaque:
+        if _PACK_BGRA:
+            return img.tobytes("raw", "BGRA")
+        r, g, b, a = img.split()
+        return Image.merge("RGBA", (b, g, r, a)).tobytes()
+
+    premultiplied = img if opaque else img.convert("RGBa")
+    if isinstance(mask, Image.Image):
+        # 底图全0，混合结果即 源*遮罩/255；不透明图片的RGBA数据此时已是预乘值
+        blended = Image.new(premultiplied.mode, img.size, 0)
+        blended.paste(premultiplied, (0, 0), mask)
+        premultiplied = blended
+    elif mask is not None:
+        # 不透明图片复制一份再修改（img可能是渲染缓存），预乘后的图片本就是新图像
+        blended = img.copy() if premultiplied is img else premultiplied
+        for box, region in mask:
+            source = blended.crop(box) if region is not None else None
+            blended.paste(0, box)
+            if region is not None:
+                blended.paste(source, box[:2], region)
+        premultiplied = blended
+    if premultiplied.mode == "RGBA" and _PACK_BGRA:
+        return premultiplied.tobytes("raw", "BGRA")
+    if premultiplied.mode == "RGBa" and _PACK_BGRa:
+        return premultiplied.tobytes("raw", "BGRa")
+    r, g, b, a = premultiplied.split()
+    return Image.merge(premultiplied.mode, (b, g, r, a)).tobytes()
+
+
+def _edge_ramp(length, fade):
+    """一维边缘渐变：两端为0，向内fade个像素线性升到255"""
+    return bytes(min(255, int(255 * min(i + 0.5, length - i - 0.5) / fade))
+                 for i in range(length))
+
+
+def build_mask(mode, size, mask_size=0.1):
+    """
+    生成透明遮罩（L模式，255为完全保留）
+
+    Args:
+        mode: 遮罩类型，见MASK_MODES
+        size: 遮罩尺寸(w, h)
+        mask_size: 渐隐区域占窗口较短边（暗角为半径）的比例
+    """
+    w, h = size
+    if mode == 'edge_fade':
+        fade = max(1.0, min(w, h) * mask_size)
+        # 水平和垂直两条一维渐变相乘，避免逐像素计算
+        horizontal = Image.frombytes("L", (w, 1), _edge_ramp(w, fade)).resize((w, h), Image.NEAREST)
+        vertical = Image.frombytes("L", (1, h), _edge_ramp(h, fade)).resize((w, h), Image.NEAREST)
+        from PIL import ImageChops
+        return ImageChops.multiply(horizontal, vertical)
+    if mode == 'vignette':
+        # radial_gradient为256x256，中心0，内切圆边缘约181、角上255；映射后再缩放为椭圆
+        band = max(0.01, mask_size)
+        lut = [max(0, min(255, int(255 * (1 - v / 181) / band))) for v in range(256)]
+        return Image.radial_gradient("L").point(lut).resize((w, h), Image.BILINEAR)
+    return Image.new("L", (w, h), 255)
+
+
+_NOT_FULL_LUT = [255] * 255 + [0]
+_NOT_ZERO_LUT = [0] + [255] * 255
+
+
+def plan_mask(mask, band=MASK_PLAN_BAND):
+    """
+    把遮罩分块，供to_layered_bgra只在渐变区域做混合
+
+    每个行带内按列合并：遮罩全为255的列保持原像素（不记录），全为0的列清零，其余列带遮罩混合。
+    edge_fade只有四边需要混合，vignette的四角直接清零。
+
+    Returns:
+        [(区域, 区域内的遮罩)]，遮罩为None的区域清零
+    """
+    w, h = mask.size
+    # 每个行带按列平均为一行：列中任一像素为255时平均值至少 255/band，不会被舍入为0
+    not_full = mask.point(_NOT_FULL_LUT).reduce((1, band)).tobytes()
+    not_zero = mask.point(_NOT_ZERO_LUT).reduce((1, band)).tobytes()
+    plan = []
+    for index, top in enumerate(range(0, h, band)):
+        bottom = min(h, top + band)
+        full_columns = not_full[index * w:(index + 1) * w]
+        zero_columns = not_zero[index * w:(index + 1) * w]
+        spans = sorted([(m.start(), m.end(), 'full') for m in re.finditer(b"\x00+", full_columns)]
+                       + [(m.start(), m.end(), 'zero') for m in re.finditer(b"\x00+", zero_columns)])
+        x = 0
+        for start, end, kind in spans + [(w, w, 'full')]:
+            if start > x:
+                region = (x, top, start, bottom)
+                plan.append((region, mask.crop(region)))
+            if kind == 'zero':
+                plan.append(((start, top, end, bottom), None))
+            x = end
+    return plan
+
+
+class MaskCache:
+    """
+    遮罩缓存：按窗口尺寸保存生成好并分块的遮罩（plan_mask()）
+
+    保留最近使用的几个尺寸（如最大化/还原来回切换），拖动调整大小时旧尺寸依次淘汰。
+    只保存渐变区域的遮罩，完全保留和完全透明的区域不占内存。
+    """
+
+    MAX_ENTRIES = 4
+
+    def __init__(self, mode='none', mask_size=0.1):
+        self.mode = mode if mode in MASK_MODES else 'none'
+        self.mask_size = mask_size
+        self.masks = OrderedDict()  # 尺寸 -> (遮罩分块, 字节数)
+        self.nbytes = 0
+
+    def get(self, size):
+        """获取指定尺寸的遮罩分块，不使用遮罩时返回None"""
+        if self.mode == 'none':
+            return None
+        entry = self.masks.get(size)
+        if entry is not None:
+            self.masks.move_to_end(size)
+            return entry[0]
+
+        plan = plan_mask(build_mask(self.mode, size, self.mask_size))
+        nbytes = sum(region.width * region.height for _, region in plan if region is not None)
+        self.masks[size] = (plan, nbytes)
+        self.nbytes += nbytes
+        while len(self.masks) > self.MAX_ENTRIES:
+            _, (_, old_bytes) = self.masks.popitem(last=False)
+            self.nbytes -= old_bytes
+        return plan
+
+    def clear(self):
+        """清空缓存"""
+        self.masks.clear()
+        self.nbytes = 0
+
+
+class FrameCache:
+    """
+    动画帧缓存：保存当前窗口尺寸下渲染好的帧数据，总大小有上限
+
+    窗口尺寸变化时旧尺寸的帧全部作废；超出上限的帧不再缓存，每次按需渲染。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = None
+        self.frames = {}  # 帧序号 -> 帧数据
+        self.nbytes = 0
+
+    def get(self, size, index):
+        """获取缓存的帧数据，没有则返回None"""
+        if size != self.size:
+            return None
+        return self.frames.get(index)
+
+    def put(self, size, index, data):
+        """缓存帧数据，超出上限时返回False"""
+        if size != self.size:
+            self.clear()
+            self.size = size
+        if index in self.frames:
+            return True
+        if self.nbytes + len(data) > self.max_bytes:
+            return False
+        self.frames[index] = data
+        self.nbytes += len(data)
+        return True
+
+    def clear(self):
+        """清空缓存"""
+        self.size = None
+        self.frames = {}
+        self.nbytes = 0
+
+
+def load_proxy(path, max_size):
+    """
+    打开图片并生成长边不超过max_size的代理图，返回 (RGBA代理图, 代理图相对原图的比例)
+
+    JPEG通过draft在解码阶段直接按1/2~1/8缩小，其他格式先用reduce做整数倍缩小再精确缩放，
+    5000万像素的原图也不必按原尺寸做颜色调整。动画只取第一帧。
+    """
+    img = Image.open(path)
+    orig_w, orig_h = img.size
+    ratio = min(1.0, max_size / max(orig_w, orig_h))
+    if ratio < 1.0:
+        img.draft(None, (int(orig_w * ratio) + 1, int(orig_h * ratio) + 1))
+    img = img.convert("RGBA")
+
+    factor = int(max(img.size) / max_size)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if max(img.size) > max_size:
+        img.thumbnail((max_size, max_size), Image.BILINEAR)
+    return img, img.width / orig_w
+
+
+def preview_backdrop(size):
+    """预览用的目标窗口示意图：白底加几行灰色“文字”，用来观察透明度和可读性"""
+    from PIL import ImageDraw
+
+    w, h = size
+    backdrop = Image.new("RGBA", size, (250, 250, 250, 255))
+    draw = ImageDraw.Draw(backdrop)
+    line_height = max(6, h // 12)
+    for index, top in enumerate(range(line_height, h - line_height, line_height * 2)):
+        right = w - line_height - (index * 37 % max(1, w // 3))
+        draw.rectangle([line_height, top, right, top + line_height // 2], fill=(90, 90, 90, 255))
+    return backdrop
+
+
+def render_preview(proxy, ratio, config, size, window_size=None, backdrop=None):
+    """
+    按背景创建器相同的步骤渲染预览：颜色调整、模糊、布局适配、遮罩，再按整体透明度叠加到示意窗口上
+
+    Args:
+        proxy: load_proxy得到的代理图
+        ratio: 代理图相对原图的比例（模糊半径、平铺/居中尺寸按它换算）
+        config: 目标配置（brightness/contrast/saturation/fit/blur/mask/alpha等）
+        size: 预览图尺寸(w, h)
+        window_size: 模拟的目标窗口尺寸，平铺/居中模式下决定图片相对窗口的大小，默认等于size
+        backdrop: 示意窗口图像，默认preview_backdrop(size)
+    """
+    img = adjust_image(proxy, config.get('brightness', 1.0), config.get('contrast', 1.0),
+                       config.get('saturation', 1.0))
+    fit = config.get('fit', 'stretch')
+    renderer = FitRenderer(fit, blur=config.get('blur', 0) * ratio,
+                           blur_quality=config.get('blur_quality', 0.25))
+
+    if fit in ('tile', 'center') and window_size:
+        # 这两种模式不缩放图片，需要在代理图的比例下模拟真实窗口大小
+        render_size = (max(1, int(window_size[0] * ratio)), max(1, int(window_size[1] * ratio)))
+    else:
+        render_size = size
+    layer = renderer.render(img, *render_size)
+    if layer.size != size:
+        layer = layer.resize(size, Image.BILINEAR)
+    if layer is img:
+        layer = layer.copy()
+
+    alpha = layer.getchannel("A")
+    mask = build_mask(config.get('mask', 'none'), size, config.get('mask_size', 0.1)) \
+        if config.get('mask', 'none') != 'none' else None
+    if mask is not None:
+        from PIL import ImageChops
+        alpha = ImageChops.multiply(alpha, mask)
+    # 整体透明度对应分层窗口的SourceConstantAlpha（0~255）
+    constant = max(0, min(255, int(config.get('alpha', 40))))
+    layer.putalpha(alpha.point(lambda v: v * constant // 255))
+
+    return Image.alpha_composite(backdrop or preview_backdrop(size), layer)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址的图片存储 (sxxzh定制版)
+检测器用它监视配置中的图片文件：修改时间或大小变化时重新计算内容哈希，
+内容确实变化时只解码一次，写成按哈希命名的原始RGBA文件，再通知使用该图片的背景进程重新渲染
+内容相同的图片（即使路径不同）共用同一个解码文件；背景进程以只读内存映射的方式打开它，
+多个进程共享操作系统页缓存中的同一份解码数据，不再各自解码
+解码文件按 (内容哈希, 亮度, 对比度, 饱和度) 区分，调色后的数据同样只计算一次并共享
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import sys
+import time
+import threading
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[image-store] {timestamp} - {msg}")
+
+
+NO_ADJUST = (1.0, 1.0, 1.0)
+
+
+def resolve_image_path(path):
+    """把配置中的图片路径转换为绝对路径（相对路径基于程序所在目录）"""
+    if os.path.isabs(path):
+        return path
+    if getattr(sys, 'frozen', False):
+        # 打包后环境：相对于可执行文件目录
+        base_path = os.path.dirname(sys.executable)
+    else:
+        # 开发环境：相对于脚本文件目录
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, path)
+
+
+def default_store_dir():
+    """解码文件目录：与缩略图缓存放在同一位置"""
+    base_dir = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "sxxzh_bg", "decoded")
+
+
+def image_adjust(target):
+    """目标的调色参数 (亮度, 对比度, 饱和度)"""
+    return (float(target.get('brightness', 1.0)), float(target.get('contrast', 1.0)),
+            float(target.get('saturation', 1.0)))
+
+
+def decoded_name(digest, adjust):
+    """解码文件名（不含扩展名）：不调色时为内容哈希，否则附加调色参数"""
+    if adjust == NO_ADJUST:
+        return digest
+    return digest + "_" + "_".join(f"{value:g}" for value in adjust)
+
+
+def hash_file(path, chunk_size=1048576):
+    """文件内容的SHA-1"""
+    import hashlib
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_decoded(decoded):
+    """
+    以只读内存映射打开解码文件，返回RGBA图像（与其他进程共享页缓存）；失败返回None
+
+    Args:
+        decoded: ImageStore.prepare()返回的 {'file', 'size', 'hash', 'adjust', 'source'}
+    """
+    import mmap
+    from PIL import Image
+    try:
+        w, h = decoded['size']
+        with open(decoded['file'], "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) != w * h * 4:
+            mapped.close()
+            return None
+        # 图像直接引用映射的内存，映射随图像一起释放
+        return Image.frombuffer("RGBA", (w, h), mapped, "raw", "RGBA", 0, 1)
+    except Exception as e:
+        log(f"打开解码文件失败: {decoded.get('file')} ({e})")
+        return None
+
+
+class ImageStore:
+    """
+    图片文件监视与解码缓存（线程安全，检测器在工作线程中调用）
+
+    entries记录每个被监视路径最近一次的 (mtime_ns, 大小, 内容哈希)，
+    decoded记录每个 (内容哈希, 调色参数) 对应的解码文件；解码文件按哈希和调色参数命名，写入后不再修改。
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or default_store_dir()
+        self.entries = {}  # 绝对路径 -> {'mtime_ns', 'size', 'hash'}
+        self.decoded = {}  # (内容哈希, 调色参数) -> {'file', 'size', 'hash', 'adjust'}，动画等不支持的图片为None
+        self.watched = set()
+        self.adjusts = {}  # 绝对路径 -> 使用该图片的目标的调色参数集合
+        self.reloads = 0
+        self._pruned = False
+        self._pending_changes = set()  # prepare()时发现、尚未由check()报告的变化
+        self._lock = threading.Lock()
+
+    def watch(self, targets):
+        """设置需要监视的图片（配置中单张图片的目标，目录与列表形式的幻灯片除外）"""
+        adjusts = {}
+        for target in targets:
+            path = target.get('image_path')
+            if isinstance(path, str) and path:
+                path = resolve_image_path(path)
+                if not os.path.isdir(path):
+                    adjusts.setdefault(path, set()).add(image_adjust(target))
+        with self._lock:
+            self.watched = set(adjusts)
+            self.adjusts = adjusts
+            for path in list(self.entries):
+                if path not in adjusts:
+                    del self.entries[path]
+
+    def _refresh(self, path):
+        """按需更新路径的哈希，返回 (当前哈希, 内容是否变化)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, self.entries.pop(path, None) is not None
+        entry = self.entries.get(path)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['hash'], False
+        try:
+            digest = hash_file(path)
+        except OSError as e:
+            log(f"读取图片失败: {path} ({e})")
+            return None, False
+        self.entries[path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest}
+        # 第一次看到的文件不算变化；只改了修改时间、内容相同的也不算
+        return digest, entry is not None and entry['hash'] != digest
+
+    def check(self):
+        """检查被监视的文件，返回内容发生变化的路径列表"""
+        changed = []
+        with self._lock:
+            for path in sorted(self.watched):
+                _, content_changed = self._refresh(path)
+                if content_changed or path in self._pending_changes:
+                    changed.append(path)
+            self._pending_changes.clear()
+        # 第一次检查时清理上次运行遗留的解码文件
+        if changed or not self._pruned:
+            self._pruned = True
+            self.prune()
+        return changed
+
+    def prepare(self, path, adjust=NO_ADJUST):
+        """
+        确保图片已解码（并按adjust调色）为共享的原始RGBA文件，返回 {'file', 'size', 'hash', 'adjust', 'source'}；
+        动画图片或解码失败时返回None，背景进程按原方式自行加载
+        """
+        path = resolve_image_path(path)
+        adjust = tuple(adjust)
+        with self._lock:
+            digest, content_changed = self._refresh(path)
+            if content_changed:
+                self._pending_changes.add(path)
+            if digest is None:
+                return None
+            key = (digest, adjust)
+            if key not in self.decoded:
+                self.decoded[key] = self._decode(path, digest, adjust)
+            decoded = self.decoded[key]
+        if decoded is None:
+            return None
+        return dict(decoded, source=path)
+
+    def _decode(self, path, digest, adjust):
+        """解码并调色一次，写入按哈希和调色参数命名的文件（先写临时文件再替换）"""
+        from PIL import Image
+        start = time.perf_counter()
+        try:
+            with Image.open(path) as img:
+                if getattr(img, 'is_animated', False):
+                    return None
+                rgba = img.convert("RGBA")
+            if adjust != NO_ADJUST:
+                from image_pipeline import adjust_image
+                rgba = adjust_image(rgba, *adjust)
+        except Exception as e:
+            log(f"解码图片失败: {path} ({e})")
+            return None
+
+        target = os.path.join(self.store_dir, decoded_name(digest, adjust) + ".rgba")
+        if not os.path.exists(target) or os.path.getsize(target) != rgba.width * rgba.height * 4:
+            try:
+                os.makedirs(self.store_dir, exist_ok=True)
+                temp_file = f"{target}.{os.getpid()}.tmp"
+                with open(temp_file, "wb") as f:
+                    f.write(rgba.tobytes())
+                os.replace(temp_file, target)
+            except OSError as e:
+                log(f"写入解码文件失败: {e}")
+                return None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        log(f"已解码 {os.path.basename(path)} ({rgba.width}x{rgba.height})，用时 {elapsed_ms:.0f} ms")
+        return {'file': target, 'size': [rgba.width, rgba.height], 'hash': digest, 'adjust': list(adjust)}
+
+    def prune(self):
+        """删除不再被任何监视目标引用的解码文件（仍被进程映射而无法删除的留到下次）"""
+        with self._lock:
+            live = {(entry['hash'], adjust) for path, entry in self.entries.items()
+                    for adjust in self.adjusts.get(path, ())}
+            for key in [key for key in self.decoded if key not in live]:
+                del self.decoded[key]
+            live_names = {decoded_name(digest, adjust) for digest, adjust in live}
+        try:
+            names = os.listdir(self.store_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".rgba") and name[:-5] not in live_names:
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """监视与共享情况"""
+        with self._lock:
+            hashes = [entry['hash'] for entry in self.entries.values()]
+            return {
+                'watched': len(self.watched),
+                'decoded': sum(1 for decoded in self.decoded.values() if decoded),
+                'shared_paths': len(hashes) - len(set(hashes)),
+                'reloads': self.reloads,
+            }
@@ -42,11 +42,9 @@ import os
 import sys
 import time
 import signal
-import threading
-import pystray
-from PIL import Image, ImageDraw
-from target_manager import TargetManager
-from window_detector import WindowDetector
+from readiness import Readiness
+# 其余模块按运行模式在用到时才导入：背景创建器进程只需要bg_creator，
+# 配置编辑器只需要PyQt5，托盘、PIL、检测器只在正常模式下加载（见bench_startup.py）
 
 # 全局变量保存mutex引用，防止被垃圾回收
 _mutex_handle = None
@@ -82,6 +80,8 @@ class SystemTrayIcon:
     
     def create_icon_image(self):
         """创建托盘图标图像"""
+        from PIL import Image, ImageDraw
+        
         # 使用logo.ico文件作为托盘图标
         try:
             # 获取logo.ico文件的绝对路径
@@ -96,7 +96,6 @@ class SystemTrayIcon:
             
             if os.path.exists(logo_path):
                 # 加载ICO文件并转换为PIL图像格式
-                from PIL import Image
                 icon_image = Image.open(logo_path)
                 # 确保图像尺寸适合托盘图标（通常32x32或16x16）
                 if icon_image.size != (32, 32):
@@ -127,6 +126,9 @@ class SystemTrayIcon:
     
     def on_show_info(self, icon, item):
         """显示信息菜单项回调 - 使用默认文本编辑器打开日志文件"""
+        # 先把当前运行状态写入日志，便于查看
+        self.system.log_stats()
+        
         # 确定日志文件路径
         if getattr(sys, 'frozen', False):
             log_dir = os.path.join(os.path.dirname(sys.executable), "logs")
@@ -173,6 +175,11 @@ class SystemTrayIcon:
             except Exception as e:
                 log(f"创建日志文件失败: {e}")
     
+    def on_profile(self, icon, item):
+        """性能分析菜单项回调 - 在主进程和全部背景进程中采样一段时间"""
+        log("收到性能分析指令，结果将写入 logs/ 目录")
+        self.system.start_profiling()
+    
     def on_toggle_auto_start(self, icon, item):
         """切换开机自启状态 - 修复版"""
         try:
@@ -323,9 +330,12 @@ class SystemTrayIcon:
     
     def setup_menu(self):
         """设置托盘菜单"""
+        import pystray
+        
         menu_items = [
             pystray.MenuItem("显示信息", self.on_show_info),
             pystray.MenuItem("修改配置", self.on_edit_config),
+            pystray.MenuItem("性能分析", self.on_profile),
             pystray.Menu.SEPARATOR,
             pystray.MenuItem("开机自启", self.on_toggle_auto_start, checked=lambda item: self.auto_start_enabled),
             pystray.MenuItem("隐藏托盘", self.on_toggle_hide),
@@ -334,19 +344,24 @@ class SystemTrayIcon:
         ]
         return pystray.Menu(*menu_items)
     
+    def _create_icon(self):
+        """创建pystray图标对象"""
+        import pystray
+        
+        image = self.create_icon_image()
+        menu = self.setup_menu()
+        
+        self.icon = pystray.Icon(
+            "sxxzh_bg_system",
+            image,
+            "自定义背景-by sxxxzh",  # 悬停提示
+            menu
+        )
+    
     def run(self):
-        """运行托盘图标"""
+        """运行托盘图标（阻塞当前线程）"""
         try:
-            image = self.create_icon_image()
-            menu = self.setup_menu()
-            
-            self.icon = pystray.Icon(
-                "sxxzh_bg_system",
-                image,
-                "自定义背景-by sxxxzh",  # 悬停提示
-                menu
-            )
-            
+            self._create_icon()
             self.running = True
             log("托盘图标即将启动...")
             self.icon.run()
@@ -357,6 +372,20 @@ class SystemTrayIcon:
             log(f"详细错误: {traceback.format_exc()}")
             self.running = False
     
+    def run_detached(self):
+        """在pystray自己的线程中运行托盘图标，不阻塞调用者"""
+        try:
+            self._create_icon()
+            self.running = True
+            log("托盘图标即将启动...")
+            self.icon.run_detached()
+            
+        except Exception as e:
+            log(f"托盘图标启动失败: {e}")
+            import traceback
+            log(f"详细错误: {traceback.format_exc()}")
+            self.running = False
+    
     def stop(self):
         """停止托盘图标"""
         if self.icon and self.running:
@@ -403,9 +432,16 @@ def log(msg, module="main"):
     return log_msg
 
 class BackgroundSystem:
-    """背景挂载系统主控制器 - sxxzh定制版"""
+    """背景挂载系统主控制器 - sxxzh定制版
+    
+    检测、配置重载、子进程监控和定时器都运行在同一个asyncio事件循环中，
+    只有pystray托盘图标保留自己的线程。
+    """
+    
+    # 退出时等待事件循环完成清理的最长时间（秒）
+    SHUTDOWN_TIMEOUT = 10
     
-    def __init__(self, config_path="config.json", tray_mode=False):
+    def __init__(self, config_path="config.json", tray_mode=False, readiness=None, power_provider=None):
         # 确定配置文件路径
         if getattr(sys, 'frozen', False):
             # 打包后环境
@@ -422,10 +458,15 @@ class BackgroundSystem:
         self.target_manager = None
         self.window_detector = None
         self.should_exit = False
-        self.config_reload_thread = None
         self.tray_mode = tray_mode
         self.tray_icon = None
-        self.main_thread = None
+        self.loop = None
+        self._stop_event = None
+        # 启动就绪检查（测试时可传入替换了检查函数和时钟的实例）
+        self.readiness = readiness or Readiness()
+        # 电源与会话状态提供者（测试时可传入power_policy.SimulatedPowerProvider）
+        self.power_provider = power_provider
+        self.power_policy = None
     
     def initialize(self):
         """初始化系统"""
@@ -435,10 +476,17 @@ class BackgroundSystem:
         log(f"可执行文件路径: {sys.executable if getattr(sys, 'frozen', False) else '开发模式'}")
         
         try:
+            from target_manager import TargetManager
+            from window_detector import WindowDetector
+            
             # 初始化第一层：目标管理器
             self.target_manager = TargetManager(self.config_path)
             
-            # 检查配置是否加载成功
+            # 检查配置是否加载成功；文件暂时不可读时（如开机时磁盘尚未就绪）按退避重试
+            def config_loaded():
+                return self.target_manager.get_config() is not None or self.target_manager.reload_config()
+            
+            self.readiness.wait("配置加载", config_loaded, self.readiness.CONFIG_TIMEOUT)
             config = self.target_manager.get_config()
             if not config:
                 log("配置加载失败，系统无法启动")
@@ -450,8 +498,14 @@ class BackgroundSystem:
             self.window_detector = WindowDetector(self.target_manager)
             log("窗口检测器初始化成功")
             
-            # 启动配置重载线程
-            self._start_config_reload_thread()
+            # 配置重载检查挂在扫描定时器上，不再单独占用线程
+            self.window_detector.tick_hooks.append(self._check_config_update)
+            
+            # 电源策略：使用电池时放慢扫描和渲染，锁屏或显示器关闭时挂起所有背景
+            from power_policy import PowerPolicy
+            self.power_policy = PowerPolicy(self.power_provider)
+            self.power_policy.listeners.append(self._on_power_mode_changed)
+            self.window_detector.tick_hooks.append(self._check_power_state)
             
             log("系统初始化完成")
             return True
@@ -462,30 +516,78 @@ class BackgroundSystem:
             log(f"详细错误: {traceback.format_exc()}")
             return False
     
-    def _start_config_reload_thread(self):
-        """启动配置重载线程"""
-        def config_reload_worker():
-            while not self.should_exit:
-                try:
-                    # 每5秒检查一次配置更新
-                    time.sleep(5)
-                    
-                    if self.target_manager.is_config_updated():
-                        log("检测到配置文件更新，重新加载配置...")
-                        if self.target_manager.reload_config():
-                            log("配置重载成功")
-                        else:
-                            log("配置重载失败")
-                            
-                except Exception as e:
-                    log(f"配置重载线程出错: {e}")
+    def _check_config_update(self):
+        """检查配置文件是否更新（每次扫描和探测前调用）"""
+        try:
+            if self.target_manager.is_config_updated():
+                log("检测到配置文件更新，重新加载配置...")
+                if self.target_manager.reload_config():
+                    log("配置重载成功")
+                    # 立即按新配置扫描，不等待下一次计划扫描
+                    self.window_detector.wakeup()
+                else:
+                    log("配置重载失败")
+        except Exception as e:
+            log(f"配置重载检查出错: {e}")
+    
+    def _check_power_state(self):
+        """按当前电源与会话状态更新运行模式（每次扫描和探测前调用）"""
+        config = self.target_manager.get_config()
+        if config:
+            self.power_policy.configure(config)
+        self.power_policy.update()
+    
+    def _on_power_mode_changed(self, mode, previous):
+        """运行模式变化：调整检测器的扫描间隔并通知所有背景进程"""
+        self.window_detector.set_power_mode(mode)
+    
+    async def _run_control_plane(self, on_started=None):
+        """事件循环主协程：运行检测器直到收到停止信号"""
+        import asyncio
         
-        self.config_reload_thread = threading.Thread(
-            target=config_reload_worker,
-            daemon=True
-        )
-        self.config_reload_thread.start()
-        log("配置重载线程已启动")
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self.should_exit:
+            self._stop_event.set()
+        
+        # 状态变化通知来自其他线程，唤醒检测器后在事件循环中处理
+        self.power_policy.start(self.window_detector.wakeup)
+        detector_task = asyncio.create_task(self.window_detector.run_async())
+        stop_task = asyncio.create_task(self._stop_event.wait())
+        
+        try:
+            if on_started:
+                # 检测器完成第一次扫描（或已退出）后立即继续，不再固定等待
+                await self.readiness.wait_async(
+                    "窗口检测器",
+                    lambda: self.window_detector.first_scan_done or detector_task.done(),
+                    self.readiness.DETECTOR_TIMEOUT
+                )
+                on_started()
+                log(f"启动阶段耗时: {self.readiness.summary()}")
+            
+            await asyncio.wait(
+                {detector_task, stop_task},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stop_task.cancel()
+            self.power_policy.stop()
+            self.window_detector.stop()
+            try:
+                # 检测器会在退出前停止全部子进程，这里限定总等待时间
+                await asyncio.wait_for(detector_task, self.SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                log(f"检测器未在 {self.SHUTDOWN_TIMEOUT} 秒内完成清理，已取消")
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                log(f"检测器退出时出错: {e}")
+    
+    def _run_event_loop(self, on_started=None):
+        """在当前线程运行控制平面的事件循环直到退出（两种运行模式共用）"""
+        import asyncio
+        asyncio.run(self._run_control_plane(on_started))
     
     def run(self):
         """运行系统"""
@@ -509,8 +611,8 @@ class BackgroundSystem:
         log("按 Ctrl+C 停止系统")
         
         try:
-            # 运行窗口检测器
-            self.window_detector.run()
+            # 运行事件循环（检测器及其子进程监控）
+            self._run_event_loop()
             
         except KeyboardInterrupt:
             log("收到中断信号，正在停止系统...")
@@ -529,29 +631,14 @@ class BackgroundSystem:
             # 创建托盘图标
             self.tray_icon = SystemTrayIcon(self)
             
-            # 在后台线程中运行窗口检测器
-            def window_detector_worker():
-                try:
-                    log("窗口检测器线程启动...")
-                    self.window_detector.run()
-                except Exception as e:
-                    log(f"窗口检测器运行出错: {e}")
-                    import traceback
-                    log(f"详细错误: {traceback.format_exc()}")
-            
-            self.main_thread = threading.Thread(
-                target=window_detector_worker,
-                daemon=True
-            )
-            self.main_thread.start()
+            def start_tray():
+                # 托盘图标运行在pystray自己的线程中
+                log("托盘图标启动中...")
+                self.tray_icon.run_detached()
             
-            # 给窗口检测器一点启动时间
-            time.sleep(0.5)
-            
-            # 运行托盘图标（这会阻塞当前线程）
-            log("托盘图标启动中...")
-            self.tray_icon.run()
-            log("托盘图标已停止")
+            # 事件循环运行在当前线程，直到托盘"退出"或收到停止信号
+            self._run_event_loop(on_started=start_tray)
+            log("事件循环已停止")
             
         except Exception as e:
             log(f"托盘模式运行出错: {e}")
@@ -589,10 +676,38 @@ class BackgroundSystem:
         
         print("="*60 + "\n")
     
+    def get_stats(self):
+        """获取运行状态统计（检测器、子进程、位图内存预算、电源模式）"""
+        if not self.window_detector:
+            return {}
+        stats = self.window_detector.get_stats()
+        if self.power_policy:
+            stats['power'] = self.power_policy.stats()
+        return stats
+    
+    def log_stats(self):
+        """把运行状态统计写入日志"""
+        try:
+            import json
+            log(f"运行状态: {json.dumps(self.get_stats(), ensure_ascii=False)}")
+        except Exception as e:
+            log(f"获取运行状态失败: {e}")
+    
+    def start_profiling(self, duration=None):
+        """开启采样性能分析（线程安全）"""
+        if self.window_detector:
+            self.window_detector.request_profiling(duration)
+    
     def stop(self):
-        """停止系统"""
+        """停止系统（线程安全，可在托盘线程或信号处理中调用）"""
         log("正在停止系统...")
         self.should_exit = True
+        if self.loop and self._stop_event:
+            try:
+                self.loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
         if self.window_detector:
             self.window_detector.stop()
     
@@ -602,12 +717,9 @@ class BackgroundSystem:
         
         self.should_exit = True
         
-        if self.window_detector:
-            self.window_detector.cleanup()
-        
-        # 等待配置重载线程结束
-        if self.config_reload_thread and self.config_reload_thread.is_alive():
-            self.config_reload_thread.join(timeout=3)
+        # 子进程已在事件循环退出前停止，这里只需要关闭托盘图标
+        if self.tray_icon:
+            self.tray_icon.stop()
         
         # 清理单实例资源
         cleanup_single_instance()
@@ -869,14 +981,14 @@ def main():
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
         
-        # 等待系统启动完成（特别是开机自启时）
-        # 给系统一些时间来完成启动过程
+        # 等待系统启动完成（特别是开机自启时）：任务栏就绪后立即继续
+        readiness = Readiness()
         if getattr(sys, 'frozen', False):
             log("等待系统环境就绪...")
-            time.sleep(2)  # 延迟2秒
+            readiness.wait_for_shell()
         
         # 创建系统实例（启用托盘模式）
-        system = BackgroundSystem(tray_mode=True)
+        system = BackgroundSystem(tray_mode=True, readiness=readiness)
         
         # 保存到全局变量以便信号处理
         globals()['system'] = system
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+电源与会话策略 (sxxzh定制版)
+根据电源和会话状态决定系统的运行模式：
+  normal     接通电源，正常运行
+  saver      使用电池：检测器的扫描/探测间隔按battery_interval_scale放大，
+             背景进程加长轮询间隔、限制动画帧率、改用双线性缩放
+  suspended  会话锁定或显示器关闭：检测器停止扫描，背景进程停止渲染并释放位图
+状态由可替换的提供者给出：Windows下用隐藏的消息窗口接收锁屏/显示器/电源变化通知，
+其他环境（以及测试）使用SimulatedPowerProvider手动设置状态
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import sys
+import time
+import threading
+from collections import namedtuple
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[power-policy] {timestamp} - {msg}")
+
+
+# 电源与会话状态
+PowerState = namedtuple('PowerState', ['on_battery', 'session_locked', 'display_off'])
+
+MODES = ("normal", "saver", "suspended")
+
+
+class SimulatedPowerProvider:
+    """模拟的状态提供者：状态由set()修改，修改时通知回调（非Windows环境与测试使用）"""
+
+    def __init__(self, on_battery=False, session_locked=False, display_off=False):
+        self.state = PowerState(on_battery, session_locked, display_off)
+        self._on_change = None
+
+    def start(self, on_change=None):
+        self._on_change = on_change
+
+    def stop(self):
+        self._on_change = None
+
+    def set(self, **changes):
+        """修改部分状态，如 set(session_locked=True)"""
+        self.state = self.state._replace(**changes)
+        if self._on_change:
+            self._on_change()
+
+    def read(self):
+        return self.state
+
+
+class Win32PowerProvider:
+    """
+    Windows状态提供者
+
+    电源（交流/电池）每次直接查询GetSystemPowerStatus；锁屏和显示器开关没有可轮询的接口，
+    由一个隐藏的消息窗口接收WM_WTSSESSION_CHANGE和GUID_CONSOLE_DISPLAY_STATE通知。
+    通知到达时调用on_change（在消息线程中），调用方应只做线程安全的唤醒。
+    """
+
+    WM_CLOSE = 0x0010
+    WM_DESTROY = 0x0002
+    WM_POWERBROADCAST = 0x0218
+    WM_WTSSESSION_CHANGE = 0x02B1
+    PBT_APMPOWERSTATUSCHANGE = 0x000A
+    PBT_POWERSETTINGCHANGE = 0x8013
+    WTS_SESSION_LOCK = 7
+    WTS_SESSION_UNLOCK = 8
+    HWND_MESSAGE = -3
+    GUID_CONSOLE_DISPLAY_STATE = "6FE69556-704A-47A0-8F24-C28D936FDA47"
+
+    def __init__(self):
+        self.session_locked = False
+        self.display_off = False
+        self._on_change = None
+        self._hwnd = None
+        self._thread = None
+        self._events_ok = False
+
+    def start(self, on_change=None):
+        """启动消息线程接收锁屏与显示器通知"""
+        self._on_change = on_change
+        self._thread = threading.Thread(target=self._message_loop, name="power-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """关闭消息窗口，结束消息线程"""
+        self._on_change = None
+        if self._hwnd:
+            try:
+                import win32gui
+                win32gui.PostMessage(self._hwnd, self.WM_CLOSE, 0, 0)
+            except Exception as e:
+                log(f"关闭电源通知窗口失败: {e}")
+
+    def _message_loop(self):
+        import ctypes
+        import uuid
+        import win32api
+        import win32gui
+
+        class GUID(ctypes.Structure):
+            _fields_ = [("Data1", ctypes.c_ulong), ("Data2", ctypes.c_ushort),
+                        ("Data3", ctypes.c_ushort), ("Data4", ctypes.c_ubyte * 8)]
+
+        user32 = ctypes.windll.user32
+        wtsapi32 = ctypes.windll.wtsapi32
+        user32.RegisterPowerSettingNotification.restype = ctypes.c_void_p
+        user32.RegisterPowerSettingNotification.argtypes = [ctypes.c_void_p, ctypes.POINTER(GUID), ctypes.c_ulong]
+        user32.UnregisterPowerSettingNotification.argtypes = [ctypes.c_void_p]
+
+        display_guid = uuid.UUID(self.GUID_CONSOLE_DISPLAY_STATE)
+        fields = display_guid.fields
+        self._display_guid = GUID(fields[0], fields[1], fields[2],
+                                  (ctypes.c_ubyte * 8)(*display_guid.bytes[8:]))
+        notify = None
+        try:
+            wc = win32gui.WNDCLASS()
+            wc.lpszClassName = "SxxzhBgPowerEvents"
+            wc.lpfnWndProc = self._wnd_proc
+            wc.hInstance = win32api.GetModuleHandle(None)
+            win32gui.RegisterClass(wc)
+            self._hwnd = win32gui.CreateWindow(wc.lpszClassName, "", 0, 0, 0, 0, 0,
+                                               self.HWND_MESSAGE, 0, wc.hInstance, None)
+            # 注册后系统会立即发送一次当前的显示器状态
+            notify = user32.RegisterPowerSettingNotification(self._hwnd, ctypes.byref(self._display_guid), 0)
+            wtsapi32.WTSRegisterSessionNotification(self._hwnd, 0)  # NOTIFY_FOR_THIS_SESSION
+            self._events_ok = True
+            win32gui.PumpMessages()
+        except Exception as e:
+            log(f"电源通知窗口创建失败，锁屏改为轮询检测: {e}")
+        finally:
+            self._events_ok = False
+            if notify:
+                user32.UnregisterPowerSettingNotification(notify)
+            self._hwnd = None
+
+    def _wnd_proc(self, hwnd, msg, wparam, lparam):
+        import ctypes
+        import win32gui
+        changed = False
+        if msg == self.WM_WTSSESSION_CHANGE:
+            if wparam in (self.WTS_SESSION_LOCK, self.WTS_SESSION_UNLOCK):
+                self.session_locked = wparam == self.WTS_SESSION_LOCK
+                changed = True
+        elif msg == self.WM_POWERBROADCAST:
+            if wparam == self.PBT_POWERSETTINGCHANGE and lparam:
+                # POWERBROADCAST_SETTING: GUID(16字节) + DataLength(4字节) + Data
+                if ctypes.string_at(lparam, 16) == bytes(self._display_guid):
+                    # 0 - 关闭, 1 - 打开, 2 - 变暗
+                    self.display_off = ctypes.c_ulong.from_address(lparam + 20).value == 0
+                    changed = True
+            elif wparam == self.PBT_APMPOWERSTATUSCHANGE:
+                changed = True
+            if changed and self._on_change:
+                self._on_change()
+            return True
+        elif msg == self.WM_DESTROY:
+            win32gui.PostQuitMessage(0)
+            return 0
+        if changed and self._on_change:
+            self._on_change()
+        return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
+
+    @staticmethod
+    def _input_desktop_locked():
+        """锁屏时输入桌面切换为安全桌面，当前进程无法打开"""
+        import ctypes
+        user32 = ctypes.windll.user32
+        desktop = user32.OpenInputDesktop(0, False, 0x0100)  # DESKTOP_SWITCHDESKTOP
+        if not desktop:
+            return True
+        user32.CloseDesktop(desktop)
+        return False
+
+    def read(self):
+        import ctypes
+
+        class SYSTEM_POWER_STATUS(ctypes.Structure):
+            _fields_ = [("ACLineStatus", ctypes.c_ubyte), ("BatteryFlag", ctypes.c_ubyte),
+                        ("BatteryLifePercent", ctypes.c_ubyte), ("SystemStatusFlag", ctypes.c_ubyte),
+                        ("BatteryLifeTime", ctypes.c_ulong), ("BatteryFullLifeTime", ctypes.c_ulong)]
+
+        status = SYSTEM_POWER_STATUS()
+        on_battery = False
+        if ctypes.windll.kernel32.GetSystemPowerStatus(ctypes.byref(status)):
+            # 0 - 使用电池, 1 - 接通电源, 255 - 未知（台式机按接通电源处理）
+            on_battery = status.ACLineStatus == 0
+        locked = self.session_locked if self._events_ok else self._input_desktop_locked()
+        return PowerState(on_battery, locked, self.display_off)
+
+
+def default_power_provider():
+    """当前平台的状态提供者"""
+    if sys.platform == 'win32':
+        return Win32PowerProvider()
+    return SimulatedPowerProvider()
+
+
+class PowerPolicy:
+    """
+    运行模式决策（在检测器的事件循环中调用update()）
+
+    模式变化时依次调用listeners中的 callback(mode, previous)。
+    读取状态失败时保持上一次的状态，不因偶发错误挂起或恢复背景。
+    """
+
+    def __init__(self, provider=None, clock=time.monotonic):
+        """
+        Args:
+            provider: 状态提供者（需有read()，可选start(on_change)/stop()），默认按平台选择
+            clock: 统计各模式时长的时钟，测试时可替换
+        """
+        self.provider = provider or default_power_provider()
+        self.clock = clock
+        self.enabled = True
+        self.state = PowerState(False, False, False)
+        self.mode = "normal"
+        self.changes = 0
+        self.listeners = []
+        self._mode_since = clock()
+        self._mode_seconds = dict.fromkeys(MODES, 0.0)
+        self._last_error = None
+
+    def configure(self, config):
+        """读取power_saving开关（关闭时始终按normal运行）"""
+        self.enabled = bool(config.get('power_saving', True))
+
+    def start(self, on_change=None):
+        """开始接收状态变化通知；on_change可能在其他线程中调用"""
+        start = getattr(self.provider, 'start', None)
+        if start:
+            try:
+                start(on_change)
+            except Exception as e:
+                log(f"启动电源状态监听失败: {e}")
+
+    def stop(self):
+        stop = getattr(self.provider, 'stop', None)
+        if stop:
+            try:
+                stop()
+            except Exception as e:
+                log(f"停止电源状态监听失败: {e}")
+
+    def evaluate(self, state):
+        """由状态得到运行模式"""
+        if not self.enabled:
+            return "normal"
+        if state.session_locked or state.display_off:
+            return "suspended"
+        if state.on_battery:
+            return "saver"
+        return "normal"
+
+    def update(self):
+        """读取当前状态，模式变化时通知监听者；返回当前模式"""
+        try:
+            self.state = self.provider.read()
+            self._last_error = None
+        except Exception as e:
+            if str(e) != self._last_error:
+                self._last_error = str(e)
+                log(f"读取电源状态失败: {e}")
+
+        mode = self.evaluate(self.state)
+        if mode != self.mode:
+            now = self.clock()
+            self._mode_seconds[self.mode] += now - self._mode_since
+            self._mode_since = now
+            previous, self.mode = self.mode, mode
+            self.changes += 1
+            log(f"运行模式 {previous} -> {mode} (电池: {self.state.on_battery}, "
+                f"锁屏: {self.state.session_locked}, 显示器关闭: {self.state.display_off})")
+            for listener in list(self.listeners):
+                try:
+                    listener(mode, previous)
+                except Exception as e:
+                    log(f"通知运行模式变化失败: {e}")
+        return mode
+
+    def stats(self):
+        """当前状态与各模式累计时长"""
+        seconds = dict(self._mode_seconds)
+        seconds[self.mode] += self.clock() - self._mode_since
+        return {
+            'mode': self.mode,
+            'enabled': self.enabled,
+            'on_battery': self.state.on_battery,
+            'session_locked': self.state.session_locked,
+            'display_off': self.state.display_off,
+            'changes': self.changes,
+            'seconds': {mode: round(value, 1) for mode, value in seconds.items()},
+        }
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动就绪检查 (sxxzh定制版)
+用带上限的指数退避轮询代替固定的启动延时：系统外壳（托盘宿主）、配置、窗口检测器
+依次就绪后立即继续，并记录每个阶段的耗时
+时钟、休眠函数和各项检查都可以替换，便于在非Windows环境下测试启动流程
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import sys
+import time
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[readiness] {timestamp} - {msg}")
+
+
+def shell_ready():
+    """任务栏（托盘图标的宿主）窗口是否已创建；非Windows环境视为就绪"""
+    if sys.platform != 'win32':
+        return True
+    import ctypes
+    return bool(ctypes.windll.user32.FindWindowW("Shell_TrayWnd", None))
+
+
+class Readiness:
+    """
+    启动阶段的就绪等待器
+
+    wait()/wait_async()反复调用检查函数，间隔从initial_delay开始按倍数增长，
+    不超过max_delay；检查函数抛出异常视为尚未就绪。超时后返回False，由调用者决定是否继续启动。
+    """
+
+    # 各阶段的默认超时（秒）：开机登录较慢时系统外壳可能需要较长时间
+    SHELL_TIMEOUT = 60
+    CONFIG_TIMEOUT = 3
+    DETECTOR_TIMEOUT = 10
+
+    def __init__(self, shell_probe=shell_ready, initial_delay=0.05, max_delay=1.0, factor=2.0,
+                 clock=time.perf_counter, sleep=time.sleep, async_sleep=None):
+        """
+        Args:
+            shell_probe: 系统外壳是否就绪的检查函数
+            initial_delay: 第一次重试前的等待时间（秒）
+            max_delay: 重试间隔上限（秒）
+            factor: 重试间隔增长倍数
+            clock/sleep/async_sleep: 时钟与休眠函数，测试时可替换为模拟实现
+        """
+        self.shell_probe = shell_probe
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.phases = []  # [(阶段名称, 是否就绪, 耗时秒)]
+
+    def _poll(self, name, probe, timeout):
+        """轮询生成器：产出每次需要等待的秒数，结束时返回是否就绪"""
+        start = self.clock()
+        delay = self.initial_delay
+        attempts = 0
+        last_error = None
+        while True:
+            attempts += 1
+            try:
+                ready = bool(probe())
+            except Exception as e:
+                # 同样的错误只记录一次，避免开机较慢时刷屏
+                if str(e) != last_error:
+                    last_error = str(e)
+                    log(f"{name} 检查出错: {e}")
+                ready = False
+
+            elapsed = self.clock() - start
+            if ready:
+                log(f"{name} 已就绪，用时 {elapsed * 1000:.0f} ms（检查 {attempts} 次）")
+                self.phases.append((name, True, elapsed))
+                return True
+            if elapsed >= timeout:
+                log(f"{name} 在 {timeout:.0f} 秒内未就绪（检查 {attempts} 次），继续启动")
+                self.phases.append((name, False, elapsed))
+                return False
+
+            yield min(delay, timeout - elapsed)
+            delay = min(self.max_delay, delay * self.factor)
+
+    def wait(self, name, probe, timeout):
+        """阻塞等待probe()返回真值，返回是否在超时前就绪"""
+        poller = self._poll(name, probe, timeout)
+        try:
+            while True:
+                self.sleep(next(poller))
+        except StopIteration as done:
+            return done.value
+
+    async def wait_async(self, name, probe, timeout):
+        """在事件循环中等待probe()返回真值，不阻塞其他协程"""
+        if self.async_sleep is None:
+            import asyncio
+            self.async_sleep = asyncio.sleep
+        poller = self._poll(name, probe, timeout)
+        try:
+            while True:
+                await self.async_sleep(next(poller))
+        except StopIteration as done:
+            return done.value
+
+    def wait_for_shell(self, timeout=None):
+        """等待系统外壳就绪（开机自启时桌面可能尚未加载完成）"""
+        return self.wait("系统外壳", self.shell_probe, self.SHELL_TIMEOUT if timeout is None else timeout)
+
+    def summary(self):
+        """各阶段耗时摘要"""
+        return ", ".join(f"{name} {elapsed * 1000:.0f} ms{'' if ready else '(超时)'}"
+                         for name, ready, elapsed in self.phases)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采样性能分析器 (sxxzh定制版)
+按固定间隔采样进程内所有线程的调用栈，开销低，适合在用户机器上临时开启
+结果写入 logs/ 目录：pstats文件（可用pstats/snakeviz查看）和折叠栈文件（可用flamegraph.pl生成火焰图）
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import re
+import sys
+import time
+import marshal
+import threading
+from collections import Counter, defaultdict
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[sampling-profiler] {timestamp} - {msg}")
+
+
+def default_log_dir():
+    """日志目录：打包后在可执行文件同目录，开发环境在源代码目录"""
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "logs")
+
+
+def _safe_name(text):
+    """把目标名称等转换为可用于文件名的形式"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(text)).strip('_') or "unnamed"
+
+
+class SamplingProfiler:
+    """
+    统计采样分析器
+
+    后台线程每隔interval秒读取一次 sys._current_frames()，只记录调用栈，
+    不像cProfile那样给每次函数调用加钩子，因此可以在正常运行时开启。
+    采样结束后自动写出结果文件。
+    """
+
+    def __init__(self, name, tags=None, interval=0.01, output_dir=None):
+        """
+        Args:
+            name: 进程名称，如 main / bg_creator
+            tags: 写入文件名的附加标签，如 {'hwnd': 123, 'target': 'Notepad'}
+            interval: 采样间隔（秒）
+            output_dir: 输出目录，默认 logs/
+        """
+        self.name = name
+        self.tags = tags or {}
+        self.interval = max(0.001, interval)
+        self.output_dir = output_dir or default_log_dir()
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """清空采样数据"""
+        self.samples = 0
+        self.started_at = None
+        self.collapsed = Counter()       # 折叠栈 -> 采样次数
+        self.self_counts = Counter()     # 函数 -> 位于栈顶的次数
+        self.total_counts = Counter()    # 函数 -> 出现在栈中的次数
+        self.caller_counts = defaultdict(Counter)  # 被调函数 -> {调用者: 次数}
+        self.caller_self_counts = defaultdict(Counter)
+
+    def is_running(self):
+        """是否正在采样"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration):
+        """开始采样duration秒，已在采样时返回False"""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._reset()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration,),
+                                            name="sampling-profiler", daemon=True)
+            self._thread.start()
+        log(f"开始采样 {self.name} (PID {os.getpid()})，时长 {duration:.0f} 秒，间隔 {self.interval * 1000:.0f} ms")
+        return True
+
+    def stop(self, timeout=5):
+        """提前结束采样并写出结果"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self, duration):
+        """采样线程主循环"""
+        own_ident = threading.get_ident()
+        self.started_at = time.time()
+        deadline = time.perf_counter() + duration
+        thread_names = {}
+        next_name_refresh = 0
+
+        while not self._stop_event.is_set() and time.perf_counter() < deadline:
+            now = time.perf_counter()
+            if now >= next_name_refresh:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                next_name_refresh = now + 1
+
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    self._record(thread_names.get(ident, f"thread-{ident}"), frame)
+            self.samples += 1
+            self._stop_event.wait(self.interval)
+
+        try:
+            self._write_results()
+        except Exception as e:
+            log(f"写出性能分析结果失败: {e}")
+
+    def _record(self, thread_name, frame):
+        """记录一个线程的调用栈"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if not stack:
+            return
+        stack.reverse()
+
+        self.collapsed[(thread_name,) + tuple(stack)] += 1
+        leaf = stack[-1]
+        self.self_counts[leaf] += 1
+        # 递归调用在同一个栈中只计一次累计时间
+        for func in set(stack):
+            self.total_counts[func] += 1
+        for i in range(1, len(stack)):
+            caller, callee = stack[i - 1], stack[i]
+            self.caller_counts[callee][caller] += 1
+            if i == len(stack) - 1:
+                self.caller_self_counts[callee][caller] += 1
+
+    def _output_prefix(self):
+        """输出文件路径前缀：进程名、PID、标签和时间"""
+        parts = [f"profile_{_safe_name(self.name)}", f"pid{os.getpid()}"]
+        for key, value in self.tags.items():
+            if value is not None:
+                parts.append(f"{key}{_safe_name(value)}" if key == 'hwnd' else _safe_name(value))
+        parts.append(time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started_at or time.time())))
+        return os.path.join(self.output_dir, "_".join(parts))
+
+    def _pstats_data(self):
+        """转换为pstats可以加载的字典（调用次数按采样次数近似）"""
+        dt = self.interval
+        stats = {}
+        for func, total in self.total_counts.items():
+            callers = {}
+            for caller, count in self.caller_counts.get(func, {}).items():
+                self_count = self.caller_self_counts.get(func, {}).get(caller, 0)
+                callers[caller] = (count, count, self_count * dt, count * dt)
+            stats[func] = (total, total, self.self_counts.get(func, 0) * dt, total * dt, callers)
+        return stats
+
+    def _write_results(self):
+        """写出pstats文件和折叠栈文件"""
+        if not self.samples:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = self._output_prefix()
+
+        with open(prefix + ".pstats", "wb") as f:
+            marshal.dump(self._pstats_data(), f)
+
+        with open(prefix + ".collapsed.txt", "w", encoding="utf-8") as f:
+            for stack, count in self.collapsed.most_common():
+                thread_name, frames = stack[0], stack[1:]
+                names = [f"{func} ({os.path.basename(filename)}:{line})"
+                         for filename, line, func in frames]
+                f.write(";".join([thread_name] + names) + f" {count}\n")
+
+        log(f"采样结束：{self.samples} 次采样，结果已写入 {prefix}.pstats / .collapsed.txt")
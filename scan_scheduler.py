@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应扫描调度 (sxxzh定制版)
+窗口检测器两次完整扫描之间，以scan_interval_min的间隔做一次廉价探测（前台窗口与可见顶层窗口数），
+探测到变化或被提前唤醒时立即扫描并把间隔重置为最小值；之后每次扫描没有发现变化，
+间隔按倍数增长，直到scan_interval_max。关闭adaptive_scan时按固定的scan_interval扫描
+同时统计每小时扫描次数和检测延迟（从最早的变化信号到扫描发现新窗口）
+使用电池时检测器设置scale，所有间隔按倍数放大
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import time
+from collections import deque
+
+
+class ScanScheduler:
+    """扫描间隔调度器（只在检测器的事件循环中使用，时钟可替换）"""
+
+    # 没有变化时每次扫描后间隔的增长倍数
+    BACKOFF_FACTOR = 1.5
+    # 检测延迟保留最近多少个样本
+    LATENCY_SAMPLES = 200
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.adaptive = True
+        self.base_interval = 3.0
+        self.min_interval = 0.5
+        self.max_interval = 15.0
+        self.scale = 1.0  # 间隔倍数（省电模式下大于1）
+        self.interval = self.min_interval
+        self.last_scan = None
+        self.first_signal = None  # 上次扫描后最早的变化信号时间
+        self.scans = 0
+        self.probes = 0
+        self.signals = 0
+        self._scan_times = deque()  # 最近一小时的扫描时间
+        self.latency_ms = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def configure(self, config):
+        """从配置读取间隔设置（每次扫描前调用，配置修改后立即生效）"""
+        self.adaptive = config.get('adaptive_scan', True)
+        self.base_interval = float(config.get('scan_interval', 3)) * self.scale
+        self.min_interval = float(config.get('scan_interval_min', 0.5)) * self.scale
+        self.max_interval = max(self.min_interval, float(config.get('scan_interval_max', 15)) * self.scale)
+        self.interval = max(self.min_interval, min(self.max_interval, self.interval))
+
+    @property
+    def probe_interval(self):
+        """两次探测之间的间隔"""
+        return self.min_interval
+
+    def next_scan_at(self):
+        """下一次按计划扫描的时间"""
+        if self.last_scan is None:
+            return self.clock()
+        return self.last_scan + (self.interval if self.adaptive else self.base_interval)
+
+    def on_signal(self):
+        """探测到变化或被提前唤醒：下一次扫描立即进行，之后从最小间隔开始"""
+        self.signals += 1
+        if self.first_signal is None:
+            self.first_signal = self.clock()
+        self.interval = self.min_interval
+
+    def on_probe(self):
+        self.probes += 1
+
+    def on_scan(self, changed, found):
+        """
+        一次扫描完成
+
+        Args:
+            changed: 目标窗口集合是否有增减
+            found: 本次发现的新目标窗口数
+        """
+        now = self.clock()
+        if found:
+            # 没有变化信号时，新窗口最早可能在上一次扫描之后出现，按上限计
+            since = self.first_signal if self.first_signal is not None else self.last_scan
+            if since is not None:
+                for _ in range(found):
+                    self.latency_ms.append((now - since) * 1000)
+
+        if changed or self.first_signal is not None:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.BACKOFF_FACTOR)
+        self.first_signal = None
+
+        self.last_scan = now
+        self.scans += 1
+        self._scan_times.append(now)
+        while self._scan_times and now - self._scan_times[0] > 3600:
+            self._scan_times.popleft()
+
+    def stats(self):
+        """调度状态与计数"""
+        latency = sorted(self.latency_ms)
+
+        def percentile(p):
+            if not latency:
+                return 0.0
+            return latency[min(len(latency) - 1, int(len(latency) * p / 100))]
+
+        return {
+            'adaptive': self.adaptive,
+            'scale': self.scale,
+            'interval': round(self.interval if self.adaptive else self.base_interval, 2),
+            'scans': self.scans,
+            'scans_last_hour': len(self._scan_times),
+            'probes': self.probes,
+            'signals': self.signals,
+            'detection_latency_ms_p50': round(percentile(50), 1),
+            'detection_latency_ms_p95': round(percentile(95), 1),
+        }
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+泄漏浸泡测试 (sxxzh定制版)
+在模拟窗口后端上运行真实的检测器和背景创建器（与trace_replay.py相同，创建器运行在本进程的线程中），
+反复执行成千上万次"打开窗口 -> 调整大小 -> 关闭窗口"，每隔若干轮在所有窗口关闭后采样：
+  handles   句柄数（Windows为内核句柄数，其他系统为打开的文件描述符数）
+  gdi       GDI对象数（仅Windows）
+  threads   线程数
+  objects   gc跟踪的Python对象数
+  rss_mb    驻留内存（MB）
+  state     检测器与进程管理器中按窗口记录的状态条目数（窗口全部关闭后应回到初始值）
+开始前先检查一次幻灯片窗口在挂起（最小化）并恢复后是否继续切换，不再切换时返回码为1
+跳过预热阶段后，任一指标在最后三分之一采样中的中位数比前三分之一高出阈值即判定为泄漏，返回码为1；
+objects的阈值按每轮计，乘以两段之间相隔的轮数（不低于OBJECTS_MIN_GROWTH）
+用法：python soak_test.py [--cycles 2000] [--windows 4] [--sample-every 50] [--threshold objects=0.5] [--json 结果.json]
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from collections import Counter
+
+METRICS = ["handles", "gdi", "threads", "objects", "rss_mb", "state"]
+
+# 各指标允许的增长量（后段中位数 - 前段中位数）；PER_CYCLE中的指标为每轮允许的增长量
+DEFAULT_THRESHOLDS = {
+    "handles": 50,
+    "gdi": 50,
+    "threads": 5,
+    "objects": 0.5,
+    "rss_mb": 64,
+    "state": 0,
+}
+PER_CYCLE = {"objects"}
+# 按轮数换算后的最小允许增长：采样之间gc跟踪的对象数会因缓存、未结束的任务等波动约两三百个
+OBJECTS_MIN_GROWTH = 200
+
+# 检测器与进程管理器中按窗口记录的状态
+DETECTOR_STATE = ["active_windows", "window_targets", "spawn_started", "spawn_failures", "process_usage",
+                  "focus_times", "trim_levels", "pending_savings"]
+MANAGER_STATE = ["active_processes", "monitor_tasks", "ready_events", "memory_usage", "animation_usage",
+                 "geometry_usage"]
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[soak-test] {timestamp} - {msg}")
+
+
+def read_handles():
+    """(句柄数, GDI对象数)"""
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        process = kernel32.GetCurrentProcess()
+        count = ctypes.c_ulong()
+        kernel32.GetProcessHandleCount(process, ctypes.byref(count))
+        return count.value, ctypes.windll.user32.GetGuiResources(process, 0)  # GR_GDIOBJECTS
+    try:
+        return len(os.listdir('/proc/self/fd')), 0
+    except OSError:
+        return 0, 0
+
+
+def read_rss():
+    """本进程的驻留内存（字节）"""
+    from window_detector import read_process_usage
+    usage = read_process_usage(os.getpid())
+    if usage is not None:
+        return usage[1]
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def make_image(path, size=(640, 360)):
+    """生成一张小的渐变背景图，让每轮的解码和渲染足够快"""
+    from PIL import Image
+    Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.radial_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+    )).save(path, "PNG")
+    return path
+
+
+def make_slides(directory):
+    """生成两张幻灯片图片，返回所在目录"""
+    os.makedirs(directory, exist_ok=True)
+    make_image(os.path.join(directory, "slide_1.png"), (320, 180))
+    make_image(os.path.join(directory, "slide_2.png"), (360, 200))
+    return directory
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0
+
+
+def judge(samples, thresholds, warmup):
+    """
+    按采样判断各指标是否持续增长
+
+    Returns:
+        {指标: {'baseline', 'final', 'growth', 'threshold', 'leak'}}，采样不足时为空
+    """
+    samples = samples[int(len(samples) * warmup):]
+    if len(samples) < 3:
+        return {}
+    third = max(1, len(samples) // 3)
+    # 两段中位数之间相隔的轮数
+    span = (median([sample['cycle'] for sample in samples[-third:]])
+            - median([sample['cycle'] for sample in samples[:third]]))
+    result = {}
+    for metric in METRICS:
+        baseline = median([sample[metric] for sample in samples[:third]])
+        final = median([sample[metric] for sample in samples[-third:]])
+        growth = final - baseline
+        threshold = thresholds[metric]
+        if metric in PER_CYCLE:
+            threshold = max(OBJECTS_MIN_GROWTH, round(threshold * span))
+        result[metric] = {
+            'baseline': baseline,
+            'final': final,
+            'growth': round(growth, 1),
+            'threshold': threshold,
+            'leak': growth > threshold,
+        }
+    return result
+
+
+class SoakRunner:
+    """驱动真实检测器，在模拟窗口上反复打开、调整大小、关闭"""
+
+    TARGET_EXE = "soak.exe"
+    SLIDES_EXE = "soak_slides.exe"
+
+    def __init__(self, args, image_path, slides_dir):
+        from window_backend import SimulatedWindowBackend
+        from trace_replay import ReplayStats
+        self.args = args
+        self.backend = SimulatedWindowBackend((0, 0, 1920, 1080))
+        self.stats = ReplayStats()
+        self.config = {
+            'enabled': True,
+            'adaptive_scan': True,
+            'scan_interval': 0.1,
+            'scan_interval_min': 0.02,
+            'scan_interval_max': 0.2,
+            'max_concurrent_spawns': max(1, args.windows),
+            'memory_budget_mb': 512,
+            'watch_images': True,
+            'resource_sample_interval': 2,
+            'targets': [{
+                'name': "Soak",
+                'keywords': [self.TARGET_EXE],
+                'image_path': image_path,
+                'alpha': 40,
+                'fit': "cover",
+            }, {
+                # 幻灯片恢复检查：1秒切换一次，隐藏0.5秒后挂起
+                'name': "SoakSlides",
+                'keywords': [self.SLIDES_EXE],
+                'image_path': slides_dir,
+                'alpha': 40,
+                'slide_interval': 1,
+                'park_delay': 0.5,
+            }],
+        }
+        self.next_hwnd = 0x10000
+        self.ready = set()
+        self.timeouts = 0
+        self.slideshow_resumed = None
+        self.samples = []
+        planned = args.cycles // max(1, args.sample_every) + 1
+        self.warmup_samples = int(planned * args.warmup)
+        self.type_counts = None  # 预热结束时各类型的对象数，用于定位增长的类型
+        self.detector = None
+        self.process_manager = None
+
+    def _on_report(self, hwnd, message):
+        if message.get('type') == 'ready':
+            self.ready.add(hwnd)
+
+    async def _wait_for(self, condition, what, timeout=None):
+        """等待条件成立，超时记一次并继续"""
+        deadline = time.perf_counter() + (timeout or self.args.timeout)
+        while not condition():
+            if time.perf_counter() >= deadline:
+                self.timeouts += 1
+                log(f"等待{what}超时")
+                return False
+            await asyncio.sleep(0.005)
+        return True
+
+    def _creator(self, hwnd):
+        process = self.process_manager.active_processes.get(hwnd)
+        return process.creator if process else None
+
+    async def cycle(self, index):
+        """一轮：打开若干窗口，逐个调整几次大小，再全部关闭"""
+        hwnds = []
+        for slot in range(self.args.windows):
+            # 与真实系统一样，关闭后的句柄不再复用
+            self.next_hwnd += 4
+            hwnd = self.next_hwnd
+            hwnds.append(hwnd)
+            x, y = 40 * slot, 30 * slot
+            self.backend.set_window(hwnd, exe=self.TARGET_EXE, title=f"浸泡测试 {index}-{slot}", cls="SoakWnd",
+                                    rect=(x, y, x + 320, y + 240), visible=True)
+        await self._wait_for(lambda: all(hwnd in self.ready for hwnd in hwnds), "背景就绪")
+
+        for step in range(1, self.args.resizes + 1):
+            sizes = {}
+            for slot, hwnd in enumerate(hwnds):
+                x, y = 40 * slot, 30 * slot
+                size = (320 + 24 * step, 240 + 16 * step)
+                sizes[hwnd] = size
+                self.backend.set_window(hwnd, rect=(x, y, x + size[0], y + size[1]))
+
+            def resized():
+                for hwnd, size in sizes.items():
+                    creator = self._creator(hwnd)
+                    if creator is not None and creator.current_size != size:
+                        return False
+                return True
+
+            await self._wait_for(resized, "背景跟随调整大小")
+
+        for hwnd in hwnds:
+            self.backend.remove_window(hwnd)
+        active = self.process_manager.active_processes
+        # 背景窗口在创建器清理时才销毁，等它们也消失后再采样
+        await self._wait_for(lambda: not any(hwnd in active for hwnd in hwnds)
+                             and not self.detector.active_windows and not self.backend.windows, "背景进程退出")
+        self.ready.difference_update(hwnds)
+
+    async def check_slideshow_resume(self):
+        """幻灯片窗口最小化到背景挂起，再恢复，检查挂起时释放了位图、恢复后按窗口大小重新渲染并继续切换"""
+        self.next_hwnd += 4
+        hwnd = self.next_hwnd
+        self.backend.set_window(hwnd, exe=self.SLIDES_EXE, title="浸泡测试 幻灯片", cls="SoakWnd",
+                                rect=(0, 0, 320, 240), visible=True)
+
+        def parked(expected):
+            creator = self._creator(hwnd)
+            return creator is not None and creator.parked == expected
+
+        def released():
+            creator = self._creator(hwnd)
+            return creator is not None and creator.current_size == (0, 0) and creator._bitmap_bytes() == 0
+
+        def restored():
+            creator = self._creator(hwnd)
+            return creator is not None and creator.current_size == (320, 240) and creator._bitmap_bytes() > 0
+
+        # 切换前后最多等待数个间隔（含提前准备下一张的时间）
+        timeout = max(self.args.timeout, 5)
+        ok = await self._wait_for(lambda: hwnd in self.ready, "幻灯片背景就绪")
+        swaps = self.stats.slides
+        ok = ok and await self._wait_for(lambda: self.stats.slides > swaps, "幻灯片第一次切换", timeout)
+        self.backend.set_window(hwnd, iconic=True)
+        ok = ok and await self._wait_for(lambda: parked(True), "幻灯片背景挂起")
+        ok = ok and await self._wait_for(released, "挂起后释放位图")
+        # 挂起期间错过一次切换，幻灯片线程进入等待重新可见的状态
+        await asyncio.sleep(2)
+        self.backend.set_window(hwnd, iconic=False)
+        ok = ok and await self._wait_for(lambda: parked(False), "幻灯片背景恢复")
+        ok = ok and await self._wait_for(restored, "恢复后重新渲染")
+        swaps = self.stats.slides
+        ok = ok and await self._wait_for(lambda: self.stats.slides > swaps, "恢复后幻灯片切换", timeout)
+        self.slideshow_resumed = ok
+        log(f"幻灯片挂起恢复检查: {'通过' if ok else '失败'}")
+
+        self.backend.remove_window(hwnd)
+        await self._wait_for(lambda: hwnd not in self.process_manager.active_processes
+                             and not self.detector.active_windows and not self.backend.windows, "幻灯片背景退出")
+        self.ready.discard(hwnd)
+
+    def _state_entries(self):
+        total = sum(len(getattr(self.detector, name, ())) for name in DETECTOR_STATE)
+        total += sum(len(getattr(self.process_manager, name, ())) for name in MANAGER_STATE)
+        # 模拟后端里只应剩下仍存在的窗口
+        return total + len(self.backend.windows) + len(self.backend.changed_at)
+
+    def sample(self, cycle):
+        """所有窗口关闭后采样一次"""
+        gc.collect()
+        handles, gdi = read_handles()
+        sample = {
+            'cycle': cycle,
+            'handles': handles,
+            'gdi': gdi,
+            'threads': threading.active_count(),
+            'objects': len(gc.get_objects()),
+            'rss_mb': round(read_rss() / 1048576, 1),
+            'state': self._state_entries(),
+        }
+        self.samples.append(sample)
+        log("第 {cycle} 轮: 句柄 {handles}, GDI {gdi}, 线程 {threads}, 对象 {objects}, "
+            "驻留 {rss_mb} MB, 状态条目 {state}".format(**sample))
+        if len(self.samples) == self.warmup_samples + 1:
+            self.type_counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+
+    def growing_types(self, limit=10):
+        """预热结束后数量增长最多的对象类型"""
+        if self.type_counts is None:
+            return []
+        gc.collect()
+        current = Counter(type(obj).__name__ for obj in gc.get_objects())
+        current.subtract(self.type_counts)
+        return [(name, count) for name, count in current.most_common(limit) if count > 0]
+
+    async def run(self):
+        from window_detector import WindowDetector
+        from trace_replay import SimulatedProcessManager, ReplayConfigManager
+
+        self.process_manager = SimulatedProcessManager(self.backend, self.stats)
+        self.process_manager.report_listeners.append(self._on_report)
+        self.detector = WindowDetector(ReplayConfigManager(self.config), backend=self.backend,
+                                       process_manager=self.process_manager)
+        detector_task = asyncio.create_task(self.detector.run_async())
+        start = time.perf_counter()
+        try:
+            await self._wait_for(lambda: self.detector.first_scan_done, "第一次扫描")
+            await self.check_slideshow_resume()
+            self.sample(0)
+            for index in range(1, self.args.cycles + 1):
+                await self.cycle(index)
+                if index % max(1, self.args.sample_every) == 0:
+                    self.sample(index)
+        finally:
+            self.detector.stop()
+            await detector_task
+        return time.perf_counter() - start
+
+
+def parse_threshold(text):
+    metric, _, value = text.partition("=")
+    if metric not in DEFAULT_THRESHOLDS or not value:
+        raise ValueError(f"阈值格式应为 指标=数值，指标为 {', '.join(METRICS)}")
+    return metric, float(value)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="在模拟窗口上反复打开/调整大小/关闭，检查句柄、线程、对象和内存泄漏")
+    parser.add_argument("--cycles", type=int, default=2000, help="循环次数")
+    parser.add_argument("--windows", type=int, default=4, help="每轮同时打开的窗口数")
+    parser.add_argument("--resizes", type=int, default=3, help="每个窗口每轮调整大小的次数")
+    parser.add_argument("--sample-every", type=int, default=50, help="每隔多少轮采样一次")
+    parser.add_argument("--warmup", type=float, default=0.2, help="判定时跳过的前段采样比例")
+    parser.add_argument("--timeout", type=float, default=10, help="每一步等待的超时（秒）")
+    parser.add_argument("--threshold", type=parse_threshold, action="append", default=[],
+                        help="覆盖某个指标的增长阈值，如 handles=100、objects=2（每轮），可重复")
+    parser.add_argument("--image", help="使用指定图片代替生成的小图")
+    parser.add_argument("--json", help="把采样和判定结果写入JSON文件")
+    args = parser.parse_args()
+
+    thresholds = dict(DEFAULT_THRESHOLDS, **dict(args.threshold))
+    image_path = args.image or make_image(os.path.join(tempfile.gettempdir(), "soak_test_background.png"))
+    log(f"开始浸泡测试: {args.cycles} 轮, 每轮 {args.windows} 个窗口, 调整大小 {args.resizes} 次")
+
+    slides_dir = make_slides(os.path.join(tempfile.gettempdir(), "soak_test_slides"))
+    runner = SoakRunner(args, os.path.abspath(image_path), slides_dir)
+    elapsed = asyncio.run(runner.run())
+    verdict = judge(runner.samples, thresholds, args.warmup)
+
+    print(f"\n{'指标':<10}{'基线':>12}{'最终':>12}{'增长':>12}{'阈值':>10}  结果")
+    for metric, item in verdict.items():
+        print(f"{metric:<10}{item['baseline']:>12}{item['final']:>12}{item['growth']:>12}"
+              f"{item['threshold']:>10}  {'泄漏' if item['leak'] else '正常'}")
+    leaks = [metric for metric, item in verdict.items() if item['leak']]
+    if not runner.slideshow_resumed:
+        leaks.append("slideshow")
+    if not verdict:
+        log("采样次数不足，无法判定（增加 --cycles 或减小 --sample-every）")
+    if 'objects' in leaks:
+        log(f"增长最多的对象类型: {runner.growing_types()}")
+    log(f"用时 {elapsed:.0f} 秒, 启动 {runner.stats.spawns} 次, 停止 {runner.stats.stops} 次, "
+        f"超时 {runner.timeouts} 次")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'cycles': args.cycles, 'windows': args.windows, 'elapsed': round(elapsed, 1),
+                       'timeouts': runner.timeouts, 'slideshow_resumed': runner.slideshow_resumed,
+                       'samples': runner.samples, 'verdict': verdict,
+                       'leaks': leaks}, f, ensure_ascii=False, indent=2)
+
+    if leaks or runner.timeouts:
+        log(f"失败: {', '.join(leaks) if leaks else '存在超时'}")
+        sys.exit(1)
+    log("通过")
+
+
+if __name__ == "__main__":
+    main()
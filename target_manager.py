@@ -12,13 +12,122 @@ import os
 import json
 import time
 import threading
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 
+# 背景布局模式（与image_pipeline.FIT_MODES保持一致）
+FIT_MODES = ('stretch', 'tile', 'center', 'cover')
+
+# 透明遮罩类型（与image_pipeline.MASK_MODES保持一致）
+MASK_MODES = ('none', 'edge_fade', 'vignette')
+
+# 背景进程资源超限时的处理方式：只限流 / 限流无效时重启
+LIMIT_ACTIONS = ('throttle', 'restart')
+
 def log(msg):
     """日志输出"""
     timestamp = time.strftime('%H:%M:%S')
     print(f"[target-manager] {timestamp} - {msg}")
 
+def atomic_write_json(path: str, data: Any):
+    """
+    原子写入JSON文件：先写同目录下的临时文件并刷到磁盘，再替换原文件
+    
+    检测器按修改时间重新加载配置，这样它不会读到写了一半的文件。
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            # 先整体序列化再一次写入，比json.dump逐段写文件快
+            f.write(json.dumps(data, indent=4, ensure_ascii=False))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConfigTransaction:
+    """
+    配置事务：在配置的工作副本上批量修改，提交时只验证、写入和加载一次
+    
+    由TargetManager.transaction()创建，不要直接实例化。
+    """
+    
+    def __init__(self, manager: 'TargetManager', config: Dict[str, Any]):
+        # 工作副本只复制顶层字典和目标列表；目标字典写时复制，未修改的目标不必重新验证
+        self.manager = manager
+        self.config = dict(config)
+        self.config['targets'] = list(config.get('targets', []))
+        # 目标名称 -> 在列表中的位置
+        self._positions = {target.get('name'): i for i, target in enumerate(self.config['targets'])}
+        # 已验证过的目标：id -> 目标字典（保留引用，避免id被新对象复用）
+        self.validated = {id(target): target for target in self.config['targets']}
+        self.changes = 0
+    
+    @property
+    def targets(self) -> List[Dict[str, Any]]:
+        return self.config['targets']
+    
+    def add_target(self, target_config: Dict[str, Any]) -> bool:
+        """添加目标，验证失败或同名目标已存在时返回False"""
+        if not self.manager._validate_target_config(target_config):
+            log("目标配置验证失败")
+            return False
+        if target_config['name'] in self._positions:
+            log(f"目标 '{target_config['name']}' 已存在")
+            return False
+        self._positions[target_config['name']] = len(self.targets)
+        self.targets.append(target_config)
+        self.validated[id(target_config)] = target_config
+        self.changes += 1
+        return True
+    
+    def remove_target(self, target_name: str) -> bool:
+        """按名称移除目标，未找到时返回False"""
+        index = self._positions.get(target_name)
+        if index is None:
+            log(f"未找到目标 '{target_name}'")
+            return False
+        del self.targets[index]
+        self._positions = {target.get('name'): i for i, target in enumerate(self.targets)}
+        self.changes += 1
+        return True
+    
+    def update_target(self, target_name: str, fields: Dict[str, Any]) -> bool:
+        """修改目标的部分字段，修改后的目标验证失败时返回False"""
+        index = self._positions.get(target_name)
+        if index is None:
+            log(f"未找到目标 '{target_name}'")
+            return False
+        new_name = fields.get('name', target_name)
+        if new_name != target_name and new_name in self._positions:
+            log(f"目标 '{new_name}' 已存在")
+            return False
+        
+        # 复制后修改，正在使用旧配置的检测器不受影响
+        updated = dict(self.targets[index])
+        updated.update(fields)
+        if not self.manager._validate_target_config(updated):
+            log("目标配置验证失败")
+            return False
+        self.targets[index] = updated
+        self.validated[id(updated)] = updated
+        del self._positions[target_name]
+        self._positions[new_name] = index
+        self.changes += 1
+        return True
+    
+    def set(self, key: str, value: Any):
+        """修改全局配置项"""
+        self.config[key] = value
+        self.changes += 1
+
+
 class TargetManager:
     """目标管理器"""
     
@@ -26,7 +135,9 @@ class TargetManager:
         self.config_path = config_path
         self.config: Optional[Dict[str, Any]] = None
         self.config_mtime = 0
-        self.lock = threading.Lock()
+        # 可重入锁：事务中的操作和提交时的加载会再次获取同一把锁
+        self.lock = threading.RLock()
+        self._transaction = None  # 进行中的事务（只允许持有锁的线程访问）
         
         # 创建默认配置
         if not os.path.exists(self.config_path):
@@ -63,8 +174,7 @@ class TargetManager:
         }
         
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=4, ensure_ascii=False)
+            atomic_write_json(self.config_path, default_config)
             log(f"默认配置文件已创建: {self.config_path}")
         except Exception as e:
             log(f"创建默认配置文件失败: {e}")
@@ -90,8 +200,8 @@ class TargetManager:
             log(f"加载配置文件失败: {e}")
             return False
     
-    def _validate_config(self, config: Dict[str, Any]) -> bool:
-        """验证配置格式"""
+    def _validate_config(self, config: Dict[str, Any], validated_targets: Optional[Dict[int, Any]] = None) -> bool:
+        """验证配置格式（validated_targets中的目标已验证过，直接保留）"""
         try:
             # 检查必需字段
             if not isinstance(config, dict):
@@ -101,12 +211,50 @@ class TargetManager:
             if 'enabled' not in config:
                 config['enabled'] = True
             
-            # 检查 scan_interval 字段
+            # 检查 scan_interval 字段（关闭自适应扫描时的固定间隔，支持小数）
             if 'scan_interval' not in config:
                 config['scan_interval'] = 3
-            elif not isinstance(config['scan_interval'], int) or config['scan_interval'] < 1:
+            elif not isinstance(config['scan_interval'], (int, float)) or config['scan_interval'] < 0.1:
                 config['scan_interval'] = 3
             
+            # 自适应扫描：有变化时按最小间隔扫描，稳定时逐渐放慢到最大间隔
+            config['adaptive_scan'] = bool(config.get('adaptive_scan', True))
+            config['scan_interval_min'] = max(0.1, min(60.0, float(config.get('scan_interval_min', 0.5))))
+            config['scan_interval_max'] = max(config['scan_interval_min'],
+                                              min(300.0, float(config.get('scan_interval_max', 15))))
+            
+            # 检查 max_concurrent_spawns 字段（同时处于启动阶段的背景进程数）
+            if 'max_concurrent_spawns' not in config:
+                config['max_concurrent_spawns'] = 4
+            else:
+                config['max_concurrent_spawns'] = max(1, min(32, int(config['max_concurrent_spawns'])))
+            
+            # 检查 memory_budget_mb 字段（所有背景位图内存总预算，0表示不限制）
+            if 'memory_budget_mb' not in config:
+                config['memory_budget_mb'] = 512
+            else:
+                config['memory_budget_mb'] = max(0, int(config['memory_budget_mb']))
+            
+            # 电源策略：使用电池时按倍数放大扫描间隔并降低渲染开销，锁屏或显示器关闭时挂起背景
+            config['power_saving'] = bool(config.get('power_saving', True))
+            config['battery_interval_scale'] = max(1.0, min(10.0, float(config.get('battery_interval_scale', 3))))
+            
+            # 监视图片文件：内容变化时通知背景进程重新加载
+            config['watch_images'] = bool(config.get('watch_images', True))
+            
+            # 背景进程资源占用的采样间隔（秒）
+            config['resource_sample_interval'] = max(2.0, min(300.0, float(config.get('resource_sample_interval', 10))))
+            
+            # 性能分析：开关由关变开时开启一次采样（时长秒、采样间隔毫秒）
+            config['profiling'] = bool(config.get('profiling', False))
+            config['profile_duration'] = max(5, min(600, int(config.get('profile_duration', 30))))
+            config['profile_interval_ms'] = max(1, min(100, int(config.get('profile_interval_ms', 10))))
+            
+            # 窗口事件轨迹：开启时记录到trace_file（默认logs/trace_时间.jsonl），供trace_replay.py回放
+            config['record_trace'] = bool(config.get('record_trace', False))
+            if not isinstance(config.get('trace_file', ""), str):
+                config['trace_file'] = ""
+            
             # 检查 targets 字段
             if 'targets' not in config:
                 config['targets'] = []
@@ -116,7 +264,8 @@ class TargetManager:
             # 验证每个目标配置
             valid_targets = []
             for target in config['targets']:
-                if self._validate_target_config(target):
+                if (validated_targets and validated_targets.get(id(target)) is target) \
+                        or self._validate_target_config(target):
                     valid_targets.append(target)
             
             config['targets'] = valid_targets
@@ -141,6 +290,12 @@ class TargetManager:
             # 可选字段设置默认值
             if 'image_path' not in target:
                 target['image_path'] = 'background.png'
+            elif isinstance(target['image_path'], list):
+                # 多个路径时作为幻灯片轮换
+                paths = [str(path) for path in target['image_path'] if str(path).strip()]
+                if not paths:
+                    return False
+                target['image_path'] = paths if len(paths) > 1 else paths[0]
             
             if 'alpha' not in target:
                 target['alpha'] = 40
@@ -162,6 +317,43 @@ class TargetManager:
             else:
                 target['saturation'] = max(0.1, min(5.0, float(target['saturation'])))
             
+            # 布局模式，未知值回退为拉伸
+            fit = str(target.get('fit', 'stretch')).lower()
+            target['fit'] = fit if fit in FIT_MODES else 'stretch'
+            
+            # 透明遮罩：类型及渐隐区域占比
+            mask = str(target.get('mask', 'none')).lower()
+            target['mask'] = mask if mask in MASK_MODES else 'none'
+            target['mask_size'] = max(0.01, min(0.5, float(target.get('mask_size', 0.1))))
+            
+            # 毛玻璃模糊：半径（源图像素，0为关闭）及工作副本的缩放比例
+            target['blur'] = max(0.0, min(200.0, float(target.get('blur', 0))))
+            target['blur_quality'] = max(0.05, min(1.0, float(target.get('blur_quality', 0.25))))
+            
+            # 动画背景：是否播放、帧率上限、非前台时是否暂停、帧缓存上限(MB)
+            target['animate'] = bool(target.get('animate', True))
+            target['max_fps'] = max(1.0, min(60.0, float(target.get('max_fps', 15))))
+            target['pause_when_inactive'] = bool(target.get('pause_when_inactive', True))
+            target['frame_cache_mb'] = max(0, min(1024, int(target.get('frame_cache_mb', 64))))
+            target['animation_source_mb'] = max(0, min(4096, int(target.get('animation_source_mb', 128))))
+            
+            # 目标不可见多少秒后释放背景位图
+            if 'park_delay' not in target:
+                target['park_delay'] = 10
+            else:
+                target['park_delay'] = max(0.0, min(3600.0, float(target['park_delay'])))
+            
+            # 幻灯片：切换间隔（秒）以及是否随机顺序
+            target['slide_interval'] = max(5.0, min(86400.0, float(target.get('slide_interval', 300))))
+            target['shuffle'] = bool(target.get('shuffle', False))
+            
+            # 资源上限：CPU为单核百分比、内存为进程常驻内存(MB)，0表示不限制；
+            # 持续超限时只限流；limit_action显式设为restart时限流无效再重启
+            target['cpu_limit'] = max(0.0, min(1600.0, float(target.get('cpu_limit', 25))))
+            target['memory_limit_mb'] = max(0, min(65536, int(target.get('memory_limit_mb', 1024))))
+            action = str(target.get('limit_action', 'throttle')).lower()
+            target['limit_action'] = action if action in LIMIT_ACTIONS else 'throttle'
+            
             return True
             
         except:
@@ -188,72 +380,79 @@ class TargetManager:
             return self._load_config()
         return False
     
-    def update_config(self, new_config: Dict[str, Any]) -> bool:
-        """更新配置文件"""
-        try:
-            # 验证新配置
-            if not self._validate_config(new_config):
-                log("新配置验证失败")
+    def update_config(self, new_config: Dict[str, Any], validated_targets: Optional[Dict[int, Any]] = None) -> bool:
+        """更新配置文件；validated_targets为已验证过的目标（id -> 目标），不再重复验证"""
+        with self.lock:
+            try:
+                # 验证新配置（验证会补全默认值）
+                if not self._validate_config(new_config, validated_targets):
+                    log("新配置验证失败")
+                    return False
+                
+                # 原子写入后直接采用已验证的配置，不必再读回文件
+                atomic_write_json(self.config_path, new_config)
+                self.config = new_config
+                self.config_mtime = os.path.getmtime(self.config_path)
+                log(f"配置更新成功，包含 {len(new_config.get('targets', []))} 个目标应用")
+                return True
+                
+            except Exception as e:
+                log(f"更新配置失败: {e}")
                 return False
+    
+    @contextmanager
+    def transaction(self):
+        """
+        批量修改配置的事务
+        
+        在配置的工作副本上修改，正常退出时验证一次、原子写入一次并采用新配置；
+        出现异常时丢弃全部修改。嵌套使用时共用最外层的事务，由最外层提交。
+        
+        用法:
+            with manager.transaction() as txn:
+                for target in targets:
+                    txn.add_target(target)
+        """
+        with self.lock:
+            if self._transaction is not None:
+                yield self._transaction
+                return
             
-            # 保存到文件
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(new_config, f, indent=4, ensure_ascii=False)
+            if not self.config:
+                raise RuntimeError("配置未加载，无法开始事务")
+            txn = ConfigTransaction(self, self.config)
+            self._transaction = txn
+            try:
+                yield txn
+            finally:
+                self._transaction = None
             
-            # 重新加载配置
-            if self._load_config():
-                log("配置更新成功")
-                return True
-            else:
-                log("配置更新后加载失败")
-                return False
-                
-        except Exception as e:
-            log(f"更新配置失败: {e}")
-            return False
+            if txn.changes and not self.update_config(txn.config, txn.validated):
+                raise RuntimeError("配置事务提交失败")
     
     def add_target(self, target_config: Dict[str, Any]) -> bool:
         """添加新的目标应用"""
         with self.lock:
             if not self.config:
                 return False
-            
-            # 验证目标配置
-            if not self._validate_target_config(target_config):
-                log("目标配置验证失败")
+            try:
+                with self.transaction() as txn:
+                    return txn.add_target(target_config)
+            except Exception as e:
+                log(f"添加目标失败: {e}")
                 return False
-            
-            # 检查是否已存在同名目标
-            for existing_target in self.config['targets']:
-                if existing_target['name'] == target_config['name']:
-                    log(f"目标 '{target_config['name']}' 已存在")
-                    return False
-            
-            # 添加新目标
-            self.config['targets'].append(target_config)
-            
-            # 保存到文件
-            return self.update_config(self.config)
     
     def remove_target(self, target_name: str) -> bool:
         """移除目标应用"""
         with self.lock:
             if not self.config:
                 return False
-            
-            # 查找并移除目标
-            original_count = len(self.config['targets'])
-            self.config['targets'] = [
-                target for target in self.config['targets'] 
-                if target['name'] != target_name
-            ]
-            
-            if len(self.config['targets']) == original_count:
-                log(f"未找到目标 '{target_name}'")
+            try:
+                with self.transaction() as txn:
+                    return txn.remove_target(target_name)
+            except Exception as e:
+                log(f"移除目标失败: {e}")
                 return False
-            
-            # 保存到文件
-            return self.update_config(self.config)
     
     def get_target_names(self) -> List[str]:
         """获取所有目标应用名称"""
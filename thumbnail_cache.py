@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图缓存 (sxxzh定制版)
+配置编辑器使用的磁盘缩略图缓存：以 路径|修改时间|文件大小 为键，图片被修改或替换后自动重新生成
+缩略图通过image_pipeline.load_proxy生成（JPEG用draft解码、其他格式用reduce缩小），大图也很快
+本模块不依赖Qt，生成工作由调用方放在后台线程中进行
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+from PIL import Image
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[thumbnail-cache] {timestamp} - {msg}")
+
+
+def default_cache_dir():
+    """缓存目录：Windows下在%LOCALAPPDATA%，其他系统在~/.cache"""
+    base_dir = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "sxxzh_bg", "thumbnails")
+
+
+class ThumbnailCache:
+    """
+    磁盘缩略图缓存（线程安全）
+
+    缓存文件名是 绝对路径|mtime|大小|缩略图尺寸 的哈希，无需索引文件；
+    源图变化后旧缓存不再被命中，由prune()按最近使用时间清理。
+    """
+
+    MAX_FILES = 2000
+
+    def __init__(self, cache_dir=None, size=128):
+        """
+        Args:
+            cache_dir: 缓存目录，默认default_cache_dir()
+            size: 缩略图长边像素数
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _cache_file(self, path):
+        """源图对应的缓存文件路径，源图不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".png")
+
+    def get(self, path):
+        """获取缩略图（RGBA），命中缓存时只读取小文件；失败返回None"""
+        cache_file = self._cache_file(path)
+        if cache_file is None:
+            return None
+
+        if os.path.exists(cache_file):
+            try:
+                with Image.open(cache_file) as cached:
+                    thumbnail = cached.convert("RGBA")
+                # 更新访问时间，prune()据此保留常用的缩略图
+                os.utime(cache_file)
+                with self._lock:
+                    self.hits += 1
+                return thumbnail
+            except Exception as e:
+                log(f"缓存文件损坏，重新生成: {cache_file} ({e})")
+
+        from image_pipeline import load_proxy
+        try:
+            thumbnail, _ = load_proxy(path, self.size)
+        except Exception as e:
+            log(f"生成缩略图失败: {path} ({e})")
+            return None
+        with self._lock:
+            self.misses += 1
+
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            # 先写临时文件再替换，多个线程/进程同时生成时不会读到半个文件
+            temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            thumbnail.save(temp_file, "PNG")
+            os.replace(temp_file, cache_file)
+        except Exception as e:
+            log(f"写入缩略图缓存失败: {e}")
+        return thumbnail
+
+    def prune(self, max_files=None):
+        """缓存文件超过max_files个时，删除最久未使用的部分"""
+        max_files = max_files or self.MAX_FILES
+        entries = []
+        try:
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    try:
+                        entries.append((os.stat(file_path).st_mtime, file_path))
+                    except OSError:
+                        pass
+        except Exception as e:
+            log(f"扫描缩略图缓存失败: {e}")
+            return 0
+
+        removed = 0
+        entries.sort()
+        for _, file_path in entries[:max(0, len(entries) - max_files)]:
+            try:
+                os.remove(file_path)
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            log(f"已清理 {removed} 个过期缩略图")
+        return removed
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口事件轨迹回放 (sxxzh定制版)
+把record_trace记录的轨迹通过模拟窗口后端重新喂给真实的窗口检测器和背景创建器代码，
+统计渲染工作量、进程启动次数和响应延迟，便于在Linux等环境离线复现性能问题
+
+用法:
+  python trace_replay.py logs/trace_xxx.jsonl [--speed 4] [--image 图片] [--json 结果.json] [--popup]
+  python trace_replay.py --synthetic 合成轨迹.jsonl [--windows 3] [--duration 30]
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+
+from PIL import Image
+
+from bg_creator import BackgroundCreator
+from window_backend import SimulatedWindowBackend
+from window_detector import ProcessManager, WindowDetector
+from window_trace import TraceRecorder, load_trace
+
+
+def log(msg):
+    """日志输出"""
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[trace-replay] {timestamp} - {msg}")
+
+
+def percentile(values, p):
+    """第p百分位数（最近秩法），没有数据时返回0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ReplayStats:
+    """回放过程中的计数与耗时（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spawns = 0
+        self.stops = 0
+        self.exits = 0
+        self.parks = 0
+        self.slides = 0
+        self.moves = 0
+        self.drags = 0
+        self.render_ms = []
+        self.blit_bytes = 0
+        self.latency_ms = {'spawn': [], 'resize': [], 'move': []}
+
+    def add_render(self, elapsed_ms):
+        with self.lock:
+            self.render_ms.append(elapsed_ms)
+
+    def add_blit(self, nbytes):
+        with self.lock:
+            self.blit_bytes += nbytes
+
+    def add_latency(self, kind, elapsed_ms):
+        with self.lock:
+            self.latency_ms[kind].append(elapsed_ms)
+
+    def summary(self):
+        """汇总为可序列化的字典"""
+        with self.lock:
+            result = {
+                'spawns': self.spawns,
+                'stops': self.stops,
+                'exits': self.exits,
+                'parks': self.parks,
+                'slides': self.slides,
+                'drags': self.drags,
+                'moves': self.moves,
+                'renders': len(self.render_ms),
+                'render_ms_total': round(sum(self.render_ms), 1),
+                'render_ms_p50': round(percentile(self.render_ms, 50), 2),
+                'render_ms_p95': round(percentile(self.render_ms, 95), 2),
+                'blit_mb': round(self.blit_bytes / 1048576, 1),
+            }
+            for kind, values in self.latency_ms.items():
+                result[f'{kind}_latency_ms_p50'] = round(percentile(values, 50), 1)
+                result[f'{kind}_latency_ms_p95'] = round(percentile(values, 95), 1)
+                result[f'{kind}_latency_ms_max'] = round(max(values), 1) if values else 0.0
+            return result
+
+
+class SimulatedCreator(BackgroundCreator):
+    """
+    在回放进程内运行的背景创建器
+
+    窗口查询走模拟后端，渲染管线照常执行，只有提交到分层窗口的一步改为计数。
+    popup为True时模拟弹出窗口模式（use_window_rect），背景需要跟随目标窗口移动。
+    """
+
+    def __init__(self, target_hwnd, config, backend, stats, on_report, popup=False):
+        super().__init__(target_hwnd, config, backend)
+        self.stats = stats
+        self.on_report = on_report
+        self.popup = popup
+        self._last_blit_size = None
+
+    def create_background_window(self):
+        self.use_window_rect = self.popup
+        pos, (w, h) = self._get_target_geometry()
+        if w <= 0 or h <= 0:
+            return False
+        self.bg_hwnd = self.backend.create_overlay()
+        self.current_size = (w, h)
+        self.current_pos = pos
+        if pos is not None:
+            self.backend.move_window(self.bg_hwnd, *pos)
+        self.renderer.expected_size = self._monitor_size()
+        return True
+
+    def update(self):
+        pos, (w, h) = self._get_target_geometry()
+        if w <= 0 or h <= 0:
+            return False
+        self.current_size = (w, h)
+        self.current_pos = pos
+        self._update_layered_window(w, h)
+        return True
+
+    def _update_layered_window(self, w, h):
+        start = time.perf_counter()
+        super()._update_layered_window(w, h)
+        self.stats.add_render((time.perf_counter() - start) * 1000)
+
+    def _blit(self, raw_data, w, h):
+        self.stats.add_blit(len(raw_data))
+        if (w, h) != self._last_blit_size and self._last_blit_size is not None:
+            # 尺寸变化后的首次提交：从模拟窗口变化到背景跟上的延迟
+            changed_at = self.backend.changed_at.get(self.target_hwnd)
+            if changed_at:
+                self.stats.add_latency('resize', (time.perf_counter() - changed_at) * 1000)
+        self._last_blit_size = (w, h)
+
+    def _move_layer(self, x, y):
+        super()._move_layer(x, y)
+        with self.stats.lock:
+            self.stats.moves += 1
+        changed_at = self.backend.changed_at.get(self.target_hwnd)
+        if changed_at:
+            self.stats.add_latency('move', (time.perf_counter() - changed_at) * 1000)
+
+    def _swap_slide(self):
+        swapped = super()._swap_slide()
+        if swapped:
+            with self.stats.lock:
+                self.stats.slides += 1
+        return swapped
+
+    def _pump_messages(self):
+        pass
+
+    def _report(self, kind, **data):
+        if kind == 'parked':
+            with self.stats.lock:
+                self.stats.parks += 1
+        elif kind == 'geometry':
+            with self.stats.lock:
+                self.stats.drags += 1
+        data['type'] = kind
+        self.on_report(data)
+
+    def command_thread(self):
+        # 控制命令由SimulatedProcessManager直接调用handle_command
+        pass
+
+    def _destroy_background_window(self):
+        self.backend.remove_window(self.bg_hwnd)
+
+
+class SimulatedProcess:
+    """模拟的子进程句柄：背景创建器运行在线程中"""
+
+    def __init__(self, creator):
+        self.creator = creator
+        self.pid = 0
+        self.returncode = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            self.returncode = 0 if self.creator.run() else 1
+        except Exception as e:
+            log(f"模拟背景创建器出错: {e}")
+            self.returncode = 1
+        finally:
+            self._done.set()
+
+    def terminate(self):
+        self.creator.should_exit = True
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.returncode
+
+
+class SimulatedProcessManager(ProcessManager):
+    """在进程内启动模拟背景创建器的进程管理器"""
+
+    def __init__(self, backend, stats, popup=False):
+        super().__init__()
+        self.backend = backend
+        self.stats = stats
+        self.popup = popup
+
+    async def start_bg_creator(self, target_hwnd, config):
+        if target_hwnd in self.active_processes:
+            return False
+        loop = asyncio.get_running_loop()
+
+        def on_report(message):
+            try:
+                loop.call_soon_threadsafe(self._handle_report, target_hwnd, message)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        creator = SimulatedCreator(target_hwnd, copy.deepcopy(config), self.backend, self.stats, on_report,
+                                   self.popup)
+        process = SimulatedProcess(creator)
+        self.active_processes[target_hwnd] = process
+        self.ready_events[target_hwnd] = asyncio.Event()
+        with self.stats.lock:
+            self.stats.spawns += 1
+        threading.Thread(target=process.run, daemon=True).start()
+        self.monitor_tasks[target_hwnd] = asyncio.create_task(self._monitor_process(target_hwnd, process))
+        return True
+
+    async def _monitor_process(self, target_hwnd, process):
+        return_code = await asyncio.get_running_loop().run_in_executor(None, process.wait)
+        if self.active_processes.get(target_hwnd) is process:
+            del self.active_processes[target_hwnd]
+            self.monitor_tasks.pop(target_hwnd, None)
+            self._release_ready(target_hwnd)
+            with self.stats.lock:
+                self.stats.exits += 1
+            self._notify_exit(target_hwnd, return_code)
+
+    async def stop_bg_creator(self, target_hwnd):
+        process = self.active_processes.pop(target_hwnd, None)
+        if process is None:
+            return False
+        monitor_task = self.monitor_tasks.pop(target_hwnd, None)
+        self._release_ready(target_hwnd)
+        process.terminate()
+        await asyncio.get_running_loop().run_in_executor(None, process.wait, self.STOP_TIMEOUT)
+        if monitor_task:
+            monitor_task.cancel()
+        with self.stats.lock:
+            self.stats.stops += 1
+        return True
+
+    def send_command(self, target_hwnd, message):
+        process = self.active_processes.get(target_hwnd)
+        if process is None:
+            return False
+        try:
+            process.creator.handle_command(message)
+            return True
+        except Exception as e:
+            log(f"模拟背景创建器处理命令失败: {e}")
+            return False
+
+    def _cleanup_temp_files(self):
+        pass
+
+
+class ReplayConfigManager:
+    """回放使用的固定配置"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def get_config(self):
+        return self.config
+
+
+def _placeholder_image():
+    """生成一张占位背景图（轨迹中的图片在本机不存在时使用）"""
+    path = os.path.join(tempfile.gettempdir(), "trace_replay_placeholder.png")
+    if not os.path.exists(path):
+        size = (1920, 1080)
+        Image.merge("RGB", (
+            Image.linear_gradient("L").resize(size),
+            Image.radial_gradient("L").resize(size),
+            Image.linear_gradient("L").rotate(90).resize(size),
+        )).save(path)
+    return path
+
+
+def prepare_config(config, speed, image=None):
+    """按回放速度缩放时间参数，并替换本机不存在的图片"""
+    config = copy.deepcopy(config)
+    config['scan_interval'] = float(config.get('scan_interval', 3)) / speed
+    config['scan_interval_min'] = float(config.get('scan_interval_min', 0.5)) / speed
+    config['scan_interval_max'] = float(config.get('scan_interval_max', 15)) / speed
+    config['profiling'] = False
+    config['record_trace'] = False
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def exists(path):
+        return os.path.exists(path if os.path.isabs(path) else os.path.join(base_dir, path))
+
+    for target in config.get('targets', []):
+        target['park_delay'] = float(target.get('park_delay', 10)) / speed
+        target['slide_interval'] = float(target.get('slide_interval', 300)) / speed
+        paths = target.get('image_path', 'background.png')
+        paths = paths if isinstance(paths, list) else [paths]
+        if image:
+            target['image_path'] = image
+        elif not all(exists(path) for path in paths):
+            target['image_path'] = _placeholder_image()
+    return config
+
+
+class TraceReplayer:
+    """按轨迹时间（可加速）修改模拟窗口状态，驱动真实的检测器代码"""
+
+    SETTLE_TIME = 1.0  # 事件放完后等待背景跟上的时间（秒）
+
+    def __init__(self, header, events, speed=1.0, image=None, popup=False):
+        self.header = header
+        self.events = events
+        self.speed = max(0.01, float(speed))
+        self.popup = popup
+        self.config = prepare_config(header.get('config', {}), self.speed, image)
+        self.backend = SimulatedWindowBackend(header.get('monitor') or (0, 0, 1920, 1080))
+        self.stats = ReplayStats()
+        self.appeared_at = {}  # hwnd -> 窗口出现的时间，用于统计启动延迟
+        self.snapshot_hwnds = set()
+        self.client_tracked = set()  # 已有背景创建器上报客户区位置的窗口
+
+    def _on_report(self, hwnd, message):
+        if message.get('type') == 'ready':
+            appeared = self.appeared_at.pop(hwnd, None)
+            if appeared:
+                self.stats.add_latency('spawn', (time.perf_counter() - appeared) * 1000)
+
+    def apply(self, event):
+        """把一个轨迹事件应用到模拟后端"""
+        kind = event.get('ev')
+        if kind == 'windows':
+            current = set()
+            for window in event.get('windows', []):
+                hwnd = window['hwnd']
+                current.add(hwnd)
+                fields = {'exe': window.get('exe', ""), 'title': window.get('title', ""),
+                          'cls': window.get('cls', "")}
+                if hwnd not in self.snapshot_hwnds:
+                    self.appeared_at[hwnd] = time.perf_counter()
+                    fields['visible'] = True
+                # 有背景创建器上报后以其客户区位置为准，避免与窗口矩形来回切换
+                if hwnd not in self.client_tracked:
+                    fields['rect'] = tuple(window.get('rect', (0, 0, 0, 0)))
+                self.backend.set_window(hwnd, **fields)
+            for hwnd in self.snapshot_hwnds - current:
+                self.backend.remove_window(hwnd)
+                self.client_tracked.discard(hwnd)
+                self.appeared_at.pop(hwnd, None)
+            self.snapshot_hwnds = current
+        elif kind == 'fg':
+            self.backend.set_foreground(event.get('hwnd', 0))
+        elif kind == 'win':
+            hwnd = event.get('hwnd')
+            if hwnd not in self.backend.windows:
+                return
+            state = event.get('state', 'shown')
+            self.client_tracked.add(hwnd)
+            self.backend.set_window(hwnd, rect=tuple(event.get('rect', (0, 0, 0, 0))),
+                                    visible=state != 'hidden', iconic=state == 'iconic',
+                                    occluded=state == 'occluded')
+
+    async def run(self):
+        """回放全部事件并返回统计结果"""
+        process_manager = SimulatedProcessManager(self.backend, self.stats, self.popup)
+        process_manager.report_listeners.append(self._on_report)
+        detector = WindowDetector(ReplayConfigManager(self.config), backend=self.backend,
+                                  process_manager=process_manager)
+        detector_task = asyncio.create_task(detector.run_async())
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for event in self.events:
+            delay = start + event.get('t', 0) / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # 新窗口由检测器自己的探测和扫描发现，启动延迟包含检测延迟
+            self.apply(event)
+
+        await asyncio.sleep(self.SETTLE_TIME)
+        wall = loop.time() - start
+        detector.stop()
+        await detector_task
+
+        result = {
+            'trace_seconds': round(self.events[-1].get('t', 0), 1) if self.events else 0,
+            'speed': self.speed,
+            'wall_seconds': round(wall, 1),
+            'events': len(self.events),
+            'mode': "popup" if self.popup else "child",
+        }
+        result.update(self.stats.summary())
+        scan = detector.scheduler.stats()
+        result['scans'] = scan['scans']
+        result['probes'] = scan['probes']
+        result['detection_latency_ms_p50'] = scan['detection_latency_ms_p50']
+        result['detection_latency_ms_p95'] = scan['detection_latency_ms_p95']
+        return result
+
+
+def make_synthetic_trace(path, windows=3, duration=30.0, seed=1):
+    """生成一段合成轨迹：窗口打开、调整大小、拖动移动、最小化/还原、被遮挡、关闭"""
+    rng = random.Random(seed)
+    targets = [{"name": "Synthetic", "keywords": ["synthetic.exe"], "image_path": "background.png",
+                "alpha": 40, "park_delay": 5}]
+    config = {"enabled": True, "scan_interval": 1, "max_concurrent_spawns": 4,
+              "memory_budget_mb": 512, "targets": targets}
+    recorder = TraceRecorder(path, config=config, monitor=(0, 0, 1920, 1080))
+
+    lines = []
+    open_windows = {}
+    next_hwnd = 0x10000
+
+    def snapshot(t):
+        lines.append({"t": t, "ev": "windows", "windows": [
+            {"hwnd": hwnd, "exe": "synthetic.exe", "title": f"合成窗口 {hwnd}", "cls": "SyntheticWnd",
+             "rect": list(rect)} for hwnd, rect in open_windows.items()]})
+
+    t = 0.0
+    while t < duration:
+        t = round(t + rng.uniform(0.2, 1.5), 3)
+        action = rng.random()
+        if not open_windows or (action < 0.15 and len(open_windows) < windows):
+            next_hwnd += 4
+            w, h = rng.randint(640, 1600), rng.randint(480, 1000)
+            x, y = rng.randint(0, 1920 - w), rng.randint(0, 1080 - h)
+            open_windows[next_hwnd] = (x, y, x + w, y + h)
+            snapshot(t)
+            lines.append({"t": t, "ev": "fg", "hwnd": next_hwnd})
+            continue
+        hwnd = rng.choice(list(open_windows))
+        x, y, right, bottom = open_windows[hwnd]
+        if action < 0.2:
+            del open_windows[hwnd]
+            snapshot(t)
+        elif action < 0.5:
+            # 拖动边框：连续多次小幅调整大小
+            for step in range(rng.randint(3, 12)):
+                right = max(x + 200, min(1920, right + rng.randint(-40, 40)))
+                bottom = max(y + 200, min(1080, bottom + rng.randint(-30, 30)))
+                open_windows[hwnd] = (x, y, right, bottom)
+                lines.append({"t": round(t + step * 0.03, 3), "ev": "win", "hwnd": hwnd,
+                              "rect": [x, y, right, bottom], "state": "shown"})
+            t = round(t + 0.4, 3)
+        elif action < 0.7:
+            # 拖动标题栏：连续多次移动，大小不变
+            w, h = right - x, bottom - y
+            for step in range(rng.randint(5, 20)):
+                x = max(0, min(1920 - w, x + rng.randint(-60, 60)))
+                y = max(0, min(1080 - h, y + rng.randint(-40, 40)))
+                open_windows[hwnd] = (x, y, x + w, y + h)
+                lines.append({"t": round(t + step * 0.03, 3), "ev": "win", "hwnd": hwnd,
+                              "rect": [x, y, x + w, y + h], "state": "shown"})
+            t = round(t + 0.8, 3)
+        else:
+            state = "iconic" if action < 0.85 else "occluded"
+            lines.append({"t": t, "ev": "win", "hwnd": hwnd, "rect": [x, y, right, bottom], "state": state})
+            t = round(t + rng.uniform(0.5, 8), 3)
+            lines.append({"t": t, "ev": "win", "hwnd": hwnd, "rect": [x, y, right, bottom], "state": "shown"})
+            lines.append({"t": t, "ev": "fg", "hwnd": hwnd})
+
+    for line in sorted(lines, key=lambda line: line["t"]):
+        recorder.append(line)
+    recorder.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放窗口事件轨迹并统计渲染、启动和延迟")
+    parser.add_argument("trace", help="轨迹文件（record_trace生成）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，1为实时")
+    parser.add_argument("--image", help="用此图片替换所有目标的背景图片")
+    parser.add_argument("--json", help="把统计结果写入JSON文件，便于比较不同版本")
+    parser.add_argument("--fixed-scan", action="store_true", help="关闭自适应扫描，按固定的scan_interval扫描")
+    parser.add_argument("--popup", action="store_true", help="按弹出窗口模式（use_window_rect）回放，背景需跟随窗口移动")
+    parser.add_argument("--synthetic", action="store_true", help="不回放，而是生成一段合成轨迹到trace路径")
+    parser.add_argument("--windows", type=int, default=3, help="合成轨迹中同时打开的最多窗口数")
+    parser.add_argument("--duration", type=float, default=30.0, help="合成轨迹时长（秒）")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        make_synthetic_trace(args.trace, args.windows, args.duration)
+        log(f"已生成合成轨迹: {args.trace}")
+        return
+
+    header, events = load_trace(args.trace)
+    if not events:
+        log("轨迹中没有事件")
+        sys.exit(1)
+    log(f"回放 {args.trace}: {len(events)} 个事件，倍速 {args.speed}")
+
+    if args.fixed_scan:
+        header.setdefault('config', {})['adaptive_scan'] = False
+    result = asyncio.run(TraceReplayer(header, events, args.speed, args.image, args.popup).run())
+
+    print("\n回放结果")
+    for key, value in result.items():
+        print(f"  {key:<26} {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口后端 (sxxzh定制版)
+窗口检测器和背景创建器通过它查询窗口的几何与可见性
+Win32WindowBackend对应真实桌面；SimulatedWindowBackend由回放脚本驱动，可在非Windows环境运行
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import time
+import ctypes
+import threading
+
+
+class Win32WindowBackend:
+    """真实的Windows窗口后端（win32模块在创建时才导入）"""
+
+    WS_EX_LAYERED = 0x80000
+    WS_EX_TRANSPARENT = 0x20
+    GA_ROOT = 2
+    DWMWA_CLOAKED = 14
+
+    def __init__(self):
+        import win32gui
+        import win32con
+        import win32api
+        import win32process
+        self.win32gui = win32gui
+        self.win32con = win32con
+        self.win32api = win32api
+        self.win32process = win32process
+
+    def enum_windows(self):
+        """按Z序返回全部顶层窗口句柄"""
+        hwnds = []
+        self.win32gui.EnumWindows(lambda hwnd, param: hwnds.append(hwnd), None)
+        return hwnds
+
+    def is_window(self, hwnd):
+        return bool(self.win32gui.IsWindow(hwnd))
+
+    def is_visible(self, hwnd):
+        return bool(self.win32gui.IsWindowVisible(hwnd))
+
+    def is_iconic(self, hwnd):
+        return bool(self.win32gui.IsIconic(hwnd))
+
+    def get_title(self, hwnd):
+        return self.win32gui.GetWindowText(hwnd) or ""
+
+    def get_class_name(self, hwnd):
+        return self.win32gui.GetClassName(hwnd) or ""
+
+    def get_exe_name(self, hwnd):
+        """窗口所属进程的可执行文件名（小写），获取失败返回空字符串"""
+        _, pid = self.win32process.GetWindowThreadProcessId(hwnd)
+        hproc = None
+        try:
+            hproc = self.win32api.OpenProcess(0x0400 | 0x0010, False, pid)
+            exe_name = self.win32process.GetModuleFileNameEx(hproc, 0)
+            return os.path.basename(exe_name).lower()
+        except:
+            return ""
+        finally:
+            # 每次扫描对每个窗口都会调用，句柄必须立即关闭，不能等垃圾回收
+            if hproc:
+                self.win32api.CloseHandle(hproc)
+
+    def get_client_rect(self, hwnd):
+        return tuple(self.win32gui.GetClientRect(hwnd))
+
+    def get_window_rect(self, hwnd):
+        return tuple(self.win32gui.GetWindowRect(hwnd))
+
+    def client_to_screen(self, hwnd, point):
+        return tuple(self.win32gui.ClientToScreen(hwnd, point))
+
+    def get_foreground_window(self):
+        return self.win32gui.GetForegroundWindow()
+
+    def get_root(self, hwnd):
+        """顶层祖先窗口"""
+        return self.win32gui.GetAncestor(hwnd, self.GA_ROOT) or hwnd
+
+    def get_monitor_rect(self, hwnd):
+        """窗口所在显示器的屏幕矩形"""
+        monitor = self.win32api.MonitorFromWindow(hwnd, self.win32con.MONITOR_DEFAULTTONEAREST)
+        return tuple(self.win32api.GetMonitorInfo(monitor)['Monitor'])
+
+    def show_window(self, hwnd, visible):
+        self.win32gui.ShowWindow(hwnd, self.win32con.SW_SHOW if visible else self.win32con.SW_HIDE)
+
+    def move_window(self, hwnd, x, y):
+        """只移动窗口位置，不改变大小和Z序，也不触发重绘"""
+        self.win32gui.SetWindowPos(
+            hwnd, 0, x, y, 0, 0,
+            self.win32con.SWP_NOSIZE | self.win32con.SWP_NOZORDER | self.win32con.SWP_NOACTIVATE
+        )
+
+    def is_cloaked(self, hwnd):
+        """窗口是否被DWM隐藏（其他虚拟桌面、挂起的UWP应用等）"""
+        cloaked = ctypes.c_int(0)
+        try:
+            ctypes.windll.dwmapi.DwmGetWindowAttribute(
+                hwnd, self.DWMWA_CLOAKED, ctypes.byref(cloaked), ctypes.sizeof(cloaked)
+            )
+        except Exception:
+            return False
+        return cloaked.value != 0
+
+    def occluding_rects(self, hwnd, exclude=()):
+        """按Z序从近到远依次给出位于hwnd顶层窗口之上、可能遮挡它的不透明窗口矩形"""
+        gw_prev = self.win32con.GW_HWNDPREV
+        current = self.win32gui.GetWindow(self.get_root(hwnd), gw_prev)
+        # 防御性上限，避免Z序异常时死循环
+        for _ in range(2000):
+            if not current:
+                break
+            try:
+                if (current not in exclude and self.win32gui.IsWindowVisible(current)
+                        and not self.win32gui.IsIconic(current)):
+                    ex_style = self.win32gui.GetWindowLong(current, self.win32con.GWL_EXSTYLE)
+                    # 分层/鼠标穿透窗口可能是半透明的，不算作遮挡
+                    if not ex_style & (self.WS_EX_LAYERED | self.WS_EX_TRANSPARENT):
+                        if not self.is_cloaked(current):
+                            yield tuple(self.win32gui.GetWindowRect(current))
+                current = self.win32gui.GetWindow(current, gw_prev)
+            except Exception:
+                break
+
+
+class SimulatedWindowBackend:
+    """
+    模拟窗口后端：窗口状态由回放脚本按事件修改，检测器和背景创建器照常查询
+
+    每个窗口记录其客户区的屏幕矩形、可见/最小化/被遮挡状态；
+    changed_at记录每个窗口最近一次几何或可见性变化的时间，用于统计响应延迟。
+    """
+
+    def __init__(self, monitor_rect=(0, 0, 1920, 1080)):
+        self.monitor_rect = tuple(monitor_rect)
+        self.windows = {}  # hwnd -> 窗口状态字典
+        self.foreground = 0
+        self.changed_at = {}  # hwnd -> 最近一次变化的perf_counter时间
+        self.lock = threading.Lock()
+        self._next_hwnd = 0x7F000000  # 模拟背景窗口使用的句柄
+
+    # ---- 回放脚本使用的修改接口 ----
+
+    def set_window(self, hwnd, **fields):
+        """创建或更新窗口；rect为客户区屏幕矩形(l, t, r, b)"""
+        with self.lock:
+            state = self.windows.setdefault(hwnd, {
+                'exe': "", 'title': "", 'cls': "", 'rect': (0, 0, 0, 0),
+                'visible': True, 'iconic': False, 'occluded': False, 'overlay': False
+            })
+            changed = any(state.get(key) != value for key, value in fields.items())
+            state.update(fields)
+            if changed:
+                self.changed_at[hwnd] = time.perf_counter()
+
+    def remove_window(self, hwnd):
+        with self.lock:
+            self.windows.pop(hwnd, None)
+            self.changed_at.pop(hwnd, None)
+        if self.foreground == hwnd:
+            self.foreground = 0
+
+    def set_foreground(self, hwnd):
+        self.foreground = hwnd
+
+    def create_overlay(self):
+        """为模拟的背景创建器分配一个背景窗口句柄"""
+        with self.lock:
+            self._next_hwnd += 1
+            hwnd = self._next_hwnd
+            self.windows[hwnd] = {'exe': "", 'title': "", 'cls': "WindowBgLayer", 'rect': (0, 0, 0, 0),
+                                  'visible': True, 'iconic': False, 'occluded': False, 'overlay': True}
+            return hwnd
+
+    # ---- 与Win32WindowBackend相同的查询接口 ----
+
+    def _get(self, hwnd):
+        state = self.windows.get(hwnd)
+        if state is None:
+            raise OSError(f"无效的窗口句柄: {hwnd}")
+        return state
+
+    def enum_windows(self):
+        with self.lock:
+            return [hwnd for hwnd, state in self.windows.items() if not state['overlay']]
+
+    def is_window(self, hwnd):
+        return hwnd in self.windows
+
+    def is_visible(self, hwnd):
+        state = self.windows.get(hwnd)
+        return bool(state and state['visible'])
+
+    def is_iconic(self, hwnd):
+        state = self.windows.get(hwnd)
+        return bool(state and state['iconic'])
+
+    def get_title(self, hwnd):
+        return self._get(hwnd)['title']
+
+    def get_class_name(self, hwnd):
+        return self._get(hwnd)['cls']
+
+    def get_exe_name(self, hwnd):
+        state = self.windows.get(hwnd)
+        return state['exe'] if state else ""
+
+    def get_client_rect(self, hwnd):
+        left, top, right, bottom = self._get(hwnd)['rect']
+        return (0, 0, right - left, bottom - top)
+
+    def get_window_rect(self, hwnd):
+        return tuple(self._get(hwnd)['rect'])
+
+    def client_to_screen(self, hwnd, point):
+        left, top = self._get(hwnd)['rect'][:2]
+        return (left + point[0], top + point[1])
+
+    def get_foreground_window(self):
+        return self.foreground
+
+    def get_root(self, hwnd):
+        return hwnd
+
+    def get_monitor_rect(self, hwnd):
+        return self.monitor_rect
+
+    def show_window(self, hwnd, visible):
+        state = self.windows.get(hwnd)
+        if state is not None:
+            state['visible'] = bool(visible)
+
+    def move_window(self, hwnd, x, y):
+        with self.lock:
+            state = self.windows.get(hwnd)
+            if state is not None:
+                left, top, right, bottom = state['rect']
+                state['rect'] = (x, y, x + right - left, y + bottom - top)
+
+    def is_cloaked(self, hwnd):
+        return False
+
+    def occluding_rects(self, hwnd, exclude=()):
+        """被标记为遮挡的窗口视为被一个同样大小的窗口完全覆盖"""
+        state = self.windows.get(hwnd)
+        if state and state['occluded']:
+            yield tuple(state['rect'])
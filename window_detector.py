@@ -7,179 +7,316 @@
 
 开发者: sxxzh
 版本: 1.1.2 - 加入UI 
+检测、子进程监控与定时扫描统一运行在一个asyncio事件循环中
 """
 
 import os
 import sys
-import win32gui
-import win32process
-import win32api
 import time
 import subprocess
 import json
-import threading
+import asyncio
+import locale
 from collections import defaultdict
+from sampling_profiler import SamplingProfiler
+from window_backend import Win32WindowBackend
+from image_store import ImageStore, image_adjust, resolve_image_path
+from scan_scheduler import ScanScheduler
+from window_trace import TraceRecorder, default_trace_path
 
 def log(msg):
     """日志输出"""
     timestamp = time.strftime('%H:%M:%S')
     print(f"[window-detector] {timestamp} - {msg}")
 
+# 背景创建器结构化上报的前缀（与bg_creator.REPORT_PREFIX保持一致）
+REPORT_PREFIX = "@@"
+
+# 只查询进程信息所需的最小权限
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+def read_process_usage(pid):
+    """读取进程累计CPU时间（秒）和常驻内存（字节），进程不存在或无法读取时返回None"""
+    if not pid or pid <= 0:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    try:
+        if psutil is not None:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        if sys.platform == 'win32':
+            import win32api
+            import win32process
+            handle = win32api.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+            try:
+                times = win32process.GetProcessTimes(handle)
+                memory = win32process.GetProcessMemoryInfo(handle)
+            finally:
+                win32api.CloseHandle(handle)
+            # 内核/用户时间以100纳秒为单位
+            return (times['KernelTime'] + times['UserTime']) / 1e7, memory['WorkingSetSize']
+    except Exception:
+        return None
+    return None
+
 class ProcessManager:
-    """进程管理器 - 管理第三层进程"""
+    """进程管理器 - 管理第三层进程（运行在检测器的asyncio事件循环中）"""
+    
+    # 停止子进程时等待其退出的最长时间（秒），超时后强制结束
+    STOP_TIMEOUT = 5
+    KILL_TIMEOUT = 2
     
     def __init__(self):
-        self.active_processes = {}  # hwnd -> process
-        self.lock = threading.Lock()
+        self.active_processes = {}  # hwnd -> asyncio.subprocess.Process
+        self.monitor_tasks = {}  # hwnd -> 监控任务
+        self.ready_events = {}  # hwnd -> 首个背景显示（或进程退出）时置位
+        self.memory_usage = {}  # hwnd -> 背景创建器上报的位图内存占用
+        self.animation_usage = {}  # hwnd -> 动画播放时上报的CPU/内存开销
+        self.geometry_usage = {}  # hwnd -> 最近一次拖动结束时上报的移动/重新渲染次数
+        self.report_listeners = []  # 收到结构化上报时的回调 listener(hwnd, message)
+        self.exit_listeners = []  # 进程自行退出（非主动停止）时的回调 listener(hwnd, return_code)
+        self.output_encoding = locale.getpreferredencoding(False)
+    
+    def _build_command(self, target_hwnd, config_file):
+        """构建背景创建器的命令行"""
+        if getattr(sys, 'frozen', False):
+            # 打包后环境：直接运行可执行文件，bg_creator作为模块调用
+            return [
+                sys.executable,  # 主程序可执行文件
+                '--bg-creator',  # 特殊参数标识背景创建器模式
+                str(target_hwnd),
+                config_file
+            ]
+        # 开发环境：使用Python运行bg_creator.py
+        return [
+            sys.executable, 
+            os.path.join(os.path.dirname(__file__), 'bg_creator.py'),
+            str(target_hwnd),
+            config_file
+        ]
     
-    def start_bg_creator(self, target_hwnd, config):
+    async def start_bg_creator(self, target_hwnd, config):
         """启动第三层背景创建器进程"""
-        with self.lock:
-            if target_hwnd in self.active_processes:
-                log(f"目标窗口 {target_hwnd} 的背景进程已存在")
-                return False
+        if target_hwnd in self.active_processes:
+            log(f"目标窗口 {target_hwnd} 的背景进程已存在")
+            return False
+        
+        config_file = None
+        try:
+            # 使用临时文件传递配置，避免JSON转义问题
+            import tempfile
+            import uuid
             
+            # 创建临时配置文件
+            config_file = os.path.join(tempfile.gettempdir(), f"window_bg_config_{uuid.uuid4().hex}.json")
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+            
+            cmd = self._build_command(target_hwnd, config_file)
+            
+            # 启动进程 - 参数列表直接传递，避免PowerShell转义问题
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,  # 控制命令通道
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+            )
+            
+            self.active_processes[target_hwnd] = process
+            self.ready_events[target_hwnd] = asyncio.Event()
+            log(f"启动背景创建器进程，目标窗口: {target_hwnd}, PID: {process.pid}")
+            
+            # 在事件循环中监控进程，不再为每个进程创建线程
+            self.monitor_tasks[target_hwnd] = asyncio.create_task(
+                self._monitor_process(target_hwnd, process)
+            )
+            
+            return True
+            
+        except Exception as e:
+            log(f"启动背景创建器失败: {e}")
+            # 清理临时文件
             try:
-                # 构建命令行参数 - 使用临时文件传递配置，避免JSON转义问题
-                import tempfile
-                import uuid
-                
-                # 创建临时配置文件
-                config_file = os.path.join(tempfile.gettempdir(), f"window_bg_config_{uuid.uuid4().hex}.json")
-                with open(config_file, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, ensure_ascii=False, indent=2)
-                
-                # 构建命令行参数 - 改进版本，支持打包环境
-                if getattr(sys, 'frozen', False):
-                    # 打包后环境：直接运行可执行文件，bg_creator作为模块调用
-                    cmd = [
-                        sys.executable,  # 主程序可执行文件
-                        '--bg-creator',  # 特殊参数标识背景创建器模式
-                        str(target_hwnd),
-                        config_file
-                    ]
-                else:
-                    # 开发环境：使用Python运行bg_creator.py
-                    cmd = [
-                        sys.executable, 
-                        os.path.join(os.path.dirname(__file__), 'bg_creator.py'),
-                        str(target_hwnd),
-                        config_file
-                    ]
-                
-                # 启动进程 - 使用shell=False避免PowerShell转义问题
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    shell=False,
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
-                )
-                
-                self.active_processes[target_hwnd] = process
-                log(f"启动背景创建器进程，目标窗口: {target_hwnd}, PID: {process.pid}")
-                
-                # 启动监控线程
-                monitor_thread = threading.Thread(
-                    target=self._monitor_process,
-                    args=(target_hwnd, process),
-                    daemon=True
-                )
-                monitor_thread.start()
-                
-                return True
-                
-            except Exception as e:
-                log(f"启动背景创建器失败: {e}")
-                # 清理临时文件
+                if config_file and os.path.exists(config_file):
+                    os.remove(config_file)
+            except:
+                pass
+            return False
+    
+    async def _pump_output(self, target_hwnd, stream, kind):
+        """逐行转发子进程输出到日志，结构化上报交给_handle_report处理"""
+        async for raw_line in stream:
+            line = raw_line.decode(self.output_encoding, errors='replace').rstrip()
+            if line.startswith(REPORT_PREFIX):
                 try:
-                    if os.path.exists(config_file):
-                        os.remove(config_file)
-                except:
+                    self._handle_report(target_hwnd, json.loads(line[len(REPORT_PREFIX):]))
+                    continue
+                except ValueError:
                     pass
-                return False
+            if line:
+                log(f"背景创建器进程{kind} (窗口 {target_hwnd}): {line}")
+    
+    def _handle_report(self, target_hwnd, message):
+        """处理背景创建器的结构化上报"""
+        kind = message.get('type')
+        if kind == 'ready':
+            event = self.ready_events.get(target_hwnd)
+            if event:
+                event.set()
+        elif kind == 'parked':
+            log(f"窗口 {target_hwnd} 的背景已挂起（{message.get('reason', '')}）: "
+                f"释放 {message.get('freed_bytes', 0) / 1048576:.1f} MB, "
+                f"驻留内存 {message.get('resident_bytes', 0) / 1048576:.1f} MB")
+        elif kind == 'resumed':
+            log(f"窗口 {target_hwnd} 的背景已恢复，耗时 {message.get('elapsed_ms', 0)} ms, "
+                f"驻留内存 {message.get('resident_bytes', 0) / 1048576:.1f} MB")
+        elif kind == 'memory':
+            if target_hwnd in self.active_processes:
+                self.memory_usage[target_hwnd] = message
+        elif kind == 'animation':
+            if target_hwnd in self.active_processes:
+                self.animation_usage[target_hwnd] = message
+        elif kind == 'geometry':
+            if target_hwnd in self.active_processes:
+                self.geometry_usage[target_hwnd] = message
+        
+        for listener in list(self.report_listeners):
+            try:
+                listener(target_hwnd, message)
+            except Exception as e:
+                log(f"处理上报回调时出错: {e}")
+    
+    def send_command(self, target_hwnd, message):
+        """向背景创建器发送控制命令（写入其标准输入的一行JSON）"""
+        process = self.active_processes.get(target_hwnd)
+        if process is None or process.stdin is None or process.returncode is not None:
+            return False
+        try:
+            process.stdin.write((json.dumps(message) + "\n").encode('utf-8'))
+            return True
+        except (BrokenPipeError, ConnectionResetError, RuntimeError) as e:
+            log(f"向窗口 {target_hwnd} 的背景进程发送命令失败: {e}")
+            return False
     
-    def _monitor_process(self, target_hwnd, process):
+    async def wait_ready(self, target_hwnd, timeout):
+        """等待背景创建器显示首个背景，返回是否在超时前就绪"""
+        event = self.ready_events.get(target_hwnd)
+        if event is None:
+            return False
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return target_hwnd in self.active_processes
+    
+    async def _monitor_process(self, target_hwnd, process):
         """监控进程状态"""
         try:
-            # 读取进程输出
-            stdout, stderr = process.communicate(timeout=5)
-            
-            if stdout:
-                log(f"背景创建器进程输出 (窗口 {target_hwnd}): {stdout.strip()}")
-            if stderr:
-                log(f"背景创建器进程错误 (窗口 {target_hwnd}): {stderr.strip()}")
-            
+            await asyncio.gather(
+                self._pump_output(target_hwnd, process.stdout, "输出"),
+                self._pump_output(target_hwnd, process.stderr, "错误")
+            )
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"监控进程时出错: {e}")
             return_code = process.returncode
-            
-            with self.lock:
-                if target_hwnd in self.active_processes:
-                    del self.active_processes[target_hwnd]
-                    log(f"背景创建器进程已退出，目标窗口: {target_hwnd}, 返回码: {return_code}")
-                    
-        except subprocess.TimeoutExpired:
-            # 如果进程超时，强制终止并读取输出
+        
+        # 主动停止的进程已从表中移除，这里只处理自行退出的进程
+        if self.active_processes.get(target_hwnd) is process:
+            del self.active_processes[target_hwnd]
+            self.monitor_tasks.pop(target_hwnd, None)
+            self._release_ready(target_hwnd)
+            log(f"背景创建器进程已退出，目标窗口: {target_hwnd}, 返回码: {return_code}")
+            self._notify_exit(target_hwnd, return_code)
+    
+    def sample_usage(self):
+        """采样各背景进程的资源占用 -> {hwnd: (pid, 累计CPU秒, 常驻内存字节)}"""
+        samples = {}
+        for hwnd, process in list(self.active_processes.items()):
+            usage = read_process_usage(process.pid)
+            if usage is not None:
+                samples[hwnd] = (process.pid,) + usage
+        return samples
+    
+    def _notify_exit(self, target_hwnd, return_code):
+        """通知进程自行退出"""
+        for listener in list(self.exit_listeners):
             try:
-                stdout, stderr = process.communicate()
-                if stdout:
-                    log(f"背景创建器进程超时输出 (窗口 {target_hwnd}): {stdout.strip()}")
-                if stderr:
-                    log(f"背景创建器进程超时错误 (窗口 {target_hwnd}): {stderr.strip()}")
-                
-                process.kill()
-                return_code = process.returncode
-                
-                with self.lock:
-                    if target_hwnd in self.active_processes:
-                        del self.active_processes[target_hwnd]
-                        log(f"背景创建器进程超时终止，目标窗口: {target_hwnd}, 返回码: {return_code}")
-                        
+                listener(target_hwnd, return_code)
             except Exception as e:
-                log(f"处理超时进程时出错: {e}")
-                
-        except Exception as e:
-            log(f"监控进程时出错: {e}")
+                log(f"处理进程退出回调时出错: {e}")
     
-    def stop_bg_creator(self, target_hwnd):
+    async def stop_bg_creator(self, target_hwnd):
         """停止指定窗口的背景创建器进程"""
-        with self.lock:
-            if target_hwnd not in self.active_processes:
-                return False
-            
-            process = self.active_processes[target_hwnd]
-            
+        process = self.active_processes.pop(target_hwnd, None)
+        if process is None:
+            return False
+        monitor_task = self.monitor_tasks.pop(target_hwnd, None)
+        self._release_ready(target_hwnd)
+        
+        try:
             try:
                 # 终止进程
-                process.terminate()
-                process.wait(timeout=5)
-                del self.active_processes[target_hwnd]
+                if process.returncode is None:
+                    process.terminate()
+                await asyncio.wait_for(process.wait(), self.STOP_TIMEOUT)
                 log(f"已停止目标窗口 {target_hwnd} 的背景进程")
-                return True
                 
-            except subprocess.TimeoutExpired:
+            except asyncio.TimeoutError:
                 try:
                     process.kill()
-                    process.wait()
+                    await asyncio.wait_for(process.wait(), self.KILL_TIMEOUT)
                 except:
                     pass
-                del self.active_processes[target_hwnd]
                 log(f"强制终止目标窗口 {target_hwnd} 的背景进程")
-                return True
-                
-            except Exception as e:
-                log(f"停止背景创建器失败: {e}")
-                return False
+            
+            except ProcessLookupError:
+                # 进程已经自行退出
+                pass
+            
+            return True
+            
+        except Exception as e:
+            log(f"停止背景创建器失败: {e}")
+            return False
+        
+        finally:
+            # 给监控任务一点时间读完剩余输出，超时则直接取消
+            if monitor_task:
+                try:
+                    await asyncio.wait_for(monitor_task, self.KILL_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    pass
+                except Exception:
+                    pass
     
-    def stop_all(self):
+    def _release_ready(self, target_hwnd):
+        """进程结束时唤醒仍在等待其就绪的启动任务，并清除其上报状态"""
+        self.memory_usage.pop(target_hwnd, None)
+        self.animation_usage.pop(target_hwnd, None)
+        self.geometry_usage.pop(target_hwnd, None)
+        event = self.ready_events.pop(target_hwnd, None)
+        if event:
+            event.set()
+    
+    async def stop_all(self):
         """停止所有背景创建器进程并清理临时文件"""
-        # 先获取所有需要停止的窗口句柄，避免在循环中持有锁
-        with self.lock:
-            hwnds = list(self.active_processes.keys())
+        hwnds = list(self.active_processes.keys())
         
-        # 逐个停止进程，避免死锁
-        for hwnd in hwnds:
-            self.stop_bg_creator(hwnd)
+        # 并发停止，总耗时受单个进程的超时上限约束
+        if hwnds:
+            await asyncio.gather(
+                *(self.stop_bg_creator(hwnd) for hwnd in hwnds),
+                return_exceptions=True
+            )
         
         # 清理临时配置文件
         self._cleanup_temp_files()
@@ -208,32 +345,96 @@ class ProcessManager:
 class WindowDetector:
     """窗口检测器"""
     
-    def __init__(self, config_manager):
+    # 等待单个背景创建器显示首个背景的最长时间（秒），超时后释放启动名额
+    SPAWN_READY_TIMEOUT = 5
+    
+    # 启动失败后的重试退避：间隔从BASE秒起逐次翻倍，不超过MAX秒
+    SPAWN_BACKOFF_BASE = 2
+    SPAWN_BACKOFF_MAX = 300
+    # 背景进程运行超过该时间（秒）后才算启动成功，清除失败记录
+    SPAWN_STABLE_TIME = 30
+    # 熔断：同一目标连续失败达到阈值后，暂停启动该目标的所有窗口一段时间（秒）
+    BREAKER_THRESHOLD = 5
+    BREAKER_COOLDOWN = 1800
+    # 资源超限：连续这么多次采样超限才处理，避免调整大小等短暂峰值触发限流
+    LIMIT_STRIKES = 3
+    # 锁屏或显示器关闭时不扫描，只按该间隔（秒）执行钩子；状态变化的通知会提前唤醒
+    SUSPENDED_TICK = 5
+    
+    def __init__(self, config_manager, backend=None, process_manager=None):
+        """
+        Args:
+            config_manager: 提供get_config()的配置管理器
+            backend: 窗口后端，默认为真实的Win32后端（回放测试时传入模拟后端）
+            process_manager: 背景创建器进程管理器，默认启动真实子进程
+        """
         self.config_manager = config_manager
-        self.process_manager = ProcessManager()
+        self.backend = backend or Win32WindowBackend()
+        self.process_manager = process_manager or ProcessManager()
         self.active_windows = set()  # 当前活跃的目标窗口
         self.should_exit = False
-        self.lock = threading.Lock()
+        self.first_scan_done = False  # 第一次扫描完成后为True，供启动就绪检查使用
+        self.lock = asyncio.Lock()
+        self.loop = None
+        self._wakeup = None  # 用于提前唤醒扫描定时器（停止、配置变化等）
+        # 自适应扫描：两次扫描之间廉价探测前台窗口和可见窗口数，有变化时立即扫描
+        self.scheduler = ScanScheduler()
+        self._probe_state = None
+        # 电源模式（由BackgroundSystem的电源策略设置）：normal / saver / suspended
+        self.power_mode = "normal"
+        self.tick_hooks = []  # 每次扫描和探测前调用的钩子，与扫描共用同一个定时器
+        self.spawn_tasks = set()  # 进行中的批量启动任务
+        self._spawn_semaphore = None
+        self._spawn_limit = 0
+        
+        # 全局位图内存预算：按最近获得焦点的时间决定谁先降级
+        self.foreground_hwnd = 0
+        self.focus_times = {}  # hwnd -> 最近一次成为前台窗口的时间
+        self.trim_levels = {}  # hwnd -> 已下发的降级级别
+        self.pending_savings = {}  # hwnd -> 已下发但尚未确认的降级预计释放的字节数
+        self._budget_check_pending = False
+        self._last_logged_memory = 0
+        self.process_manager.report_listeners.append(self._on_creator_report)
+        
+        # 启动失败保护：失败的窗口按指数退避重试，持续失败的目标被熔断
+        self.window_targets = {}  # hwnd -> 目标配置（活跃或正在退避的窗口）
+        self.spawn_started = {}  # hwnd -> 背景进程启动时间
+        self.spawn_failures = {}  # hwnd -> {'count', 'retry_at', 'reason'}
+        self.target_failures = {}  # 目标名称 -> {'count', 'open_until', 'config'}
+        self.process_manager.exit_listeners.append(self._on_creator_exit)
+        
+        # 资源占用：按resource_sample_interval采样各背景进程的CPU和内存，超限时限流或重启
+        self.process_usage = {}  # hwnd -> {'pid', 'cpu_time', 'cpu_percent', 'rss_bytes', 'strikes', 'throttled'}
+        self.limit_restarts = defaultdict(int)  # 目标名称 -> 因资源超限重启的次数
+        self._last_resource_sample = 0
+        
+        # 图片文件监视：内容变化时只解码一次，通知使用该图片的背景进程重新加载
+        self.image_store = ImageStore()
+        
+        # 采样性能分析：本进程和各背景创建器在同一时间窗口内采样
+        self.profiler = None
+        self.profile_until = 0
+        self.profile_interval_ms = 10
+        self._profiling_switch = False  # 配置中profiling开关的上一次取值
+        
+        # 窗口事件轨迹：记录检测器与背景创建器看到的窗口变化，供离线回放
+        self.trace = None
+        self._last_traced_windows = None
+        self._last_traced_foreground = None
     
     def find_target_windows(self, targets):
         """查找所有匹配的目标窗口"""
         matched_windows = []
+        backend = self.backend
         
-        def enum_windows(hwnd, param):
-            if not win32gui.IsWindowVisible(hwnd):
+        def enum_windows(hwnd):
+            if not backend.is_visible(hwnd):
                 return
             
             # 获取窗口信息
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            try:
-                hproc = win32api.OpenProcess(0x0400 | 0x0010, False, pid)
-                exe_name = win32process.GetModuleFileNameEx(hproc, 0)
-                exe_name = os.path.basename(exe_name).lower()
-            except:
-                exe_name = ""
-            
-            title = win32gui.GetWindowText(hwnd) or ""
-            cls_name = win32gui.GetClassName(hwnd) or ""
+            exe_name = backend.get_exe_name(hwnd)
+            title = backend.get_title(hwnd)
+            cls_name = backend.get_class_name(hwnd)
             
             # 检查每个目标配置
             for target in targets:
@@ -251,20 +452,25 @@ class WindowDetector:
                             matched_windows.append((hwnd, target))
                             break
         
-        win32gui.EnumWindows(enum_windows, None)
+        for hwnd in backend.enum_windows():
+            try:
+                enum_windows(hwnd)
+            except Exception:
+                # 枚举过程中窗口可能已关闭
+                pass
         return matched_windows
     
     def _is_window_suitable(self, hwnd):
         """检查窗口是否适合添加背景"""
         try:
             # 获取客户区大小
-            left, top, right, bottom = win32gui.GetClientRect(hwnd)
+            left, top, right, bottom = self.backend.get_client_rect(hwnd)
             width = right - left
             height = bottom - top
             
             # 如果客户区太小，检查窗口矩形
             if width <= 0 or height <= 0:
-                rect = win32gui.GetWindowRect(hwnd)
+                rect = self.backend.get_window_rect(hwnd)
                 width = rect[2] - rect[0]
                 height = rect[3] - rect[1]
             
@@ -277,92 +483,776 @@ class WindowDetector:
         except:
             return False
     
-    def scan_windows(self):
-        """扫描窗口并管理进程"""
+    async def scan_windows(self):
+        """扫描窗口并管理进程，返回 (新增的目标窗口数, 移除的目标窗口数)"""
         config = self.config_manager.get_config()
         if not config or not config.get('enabled', True):
-            return
+            return 0, 0
         
         targets = config.get('targets', [])
         if not targets:
-            return
+            return 0, 0
         
         try:
-            # 查找匹配的窗口（使用超时保护）
+            # 查找匹配的窗口
             current_windows = self.find_target_windows(targets)
             current_hwnds = {hwnd for hwnd, _ in current_windows}
+            if self.trace:
+                self._trace_windows(current_windows)
             
-            with self.lock:
-                # 检查需要启动的新窗口
+            # 锁内只计算增删差异，启动与停止进程都放到锁外进行
+            async with self.lock:
+                now = time.time()
+                self._expire_spawn_failures(current_hwnds, now)
+                windows_to_add = []
                 for hwnd, target_config in current_windows:
                     if hwnd not in self.active_windows:
+                        # 启动失败后仍在退避或目标已熔断的窗口本轮跳过
+                        if not self._spawn_allowed(hwnd, target_config, now):
+                            continue
                         log(f"发现新目标窗口: {hwnd} - {target_config.get('name', 'Unknown')}")
-                        
-                        # 启动背景创建器进程
-                        if self.process_manager.start_bg_creator(hwnd, target_config):
-                            self.active_windows.add(hwnd)
+                        windows_to_add.append((hwnd, target_config))
                 
                 # 检查需要停止的窗口
                 windows_to_remove = []
                 for hwnd in self.active_windows:
                     if hwnd not in current_hwnds:
                         # 检查窗口是否还存在
-                        if not win32gui.IsWindow(hwnd):
+                        if not self.backend.is_window(hwnd):
                             log(f"目标窗口 {hwnd} 已关闭")
                             windows_to_remove.append(hwnd)
                         else:
                             # 窗口存在但不再匹配目标，检查是否仍然可见
-                            if not win32gui.IsWindowVisible(hwnd):
+                            if not self.backend.is_visible(hwnd):
                                 log(f"目标窗口 {hwnd} 不再可见")
                                 windows_to_remove.append(hwnd)
                 
-                # 移除已关闭的窗口并停止对应进程
+                # 先登记新窗口，避免下一次扫描重复启动
+                self.active_windows.update(hwnd for hwnd, _ in windows_to_add)
+                self.active_windows.difference_update(windows_to_remove)
+                
+                for hwnd, target_config in windows_to_add:
+                    self.focus_times[hwnd] = now
+                    self.window_targets[hwnd] = target_config
                 for hwnd in windows_to_remove:
-                    self.process_manager.stop_bg_creator(hwnd)
-                    self.active_windows.remove(hwnd)
+                    self.window_targets.pop(hwnd, None)
+                    self.spawn_started.pop(hwnd, None)
+                    self.focus_times.pop(hwnd, None)
+                    self.trim_levels.pop(hwnd, None)
+                    self.pending_savings.pop(hwnd, None)
+                self._update_focus()
+            
+            # 启动在后台进行，扫描循环不等待新背景全部就绪
+            if windows_to_add:
+                task = asyncio.create_task(
+                    self._start_creators(windows_to_add, config.get('max_concurrent_spawns', 4))
+                )
+                self.spawn_tasks.add(task)
+                task.add_done_callback(self.spawn_tasks.discard)
+            
+            if windows_to_remove:
+                await asyncio.gather(
+                    *(self.process_manager.stop_bg_creator(hwnd) for hwnd in windows_to_remove)
+                )
+            
+            self._enforce_memory_budget()
+            self._sample_resources(config)
+            if config.get('watch_images', True):
+                await self._check_images(targets)
+            return len(windows_to_add), len(windows_to_remove)
                     
         except Exception as e:
             log(f"扫描窗口时出错: {e}")
             # 出错时继续运行，避免整个系统崩溃
+            return 0, 0
     
-    def run(self):
-        """运行窗口检测器"""
+    def _spawn_priority(self, hwnd, foreground_hwnd):
+        """启动优先级：前台窗口最先，其余按可见面积从大到小"""
+        try:
+            left, top, right, bottom = self.backend.get_window_rect(hwnd)
+            area = max(0, right - left) * max(0, bottom - top)
+        except:
+            area = 0
+        return (hwnd != foreground_hwnd, -area)
+    
+    async def _start_creators(self, windows, max_concurrent):
+        """按优先级并发启动背景创建器，同时处于启动阶段的进程不超过max_concurrent个"""
+        if not windows:
+            return
+        
+        try:
+            foreground_hwnd = self.backend.get_foreground_window()
+        except:
+            foreground_hwnd = 0
+        windows = sorted(windows, key=lambda item: self._spawn_priority(item[0], foreground_hwnd))
+        
+        # 全局共享启动名额；asyncio.Semaphore按等待顺序放行，
+        # 任务按优先级创建即可保证启动顺序
+        max_concurrent = max(1, int(max_concurrent))
+        if self._spawn_semaphore is None or self._spawn_limit != max_concurrent:
+            self._spawn_semaphore = asyncio.Semaphore(max_concurrent)
+            self._spawn_limit = max_concurrent
+        semaphore = self._spawn_semaphore
+        
+        async def start_one(hwnd, target_config):
+            async with semaphore:
+                if self.should_exit or hwnd not in self.active_windows:
+                    return
+                target_config = await self._with_decoded_image(target_config)
+                if not await self.process_manager.start_bg_creator(hwnd, target_config):
+                    self.active_windows.discard(hwnd)
+                    self._record_spawn_failure(hwnd, "进程启动失败")
+                    return
+                self.spawn_started[hwnd] = time.time()
+                # 名额一直占用到首个背景显示，避免大量进程同时抢占CPU
+                await self.process_manager.wait_ready(hwnd, self.SPAWN_READY_TIMEOUT)
+        
+        await asyncio.gather(*(start_one(hwnd, cfg) for hwnd, cfg in windows))
+    
+    async def _with_decoded_image(self, target_config):
+        """为单张图片的目标附上共享的（已调色的）解码文件，背景进程直接映射而不再各自解码和调色"""
+        image_path = target_config.get('image_path')
+        if not isinstance(image_path, str):
+            return target_config
+        loop = asyncio.get_running_loop()
+        try:
+            decoded = await loop.run_in_executor(None, self.image_store.prepare, image_path,
+                                                 image_adjust(target_config))
+        except Exception as e:
+            log(f"准备解码图片失败: {e}")
+            decoded = None
+        return dict(target_config, decoded=decoded) if decoded else target_config
+    
+    async def _check_images(self, targets):
+        """检查配置中的图片文件，内容变化时通知使用该图片的背景进程重新加载"""
+        store = self.image_store
+        loop = asyncio.get_running_loop()
+        store.watch(targets)
+        changed = await loop.run_in_executor(None, store.check)
+        for path in changed:
+            hwnds = [hwnd for hwnd in list(self.process_manager.active_processes)
+                     if isinstance(self.window_targets.get(hwnd, {}).get('image_path'), str)
+                     and resolve_image_path(self.window_targets[hwnd]['image_path']) == path]
+            if not hwnds:
+                continue
+            # 每种调色参数只解码一次，使用相同参数的进程共享
+            decoded_by_adjust = {}
+            for hwnd in hwnds:
+                adjust = image_adjust(self.window_targets[hwnd])
+                if adjust not in decoded_by_adjust:
+                    decoded_by_adjust[adjust] = await loop.run_in_executor(None, store.prepare, path, adjust)
+                command = {'cmd': 'reload', 'decoded': decoded_by_adjust[adjust]}
+                if self.process_manager.send_command(hwnd, command):
+                    store.reloads += 1
+            log(f"图片已更新: {os.path.basename(path)}，通知 {len(hwnds)} 个背景进程重新加载")
+    
+    @staticmethod
+    def _target_key(target_config):
+        return target_config.get('name', 'Unknown')
+    
+    def _spawn_allowed(self, hwnd, target_config, now):
+        """窗口是否可以（重新）启动背景进程：不在退避期内，且所属目标未被熔断"""
+        name = self._target_key(target_config)
+        target = self.target_failures.get(name)
+        if target is not None and target['config'] != target_config:
+            # 目标配置已修改（如更换了图片），之前的失败不再作数
+            log(f"目标 {name} 的配置已更新，清除启动失败记录")
+            self.target_failures.pop(name, None)
+            for failed_hwnd in [h for h, f in self.spawn_failures.items() if f['target'] == name]:
+                del self.spawn_failures[failed_hwnd]
+            target = None
+        if target is not None and now < target['open_until']:
+            return False
+        
+        failure = self.spawn_failures.get(hwnd)
+        return failure is None or now >= failure['retry_at']
+    
+    def _record_spawn_failure(self, hwnd, reason):
+        """记录一次启动失败，计算下次重试时间；目标连续失败过多时熔断"""
+        target_config = self.window_targets.get(hwnd, {})
+        name = self._target_key(target_config)
+        now = time.time()
+        
+        failure = self.spawn_failures.setdefault(hwnd, {'count': 0, 'retry_at': 0, 'reason': "",
+                                                        'target': name})
+        failure['count'] += 1
+        failure['reason'] = reason
+        delay = min(self.SPAWN_BACKOFF_MAX, self.SPAWN_BACKOFF_BASE * 2 ** (failure['count'] - 1))
+        failure['retry_at'] = now + delay
+        
+        target = self.target_failures.setdefault(name, {'count': 0, 'open_until': 0,
+                                                        'config': target_config})
+        target['count'] += 1
+        target['config'] = target_config
+        if target['count'] >= self.BREAKER_THRESHOLD:
+            # 冷却结束后允许再试一次，仍然失败则立即重新熔断
+            target['open_until'] = now + self.BREAKER_COOLDOWN
+            log(f"目标 {name} 的背景进程连续失败 {target['count']} 次（{reason}），"
+                f"暂停启动 {self.BREAKER_COOLDOWN // 60} 分钟；修改该目标的配置后立即恢复")
+        else:
+            log(f"窗口 {hwnd} 的背景进程异常（{reason}），第 {failure['count']} 次，"
+                f"{delay:.0f} 秒后重试")
+    
+    def _clear_spawn_failures(self, hwnd):
+        """背景进程稳定运行后清除该窗口及其目标的失败记录"""
+        failure = self.spawn_failures.pop(hwnd, None)
+        if failure is not None:
+            self.target_failures.pop(failure['target'], None)
+            log(f"窗口 {hwnd} 的背景进程已稳定运行，清除 {failure['count']} 次失败记录")
+    
+    def _expire_spawn_failures(self, current_hwnds, now):
+        """清理已关闭窗口的失败记录，清除已稳定运行窗口的失败记录"""
+        for hwnd in list(self.spawn_failures):
+            started = self.spawn_started.get(hwnd)
+            if started is not None and hwnd in self.process_manager.active_processes:
+                if now - started >= self.SPAWN_STABLE_TIME:
+                    self._clear_spawn_failures(hwnd)
+            elif hwnd not in current_hwnds and not self.backend.is_window(hwnd):
+                self.spawn_failures.pop(hwnd, None)
+                self.window_targets.pop(hwnd, None)
+    
+    def _on_creator_exit(self, hwnd, return_code):
+        """背景进程自行退出：目标窗口仍在时允许重新发现，过早退出或出错计为失败"""
+        started = self.spawn_started.pop(hwnd, None)
+        if hwnd not in self.active_windows:
+            return
+        self.active_windows.discard(hwnd)
+        self.focus_times.pop(hwnd, None)
+        self.trim_levels.pop(hwnd, None)
+        self.pending_savings.pop(hwnd, None)
+        
+        try:
+            window_exists = self.backend.is_window(hwnd)
+        except Exception:
+            window_exists = False
+        if not window_exists:
+            self.window_targets.pop(hwnd, None)
+            return
+        
+        runtime = time.time() - started if started is not None else 0
+        if return_code or runtime < self.SPAWN_STABLE_TIME:
+            self._record_spawn_failure(hwnd, f"返回码 {return_code}，运行 {runtime:.1f} 秒")
+        else:
+            self._clear_spawn_failures(hwnd)
+        # 唤醒扫描：能立即重试的窗口不必等待下一个扫描周期
+        self.wakeup()
+    
+    def _sample_resources(self, config):
+        """按采样间隔读取各背景进程的CPU和内存占用，并检查目标的资源上限"""
+        now = time.time()
+        if now - self._last_resource_sample < config.get('resource_sample_interval', 10):
+            return
+        self._last_resource_sample = now
+        
+        samples = self.process_manager.sample_usage()
+        for hwnd in list(self.process_usage):
+            if hwnd not in samples:
+                del self.process_usage[hwnd]
+        
+        for hwnd, (pid, cpu_time, rss) in samples.items():
+            usage = self.process_usage.get(hwnd)
+            if usage is None or usage['pid'] != pid:
+                # 新进程：第一次采样只记录基准
+                self.process_usage[hwnd] = {'pid': pid, 'cpu_time': cpu_time, 'sampled_at': now,
+                                            'cpu_percent': 0.0, 'rss_bytes': rss,
+                                            'strikes': 0, 'throttled': False}
+                continue
+            elapsed = now - usage['sampled_at']
+            if elapsed > 0:
+                usage['cpu_percent'] = round(max(0.0, cpu_time - usage['cpu_time']) / elapsed * 100, 1)
+            usage['cpu_time'] = cpu_time
+            usage['sampled_at'] = now
+            usage['rss_bytes'] = rss
+            self._check_resource_limits(hwnd, usage)
+    
+    def _check_resource_limits(self, hwnd, usage):
+        """连续超限时先限流，限流后仍超限且limit_action为restart时重启该背景进程"""
+        target_config = self.window_targets.get(hwnd, {})
+        cpu_limit = target_config.get('cpu_limit', 0)
+        memory_limit = target_config.get('memory_limit_mb', 0) * 1048576
+        cpu_over = bool(cpu_limit) and usage['cpu_percent'] > cpu_limit
+        memory_over = bool(memory_limit) and usage['rss_bytes'] > memory_limit
+        if not (cpu_over or memory_over):
+            usage['strikes'] = 0
+            return
+        
+        usage['strikes'] += 1
+        if usage['strikes'] < self.LIMIT_STRIKES:
+            return
+        usage['strikes'] = 0
+        
+        name = self._target_key(target_config)
+        detail = f"CPU {usage['cpu_percent']:.0f}%, 内存 {usage['rss_bytes'] / 1048576:.0f} MB"
+        if not usage['throttled']:
+            log(f"窗口 {hwnd} ({name}) 的背景进程资源超限（{detail}），开始限流")
+            usage['throttled'] = True
+            self.process_manager.send_command(hwnd, {'cmd': 'throttle', 'level': 1})
+            if memory_over:
+                self.process_manager.send_command(hwnd, {'cmd': 'trim', 'level': 2})
+        elif target_config.get('limit_action', 'throttle') == 'restart':
+            log(f"窗口 {hwnd} ({name}) 的背景进程限流后仍然超限（{detail}），重新启动")
+            self.limit_restarts[name] += 1
+            task = asyncio.create_task(self._restart_creator(hwnd))
+            self.spawn_tasks.add(task)
+            task.add_done_callback(self.spawn_tasks.discard)
+    
+    async def _restart_creator(self, hwnd):
+        """停止背景进程并让下一次扫描重新启动它（按启动失败退避）"""
+        await self.process_manager.stop_bg_creator(hwnd)
+        self.process_usage.pop(hwnd, None)
+        self.spawn_started.pop(hwnd, None)
+        if hwnd in self.active_windows:
+            self.active_windows.discard(hwnd)
+            self._record_spawn_failure(hwnd, "资源超限")
+            self.wakeup()
+    
+    def _resource_stats(self):
+        """各窗口及各目标的背景进程资源占用"""
+        windows = {}
+        targets = {}
+        for hwnd, usage in self.process_usage.items():
+            name = self._target_key(self.window_targets.get(hwnd, {}))
+            windows[hwnd] = {
+                'target': name,
+                'pid': usage['pid'],
+                'cpu_percent': usage['cpu_percent'],
+                'rss_bytes': usage['rss_bytes'],
+                'throttled': usage['throttled'],
+            }
+            target = targets.setdefault(name, {'processes': 0, 'cpu_percent': 0.0, 'rss_bytes': 0,
+                                               'throttled': 0, 'restarts': 0})
+            target['processes'] += 1
+            target['cpu_percent'] = round(target['cpu_percent'] + usage['cpu_percent'], 1)
+            target['rss_bytes'] += usage['rss_bytes']
+            target['throttled'] += int(usage['throttled'])
+        for name, restarts in self.limit_restarts.items():
+            targets.setdefault(name, {'processes': 0, 'cpu_percent': 0.0, 'rss_bytes': 0,
+                                      'throttled': 0, 'restarts': 0})['restarts'] = restarts
+        return {'windows': windows, 'targets': targets}
+    
+    def _spawn_backoff_stats(self):
+        """启动失败与熔断状态"""
+        now = time.time()
+        windows = {
+            hwnd: {
+                'target': failure['target'],
+                'failures': failure['count'],
+                'reason': failure['reason'],
+                'retry_in': round(max(0, failure['retry_at'] - now), 1),
+            }
+            for hwnd, failure in self.spawn_failures.items()
+        }
+        targets = {
+            name: {
+                'failures': target['count'],
+                'open': now < target['open_until'],
+                'retry_in': round(max(0, target['open_until'] - now), 1),
+            }
+            for name, target in self.target_failures.items()
+        }
+        return {'windows': windows, 'targets': targets}
+    
+    def _update_focus(self):
+        """记录前台窗口；重新获得焦点的窗口解除降级"""
+        try:
+            foreground_hwnd = self.backend.get_foreground_window()
+        except:
+            return
+        self.foreground_hwnd = foreground_hwnd
+        if self.trace and foreground_hwnd != self._last_traced_foreground:
+            self._last_traced_foreground = foreground_hwnd
+            self.trace.record("fg", hwnd=foreground_hwnd)
+        if foreground_hwnd in self.active_windows:
+            self.focus_times[foreground_hwnd] = time.time()
+            self.pending_savings.pop(foreground_hwnd, None)
+            if self.trim_levels.pop(foreground_hwnd, 0):
+                self.process_manager.send_command(foreground_hwnd, {'cmd': 'untrim'})
+    
+    def _on_creator_report(self, hwnd, message):
+        """内存上报到达后合并检查一次预算"""
+        if message.get('type') == 'ready':
+            # 采样期间新启动的背景创建器也加入本次采样
+            remaining = self.profile_until - time.time()
+            if remaining >= 1:
+                self._send_profile_command(hwnd, remaining)
+            if self.trace:
+                self.process_manager.send_command(hwnd, {'cmd': 'trace', 'enabled': True})
+            if self.power_mode != "normal":
+                self.process_manager.send_command(hwnd, {'cmd': 'power', 'mode': self.power_mode})
+            return
+        if message.get('type') == 'trace':
+            if self.trace:
+                data = dict(message)
+                data.pop('type', None)
+                self.trace.record(data.pop('ev', 'win'), hwnd=hwnd, **data)
+            return
+        if message.get('type') != 'memory':
+            return
+        # 创建器已执行降级，之后以其实际上报的占用为准
+        if message.get('trim_level', 0) >= self.trim_levels.get(hwnd, 0):
+            self.pending_savings.pop(hwnd, None)
+        if self._budget_check_pending or self.loop is None:
+            return
+        self._budget_check_pending = True
+        self.loop.call_soon(self._enforce_memory_budget)
+    
+    @staticmethod
+    def _estimate_saving(usage, level):
+        """估算某个降级级别能释放的字节数"""
+        if level == 1:
+            return usage.get('cache_bytes', 0)
+        source = usage.get('source_bytes', 0)
+        w, h = usage.get('size', [0, 0])
+        window_bytes = min(source, w * h * 4)
+        if level == 2:
+            return source - window_bytes
+        return window_bytes
+    
+    def _send_profile_command(self, hwnd, duration):
+        """通知背景创建器开始采样"""
+        self.process_manager.send_command(hwnd, {
+            'cmd': 'profile',
+            'duration': round(duration, 1),
+            'interval_ms': self.profile_interval_ms
+        })
+    
+    def start_profiling(self, duration=None, interval_ms=None):
+        """
+        在本进程和全部背景创建器中开启一段时间的采样性能分析
+        
+        Args:
+            duration: 采样时长（秒），默认取配置中的profile_duration
+            interval_ms: 采样间隔（毫秒），默认取配置中的profile_interval_ms
+        """
+        config = self.config_manager.get_config() or {}
+        duration = float(duration or config.get('profile_duration', 30))
+        self.profile_interval_ms = int(interval_ms or config.get('profile_interval_ms', 10))
+        
+        if self.profiler and self.profiler.is_running():
+            log("性能分析已在进行中")
+            return False
+        
+        self.profiler = SamplingProfiler("main", interval=self.profile_interval_ms / 1000)
+        self.profiler.start(duration)
+        self.profile_until = time.time() + duration
+        for hwnd in list(self.process_manager.active_processes.keys()):
+            self._send_profile_command(hwnd, duration)
+        log(f"已开启性能分析 {duration:.0f} 秒，涉及 {len(self.process_manager.active_processes)} 个背景进程，结果写入 logs/")
+        return True
+    
+    def request_profiling(self, duration=None):
+        """开启性能分析（线程安全，供托盘菜单调用）"""
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.start_profiling, duration)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+    
+    def _trace_windows(self, windows):
+        """匹配到的窗口集合或其位置变化时记录一次快照"""
+        snapshot = []
+        for hwnd, _ in windows:
+            try:
+                snapshot.append({
+                    'hwnd': hwnd,
+                    'exe': self.backend.get_exe_name(hwnd),
+                    'title': self.backend.get_title(hwnd),
+                    'cls': self.backend.get_class_name(hwnd),
+                    'rect': list(self.backend.get_window_rect(hwnd))
+                })
+            except Exception:
+                pass
+        if snapshot != self._last_traced_windows:
+            self._last_traced_windows = snapshot
+            self.trace.record("windows", windows=snapshot)
+    
+    def start_trace(self, path=None):
+        """开始记录窗口事件轨迹"""
+        if self.trace:
+            return self.trace.path
+        config = self.config_manager.get_config() or {}
+        try:
+            monitor = self.backend.get_monitor_rect(self.backend.get_foreground_window())
+        except Exception:
+            monitor = None
+        self.trace = TraceRecorder(path or config.get('trace_file') or default_trace_path(),
+                                   config=config, monitor=monitor)
+        self._last_traced_windows = None
+        self._last_traced_foreground = None
+        for hwnd in list(self.process_manager.active_processes.keys()):
+            self.process_manager.send_command(hwnd, {'cmd': 'trace', 'enabled': True})
+        log(f"开始记录窗口事件轨迹: {self.trace.path}")
+        return self.trace.path
+    
+    def stop_trace(self):
+        """停止记录窗口事件轨迹"""
+        if not self.trace:
+            return
+        trace, self.trace = self.trace, None
+        for hwnd in list(self.process_manager.active_processes.keys()):
+            self.process_manager.send_command(hwnd, {'cmd': 'trace', 'enabled': False})
+        trace.close()
+        log(f"窗口事件轨迹已保存: {trace.path} ({trace.events} 个事件)")
+    
+    def _check_trace_switch(self):
+        """按配置中的record_trace开关开始或停止记录轨迹"""
+        config = self.config_manager.get_config() or {}
+        enabled = bool(config.get('record_trace', False))
+        if enabled and not self.trace:
+            self.start_trace()
+        elif not enabled and self.trace:
+            self.stop_trace()
+    
+    def _check_profiling_switch(self):
+        """配置中的profiling开关由关变开时开启一次性能分析"""
+        config = self.config_manager.get_config() or {}
+        enabled = bool(config.get('profiling', False))
+        if enabled and not self._profiling_switch:
+            self.start_profiling()
+        self._profiling_switch = enabled
+    
+    def get_memory_usage(self):
+        """返回 (位图内存总量, 预算)，单位字节；预算为0表示不限制"""
+        config = self.config_manager.get_config() or {}
+        budget = int(config.get('memory_budget_mb', 0)) * 1048576
+        usage = self.process_manager.memory_usage
+        total = sum(u.get('bitmap_bytes', 0) for u in list(usage.values()))
+        return total, budget
+    
+    def _enforce_memory_budget(self):
+        """超出预算时，让最久未获得焦点的窗口依次丢弃缓存、缩小源图、释放源图"""
+        self._budget_check_pending = False
+        total, budget = self.get_memory_usage()
+        
+        # 占用变化超过5%时记录日志
+        if abs(total - self._last_logged_memory) > max(1048576, self._last_logged_memory * 0.05):
+            self._last_logged_memory = total
+            budget_text = f"{budget / 1048576:.0f} MB" if budget else "不限"
+            log(f"背景位图内存: {total / 1048576:.1f} MB / {budget_text}")
+        
+        # 已下发但未确认的降级先按预计值扣除，避免重复升级
+        pending = sum(self.pending_savings.values())
+        if budget <= 0 or total - pending <= budget:
+            return
+        
+        usage = self.process_manager.memory_usage
+        candidates = sorted(
+            (hwnd for hwnd in usage if hwnd != self.foreground_hwnd),
+            key=lambda hwnd: self.focus_times.get(hwnd, 0)
+        )
+        
+        excess = total - pending - budget
+        actions = []
+        for level in (1, 2, 3):
+            for hwnd in candidates:
+                if excess <= 0:
+                    break
+                if self.trim_levels.get(hwnd, 0) >= level:
+                    continue
+                saving = self._estimate_saving(usage[hwnd], level)
+                if saving <= 0:
+                    continue
+                if self.process_manager.send_command(hwnd, {'cmd': 'trim', 'level': level}):
+                    self.trim_levels[hwnd] = level
+                    self.pending_savings[hwnd] = self.pending_savings.get(hwnd, 0) + saving
+                    excess -= saving
+                    actions.append(f"{hwnd}:L{level}")
+            if excess <= 0:
+                break
+        
+        if actions:
+            log(f"背景位图内存超出预算 ({total / 1048576:.1f}/{budget / 1048576:.0f} MB)，"
+                f"已通知降级: {', '.join(actions)}")
+    
+    def get_stats(self):
+        """返回检测器运行状态统计"""
+        total, budget = self.get_memory_usage()
+        windows = {}
+        for hwnd, usage in list(self.process_manager.memory_usage.items()):
+            windows[hwnd] = {
+                'bitmap_bytes': usage.get('bitmap_bytes', 0),
+                'resident_bytes': usage.get('resident_bytes', 0),
+                'trim_level': self.trim_levels.get(hwnd, 0),
+                'last_focus': self.focus_times.get(hwnd, 0),
+            }
+            animation = self.process_manager.animation_usage.get(hwnd)
+            if animation:
+                windows[hwnd]['animation'] = {
+                    'fps': animation.get('fps', 0),
+                    'cpu_percent': animation.get('cpu_percent', 0),
+                    'frame_cache_bytes': animation.get('frame_cache_bytes', 0),
+                }
+            geometry = self.process_manager.geometry_usage.get(hwnd)
+            if geometry:
+                windows[hwnd]['geometry'] = {
+                    'moves': geometry.get('total_moves', 0),
+                    'renders': geometry.get('total_renders', 0),
+                }
+        return {
+            'active_windows': len(self.active_windows),
+            'active_processes': len(self.process_manager.active_processes),
+            'spawn_backoff': self._spawn_backoff_stats(),
+            'resources': self._resource_stats(),
+            'images': self.image_store.stats(),
+            'scan': self.scheduler.stats(),
+            'memory': {
+                'bitmap_bytes': total,
+                'budget_bytes': budget,
+                'windows': windows,
+            },
+        }
+    
+    def set_power_mode(self, mode):
+        """
+        切换电源模式并通知所有背景进程
+        
+        Args:
+            mode: normal - 正常; saver - 扫描与探测间隔乘以battery_interval_scale，背景进程降低轮询与渲染开销;
+                  suspended - 停止扫描，背景进程停止渲染并释放位图
+        """
+        previous = self.power_mode
+        self.power_mode = mode
+        self._configure_scheduler()
+        if mode != previous:
+            for hwnd in list(self.process_manager.active_processes):
+                self.process_manager.send_command(hwnd, {'cmd': 'power', 'mode': mode})
+    
+    def _configure_scheduler(self):
+        """按当前配置更新扫描调度参数"""
+        config = self.config_manager.get_config()
+        if config:
+            self.scheduler.scale = config.get('battery_interval_scale', 3.0) if self.power_mode == "saver" else 1.0
+            self.scheduler.configure(config)
+    
+    def _probe_windows(self):
+        """廉价探测：前台窗口或可见顶层窗口数是否变化"""
+        self.scheduler.on_probe()
+        try:
+            backend = self.backend
+            state = (backend.get_foreground_window(),
+                     sum(1 for hwnd in backend.enum_windows() if backend.is_visible(hwnd)))
+        except Exception:
+            return False
+        changed = self._probe_state is not None and state != self._probe_state
+        self._probe_state = state
+        return changed
+    
+    async def _wait_next_scan(self):
+        """等到下一次计划扫描；期间按最小间隔探测，探测到变化或被唤醒时提前返回"""
+        scheduler = self.scheduler
+        while not self.should_exit:
+            if self.power_mode == "suspended":
+                # 锁屏或显示器关闭：不扫描也不探测，只执行钩子（含电源状态检查）
+                await self._wait_next_tick(self.SUSPENDED_TICK)
+                self._run_tick_hooks()
+                if self.power_mode != "suspended":
+                    scheduler.on_signal()
+                    return
+                continue
+            remaining = scheduler.next_scan_at() - scheduler.clock()
+            if remaining <= 0:
+                return
+            timeout = min(remaining, scheduler.probe_interval) if scheduler.adaptive else remaining
+            if await self._wait_next_tick(timeout):
+                scheduler.on_signal()
+                return
+            # 配置重载等钩子也按探测间隔检查，不随扫描间隔放慢
+            self._run_tick_hooks()
+            if scheduler.adaptive and self._probe_windows():
+                scheduler.on_signal()
+                return
+    
+    def _run_tick_hooks(self):
+        """执行扫描前钩子（如配置重载检查）"""
+        for hook in list(self.tick_hooks):
+            try:
+                hook()
+            except Exception as e:
+                log(f"执行扫描钩子时出错: {e}")
+    
+    async def _wait_next_tick(self, timeout):
+        """等待定时器到期或被提前唤醒，返回是否被唤醒"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        woken = self._wakeup.is_set()
+        self._wakeup.clear()
+        return woken
+    
+    async def run_async(self):
+        """在当前事件循环中运行窗口检测器"""
         log("窗口检测器启动")
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
         
         try:
-            last_scan_time = 0
-            
             while not self.should_exit:
-                current_time = time.time()
+                self._run_tick_hooks()
+                self._check_profiling_switch()
+                self._check_trace_switch()
+                self._configure_scheduler()
+                added, removed = await self.scan_windows()
+                self.scheduler.on_scan(bool(added or removed), added)
+                self.first_scan_done = True
                 
-                # 获取扫描间隔
-                config = self.config_manager.get_config()
-                scan_interval = config.get('scan_interval', 3) if config else 3
+                if self.should_exit:
+                    break
                 
-                # 只有在需要扫描时才执行扫描
-                if current_time - last_scan_time >= scan_interval:
-                    # 扫描窗口
-                    self.scan_windows()
-                    last_scan_time = current_time
+                # 变化后快速扫描，稳定时逐渐放慢到scan_interval_max
+                await self._wait_next_scan()
                 
-                # 使用更短的等待时间，避免阻塞
-                time.sleep(0.1)
-                
-        except KeyboardInterrupt:
-            log("收到中断信号")
+        except asyncio.CancelledError:
+            log("窗口检测器任务被取消")
+            raise
         except Exception as e:
             log(f"窗口检测器运行出错: {e}")
         finally:
-            self.cleanup()
+            await self.cleanup()
+    
+    def run(self):
+        """运行窗口检测器（独占一个事件循环）"""
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            log("收到中断信号")
+    
+    def wakeup(self):
+        """提前唤醒扫描循环（线程安全）"""
+        if self.loop is None or self._wakeup is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
     
     def stop(self):
-        """停止窗口检测器"""
+        """停止窗口检测器（线程安全）"""
         self.should_exit = True
+        self.wakeup()
     
-    def cleanup(self):
+    async def cleanup(self):
         """清理资源"""
         log("正在清理资源...")
-        self.process_manager.stop_all()
+        for task in list(self.spawn_tasks):
+            task.cancel()
+        if self.spawn_tasks:
+            await asyncio.gather(*self.spawn_tasks, return_exceptions=True)
+        await self.process_manager.stop_all()
+        if self.profiler:
+            # 提前结束的采样也写出已有结果
+            self.profiler.stop()
+        self.stop_trace()
+        self.active_windows.clear()
+        self.window_targets.clear()
+        self.spawn_started.clear()
+        self.process_usage.clear()
+        self.focus_times.clear()
+        self.trim_levels.clear()
+        self.pending_savings.clear()
         log("窗口检测器已停止")
 
 def main():
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+窗口事件轨迹 (sxxzh定制版)
+记录检测器和背景创建器看到的窗口几何与可见性变化，供trace_replay.py离线回放
+
+轨迹文件为JSON Lines，每行一个事件，只记录变化：
+  {"ev":"header","version":1,"config":{...},"monitor":[l,t,r,b]}
+  {"t":1.25,"ev":"windows","windows":[{"hwnd":..,"exe":..,"title":..,"cls":..,"rect":[l,t,r,b]}]}
+  {"t":1.25,"ev":"fg","hwnd":..}
+  {"t":3.02,"ev":"win","hwnd":..,"rect":[l,t,r,b],"state":"shown|hidden|iconic|occluded"}
+其中t为相对记录开始的秒数，rect为客户区的屏幕坐标
+
+开发者: sxxzh
+版本: 1.1.2 - 加入UI
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+TRACE_VERSION = 1
+
+
+def default_trace_path():
+    """默认轨迹文件路径：logs/trace_时间.jsonl"""
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "logs", f"trace_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+
+class TraceRecorder:
+    """轨迹记录器（线程安全），事件按到达顺序写入"""
+
+    def __init__(self, path, config=None, monitor=None):
+        self.path = path
+        self.start = time.perf_counter()
+        self.events = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._write({"ev": "header", "version": TRACE_VERSION,
+                     "config": config or {}, "monitor": list(monitor) if monitor else None})
+
+    def _write(self, event):
+        self._file.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def record(self, ev, **data):
+        """记录一个事件"""
+        with self._lock:
+            if self._file is None:
+                return
+            event = {"t": round(time.perf_counter() - self.start, 3), "ev": ev}
+            event.update(data)
+            self._write(event)
+            self.events += 1
+            # 少量事件也尽快落盘，异常退出时轨迹仍然可用
+            self._file.flush()
+
+    def append(self, event):
+        """写入已带时间戳的事件（生成合成轨迹时使用）"""
+        with self._lock:
+            self._write(event)
+            self.events += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(path):
+    """读取轨迹文件，返回 (header, 按时间排序的事件列表)"""
+    header = {}
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("ev") == "header":
+                header = event
+            else:
+                events.append(event)
+    events.sort(key=lambda event: event.get("t", 0))
+    return header, events